@@ -0,0 +1,198 @@
+# ad_import.py
+import codecs
+import csv
+import json
+import os
+from types import SimpleNamespace
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError
+
+from models import Ad
+from schemas import AdCreate
+import quotas
+
+IMPORT_CHUNK = int(os.getenv("AD_IMPORT_CHUNK", "1000"))
+MAX_REPORTED_ERRORS = int(os.getenv("AD_IMPORT_MAX_ERRORS", "1000"))
+# Taille maximale d'un enregistrement CSV (champ entre guillemets sur
+# plusieurs lignes) : au-delà, guillemet non fermé probable, la ligne est rejetée.
+# MAX_RECORD_SIZE borne aussi chaque ligne lue, quel que soit le format.
+MAX_RECORD_LINES = int(os.getenv("AD_IMPORT_MAX_RECORD_LINES", "100"))
+MAX_RECORD_SIZE = int(os.getenv("AD_IMPORT_MAX_RECORD_SIZE", "65536"))
+
+
+async def iter_lines(stream):
+    # Découpe le corps de la requête en lignes au fil de l'eau. Seul le
+    # morceau reçu est découpé ; une ligne de plus de MAX_RECORD_SIZE
+    # caractères n'est pas gardée : la suite est ignorée jusqu'au prochain
+    # saut de ligne et la ligne est rendue comme None.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts, size, oversized = [], 0, False
+    async for chunk in stream:
+        *lines, rest = decoder.decode(chunk).split("\n")
+        for line in lines:
+            if oversized or size + len(line) > MAX_RECORD_SIZE:
+                yield None
+            else:
+                parts.append(line)
+                yield "".join(parts).rstrip("\r")
+            parts, size, oversized = [], 0, False
+        if not oversized:
+            parts.append(rest)
+            size += len(rest)
+            if size > MAX_RECORD_SIZE:
+                parts, oversized = [], True
+    rest = decoder.decode(b"", final=True)
+    if oversized or size + len(rest) > MAX_RECORD_SIZE:
+        yield None
+    else:
+        line = "".join(parts) + rest
+        if line:
+            yield line.rstrip("\r")
+
+
+def _line_too_long() -> str:
+    return f"Line exceeds {MAX_RECORD_SIZE} characters"
+
+
+async def iter_csv_records(lines):
+    # (numéro de ligne, dict) ; un champ entre guillemets peut couvrir
+    # plusieurs lignes, on accumule tant que les guillemets sont impairs.
+    # Enregistrement illisible : None, ou le message d'erreur s'il est trop long.
+    header = None
+    pending = []
+    quotes = size = 0
+    line_number = start = 0
+    async for line in lines:
+        line_number += 1
+        if line is None:
+            # Ligne trop longue (voir iter_lines) : l'enregistrement en cours est perdu
+            yield (start if pending else line_number), _line_too_long()
+            pending = []
+            continue
+        if not pending:
+            start = line_number
+            quotes = size = 0
+        pending.append(line)
+        # Parité tenue ligne à ligne : chaque ligne n'est comptée qu'une fois
+        quotes += line.count('"')
+        size += len(line) + 1
+        if quotes % 2:
+            if len(pending) >= MAX_RECORD_LINES or size > MAX_RECORD_SIZE:
+                pending = []
+                yield start, f"Record exceeds {MAX_RECORD_LINES} lines or {MAX_RECORD_SIZE} characters (unclosed quote?)"
+            continue
+        text = "\n".join(pending)
+        pending = []
+        if not text.strip():
+            continue
+        row = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in row]
+            continue
+        # Cellule vide = valeur absente (la valeur par défaut du schéma s'applique)
+        yield start, {name: value for name, value in zip(header, row) if value != ""}
+    if pending:
+        yield start, None
+
+
+async def iter_jsonl_records(lines):
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if line is None:
+            yield line_number, _line_too_long()
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, line: int, messages: list):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": messages})
+
+    def as_dict(self) -> dict:
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+# Colonnes remplies par la base, renvoyées pour les index en mémoire (recherche, fil)
+GENERATED = (Ad.id, Ad.views_count, Ad.created_at, Ad.updated_at)
+
+
+async def _reserve(db, rows: list):
+    usage = [quotas.usage_of(data["status"], data["is_featured"]) for data in rows]
+    await quotas.reserve(db, rows[0]["user_id"], sum(ads for ads, _ in usage), sum(featured for _, featured in usage))
+
+
+async def _insert_chunk(db, chunk: list, report: ImportReport, on_inserted):
+    # INSERT multi-lignes pour tout le lot ; en cas d'erreur base (catégorie
+    # inexistante…) ou de quota atteint, on rejoue ligne par ligne pour isoler
+    # les fautives.
+    statement = insert(Ad).returning(*GENERATED, sort_by_parameter_order=True)
+    try:
+        await _reserve(db, [data for _, data in chunk])
+        rows = (await db.execute(statement, [data for _, data in chunk])).all()
+        await db.commit()
+    except (DBAPIError, quotas.QuotaExceeded):
+        await db.rollback()
+        rows = []
+        for line, data in chunk:
+            try:
+                await _reserve(db, [data])
+                row = (await db.execute(statement, [data])).one()
+                await db.commit()
+                rows.append(row)
+            except DBAPIError as exc:
+                await db.rollback()
+                report.fail(line, [(str(exc.orig).splitlines() or ["Database error"])[0]])
+                rows.append(None)
+            except quotas.QuotaExceeded as exc:
+                await db.rollback()
+                report.fail(line, [exc.detail])
+                rows.append(None)
+        chunk = [entry for entry, row in zip(chunk, rows) if row is not None]
+        rows = [row for row in rows if row is not None]
+    report.inserted += len(rows)
+    if on_inserted:
+        on_inserted([SimpleNamespace(**data, **row._mapping) for row, (_, data) in zip(rows, chunk)])
+
+
+async def import_ads(db, user_id: int, records, on_inserted=None, chunk_size: int = IMPORT_CHUNK) -> dict:
+    """Valide et insère les annonces par lots ; la mémoire ne dépend que de la taille d'un lot."""
+    report = ImportReport()
+    chunk = []
+    async for line, record in records:
+        if not isinstance(record, dict):
+            report.fail(line, [record or "Malformed record"])
+            continue
+        record.setdefault("category_id", None)
+        try:
+            ad = AdCreate.model_validate(record)
+        except ValidationError as exc:
+            report.fail(line, [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()])
+            continue
+        chunk.append((line, {**ad.model_dump(), "user_id": user_id}))
+        if len(chunk) >= chunk_size:
+            await _insert_chunk(db, chunk, report, on_inserted)
+            chunk = []
+    if chunk:
+        await _insert_chunk(db, chunk, report, on_inserted)
+    return report.as_dict()
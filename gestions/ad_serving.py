@@ -0,0 +1,239 @@
+# ad_serving.py
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from database import AsyncSessionLocal
+from models import Advertisement, AdStatusType, TargetingType
+from search import fold
+from ad_tracking import ad_events
+
+logger = logging.getLogger(__name__)
+
+AD_SERVING_REFRESH_SECONDS = float(os.getenv("AD_SERVING_REFRESH_SECONDS", "60"))
+
+DIMENSIONS = tuple(targeting.value for targeting in TargetingType)
+
+
+def normalize(dimension: str, value) -> str:
+    # Même forme à l'indexation et à la requête : minuscules, sans accents
+    return str(value).strip() if dimension == "category" else fold(str(value).strip())
+
+
+def _as_utc(value):
+    if value is None:
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _enum_value(value):
+    return value.value if hasattr(value, "value") else value
+
+
+class Campaign:
+    __slots__ = ("id", "position", "start", "end", "budget", "targets", "payload")
+
+    def __init__(self, advertisement):
+        self.id = advertisement.id
+        self.position = _enum_value(advertisement.position)
+        self.start = _as_utc(advertisement.start_date)
+        self.end = _as_utc(advertisement.end_date)
+        self.budget = float(advertisement.budget or 0)
+        # dimension -> valeurs ciblées ; dimension absente = pas de contrainte
+        targets = {}
+        if advertisement.category_id is not None:
+            targets.setdefault("category", set()).add(str(advertisement.category_id))
+        for targeting in advertisement.targetings:
+            dimension = _enum_value(targeting.type)
+            targets.setdefault(dimension, set()).add(normalize(dimension, targeting.value))
+        self.targets = targets
+        self.payload = {
+            "id": advertisement.id,
+            "title": advertisement.title,
+            "media_url": advertisement.media_url,
+            "media_type": _enum_value(advertisement.media_type),
+            "target_url": advertisement.target_url,
+            "position": self.position,
+        }
+
+    def running(self, now: datetime) -> bool:
+        # Dans sa période de diffusion et budget non épuisé (dépense suivie en mémoire)
+        return (
+            (self.start is None or self.start <= now)
+            and (self.end is None or now < self.end)
+            and not ad_events.exhausted(self.id, self.budget)
+        )
+
+    def matches(self, request: dict) -> bool:
+        # request : dimension -> ensemble des valeurs normalisées de la requête
+        for dimension, values in self.targets.items():
+            if values.isdisjoint(request.get(dimension, ())):
+                return False
+        return True
+
+
+class ServingIndex:
+    """Index inversé des campagnes actives (un par worker).
+
+    Pour chaque emplacement et chaque dimension de ciblage :
+    valeur -> campagnes qui la ciblent, plus les campagnes sans contrainte
+    sur cette dimension. Une campagne est éligible si, pour chaque
+    dimension, elle n'a pas de contrainte ou cible l'une des valeurs de la
+    requête (OU dans une dimension, ET entre dimensions).
+
+    Seul le premier chargement se fait pendant une requête ; ensuite l'index
+    est reconstruit en tâche de fond et l'ancien reste servi en attendant.
+    """
+
+    def __init__(self, refresh_seconds: float = AD_SERVING_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.campaigns = {}
+        self._by_position = {}   # emplacement -> {ids}
+        self._targeted = {}      # (emplacement, dimension) -> {valeur: {ids}}
+        self._untargeted = {}    # (emplacement, dimension) -> {ids}
+        self.loaded = False
+        self.rebuilds = 0
+        self._loaded_at = None
+        self._version = 0
+        self._lock = asyncio.Lock()
+        self._refresh = None
+
+    def upsert(self, advertisement):
+        # `advertisement` : objet avec ses targetings chargés
+        self.remove(advertisement.id)
+        self._version += 1
+        if _enum_value(advertisement.status) != AdStatusType.active.value:
+            return
+        campaign = Campaign(advertisement)
+        self.campaigns[campaign.id] = campaign
+        self._by_position.setdefault(campaign.position, set()).add(campaign.id)
+        for dimension in DIMENSIONS:
+            key = (campaign.position, dimension)
+            values = campaign.targets.get(dimension)
+            if values is None:
+                self._untargeted.setdefault(key, set()).add(campaign.id)
+                continue
+            postings = self._targeted.setdefault(key, {})
+            for value in values:
+                postings.setdefault(value, set()).add(campaign.id)
+
+    def remove(self, advertisement_id: int):
+        self._version += 1
+        campaign = self.campaigns.pop(advertisement_id, None)
+        if campaign is None:
+            return
+        self._by_position[campaign.position].discard(campaign.id)
+        for dimension in DIMENSIONS:
+            key = (campaign.position, dimension)
+            values = campaign.targets.get(dimension)
+            if values is None:
+                self._untargeted[key].discard(campaign.id)
+                continue
+            postings = self._targeted[key]
+            for value in values:
+                postings[value].discard(campaign.id)
+                if not postings[value]:
+                    del postings[value]
+
+    def _stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds
+
+    async def ensure_fresh(self, db):
+        # Reconstruction complète au plus toutes les refresh_seconds, pour
+        # voir les campagnes modifiées par les autres workers.
+        if not self._stale():
+            return
+        if self.loaded:
+            if self._refresh is None or self._refresh.done():
+                self._refresh = asyncio.create_task(self._refresh_in_background())
+            return
+        await self.rebuild(db)
+
+    async def _refresh_in_background(self):
+        try:
+            async with AsyncSessionLocal() as db:
+                await self.rebuild(db)
+        except Exception:
+            # L'index actuel reste servi ; nouvel essai à la prochaine requête
+            logger.exception("Échec de la reconstruction de l'index des campagnes")
+
+    async def rebuild(self, db):
+        async with self._lock:
+            if not self._stale():
+                return
+            version = self._version
+            result = await db.execute(
+                select(Advertisement)
+                .options(selectinload(Advertisement.targetings))
+                .where(Advertisement.status == AdStatusType.active)
+            )
+            fresh = ServingIndex(self.refresh_seconds)
+            for advertisement in result.scalars():
+                fresh.upsert(advertisement)
+            await ad_events.load_spend(db)
+            self.campaigns, self._by_position = fresh.campaigns, fresh._by_position
+            self._targeted, self._untargeted = fresh._targeted, fresh._untargeted
+            self.loaded = True
+            self.rebuilds += 1
+            # Modifié pendant le chargement : servi tel quel, reconstruit à la prochaine requête
+            self._loaded_at = time.monotonic() if version == self._version else None
+
+    def _candidates(self, position: str, request: dict):
+        # Point de départ le plus petit : pour la dimension la plus sélective,
+        # campagnes sans contrainte + campagnes ciblant une valeur demandée.
+        # Les autres dimensions sont vérifiées campagne par campagne.
+        best = None
+        for dimension in DIMENSIONS:
+            key = (position, dimension)
+            postings = self._targeted.get(key)
+            if not postings:
+                continue  # aucune campagne ne cible cette dimension
+            untargeted = self._untargeted.get(key, ())
+            matched = [postings[value] for value in request.get(dimension, ()) if value in postings]
+            size = len(untargeted) + sum(len(ids) for ids in matched)
+            if best is None or size < best[0]:
+                best = (size, untargeted, matched)
+        if best is None:
+            return self._by_position.get(position, ())
+        return set(best[1]).union(*best[2]) if best[2] else best[1]
+
+    def eligible(self, position: str, request: dict, now: datetime = None) -> list:
+        request = {dimension: set(values) for dimension, values in request.items()}
+        now = now or datetime.now(timezone.utc)
+        campaigns = (self.campaigns[campaign_id] for campaign_id in self._candidates(position, request))
+        return [campaign for campaign in campaigns if campaign.running(now) and campaign.matches(request)]
+
+    def serve(self, position: str, request: dict, limit: int = 1) -> list:
+        # Rotation aléatoire : tirages au hasard parmi les candidats, vérifiés
+        # un à un ; balayage complet seulement si les tirages ne suffisent pas
+        # (peu de candidats réellement éligibles).
+        request = {dimension: set(values) for dimension, values in request.items()}
+        candidates = tuple(self._candidates(position, request))
+        if not candidates:
+            return []
+        now = datetime.now(timezone.utc)
+        chosen = {}
+        for _ in range(4 * limit + 8):
+            campaign = self.campaigns[candidates[random.randrange(len(candidates))]]
+            if campaign.id not in chosen and campaign.running(now) and campaign.matches(request):
+                chosen[campaign.id] = campaign
+                if len(chosen) == limit:
+                    break
+        else:
+            eligible = [
+                self.campaigns[campaign_id] for campaign_id in candidates
+                if self.campaigns[campaign_id].running(now) and self.campaigns[campaign_id].matches(request)
+            ]
+            missing = [campaign for campaign in eligible if campaign.id not in chosen]
+            for campaign in random.sample(missing, min(limit - len(chosen), len(missing))):
+                chosen[campaign.id] = campaign
+        return [campaign.payload for campaign in chosen.values()]
+
+
+serving_index = ServingIndex()
@@ -0,0 +1,162 @@
+# ad_tracking.py
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select, func
+
+from database import AsyncSessionLocal, upsert_insert
+from models import AdvertisementStat
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = float(os.getenv("AD_EVENTS_FLUSH_SECONDS", "10"))
+FLUSH_CHUNK = int(os.getenv("AD_EVENTS_FLUSH_CHUNK", "1000"))
+# Coût d'un affichage (CPM, pour mille) et d'un clic, dans la devise du budget
+ADVERTISEMENT_CPM = float(os.getenv("ADVERTISEMENT_CPM", "2.0"))
+ADVERTISEMENT_CPC = float(os.getenv("ADVERTISEMENT_CPC", "0.20"))
+
+_COSTS = (ADVERTISEMENT_CPM / 1000, ADVERTISEMENT_CPC)
+
+
+def event_cost(impressions: int, clicks: int) -> float:
+    return impressions * ADVERTISEMENT_CPM / 1000 + clicks * ADVERTISEMENT_CPC
+
+
+def _day_start(day: int) -> datetime:
+    # Jour compté depuis l'epoch (UTC) -> minuit UTC, valeur de stat_date
+    return datetime.fromtimestamp(day * 86400, timezone.utc)
+
+
+class AdEventBuffer:
+    """Affichages et clics des campagnes, agrégés en mémoire (un tampon par worker).
+
+    Les événements sont cumulés par (campagne, jour) puis écrits par lots
+    dans advertisement_stats (upsert, une ligne par campagne et par jour).
+    La dépense de chaque campagne est suivie en mémoire pour arrêter sa
+    diffusion dès que son budget est atteint, sans attendre l'écriture.
+    """
+
+    def __init__(self, session_factory, flush_seconds: float = FLUSH_SECONDS, chunk_size: int = FLUSH_CHUNK):
+        self.session_factory = session_factory
+        self.flush_seconds = flush_seconds
+        self.chunk_size = chunk_size
+        self._pending = {}   # (advertisement_id, jour depuis l'epoch) -> [affichages, clics]
+        self._flushing = {}
+        self._spent_base = {}  # advertisement_id -> dépense écrite en base (tous workers)
+        self._spent_local = {}  # advertisement_id -> dépense de ce worker pas encore en base
+        self.events = 0
+        self.rows_written = 0
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def record(self, advertisement_id: int, kind: str = "impression"):
+        # Chemin chaud (chaque affichage de bannière) : pas d'objet datetime ici
+        key = (advertisement_id, int(time.time() // 86400))
+        counts = self._pending.get(key)
+        if counts is None:
+            counts = self._pending[key] = [0, 0]
+        index = 0 if kind == "impression" else 1
+        counts[index] += 1
+        self._spent_local[advertisement_id] = self._spent_local.get(advertisement_id, 0.0) + _COSTS[index]
+        self.events += 1
+
+    def spent(self, advertisement_id: int) -> float:
+        return self._spent_base.get(advertisement_id, 0.0) + self._spent_local.get(advertisement_id, 0.0)
+
+    def exhausted(self, advertisement_id: int, budget: float) -> bool:
+        # Budget nul = campagne sans plafond
+        return budget > 0 and self.spent(advertisement_id) >= budget
+
+    def forget(self, advertisement_id: int):
+        # Campagne supprimée : ses événements en attente ne peuvent plus être écrits
+        for key in [key for key in self._pending if key[0] == advertisement_id]:
+            del self._pending[key]
+        self._spent_base.pop(advertisement_id, None)
+        self._spent_local.pop(advertisement_id, None)
+
+    async def load_spend(self, db):
+        # Dépense cumulée en base, y compris les événements des autres workers.
+        # Sous le verrou de flush : un lot écrit pendant la lecture serait
+        # retiré de la dépense locale sans figurer dans la dépense relue.
+        async with self._lock:
+            result = await db.execute(
+                select(
+                    AdvertisementStat.advertisement_id,
+                    func.coalesce(func.sum(AdvertisementStat.views_count), 0),
+                    func.coalesce(func.sum(AdvertisementStat.clicks_count), 0),
+                ).group_by(AdvertisementStat.advertisement_id)
+            )
+            self._spent_base = {advertisement_id: event_cost(views, clicks) for advertisement_id, views, clicks in result.all()}
+
+    async def _write(self, db, rows: list):
+        upsert = upsert_insert(db, AdvertisementStat)
+        await db.execute(
+            upsert.values([
+                {"advertisement_id": advertisement_id, "stat_date": _day_start(day), "views_count": views, "clicks_count": clicks}
+                for (advertisement_id, day), (views, clicks) in rows
+            ]).on_conflict_do_update(
+                index_elements=[AdvertisementStat.advertisement_id, AdvertisementStat.stat_date],
+                set_={
+                    "views_count": func.coalesce(AdvertisementStat.views_count, 0) + upsert.excluded.views_count,
+                    "clicks_count": func.coalesce(AdvertisementStat.clicks_count, 0) + upsert.excluded.clicks_count,
+                },
+            )
+        )
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+            rows = list(self._flushing.items())
+            written = 0
+            try:
+                for start in range(0, len(rows), self.chunk_size):
+                    chunk = rows[start:start + self.chunk_size]
+                    async with self.session_factory() as db:
+                        async with db.begin():
+                            await self._write(db, chunk)
+                    written = start + len(chunk)
+                    self.rows_written += len(chunk)
+                    # Désormais comptés dans la dépense en base
+                    for (advertisement_id, _), (views, clicks) in chunk:
+                        self._spent_base[advertisement_id] = self._spent_base.get(advertisement_id, 0.0) + event_cost(views, clicks)
+                        local = self._spent_local.get(advertisement_id, 0.0) - event_cost(views, clicks)
+                        self._spent_local[advertisement_id] = max(local, 0.0)
+            except Exception:
+                logger.exception("Échec de l'écriture des statistiques de campagnes")
+                # Lots non écrits : remis dans le tampon (le jour d'origine est conservé)
+                for key, (views, clicks) in rows[written:]:
+                    counts = self._pending.setdefault(key, [0, 0])
+                    counts[0] += views
+                    counts[1] += clicks
+            finally:
+                self._flushing = {}
+
+    def stats(self) -> dict:
+        return {"events": self.events, "rows_written": self.rows_written, "pending_rows": len(self._pending)}
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+ad_events = AdEventBuffer(AsyncSessionLocal)
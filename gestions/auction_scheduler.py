@@ -0,0 +1,227 @@
+# auction_scheduler.py
+import asyncio
+import heapq
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, or_, select, update, insert, func
+
+from database import AsyncSessionLocal
+from models import Auction, AuctionStatus, AuctionWinner, Bid, NotificationType
+from bid_stream import hub
+from bidding import forget_auction
+from cache import entity_cache
+from notify import notify_many
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("AUCTION_CLOSER_BATCH_SIZE", "1000"))
+RELOAD_SECONDS = float(os.getenv("AUCTION_CLOSER_RELOAD_SECONDS", "30"))
+HORIZON_SECONDS = float(os.getenv("AUCTION_CLOSER_HORIZON_SECONDS", "3600"))
+
+OPEN_STATUSES = (AuctionStatus.pending, AuctionStatus.active)
+
+# Échéances gardées dans le tas : ouverture (pending -> active) et clôture
+START, END = "start", "end"
+
+
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class AuctionCloser:
+    """Ouvre les enchères à leur start_time, les ferme à leur end_time et
+    désigne les gagnants.
+
+    Les échéances proches sont gardées dans un tas (échéance, type,
+    auction_id) ; elles sont rechargées depuis la base au démarrage puis
+    périodiquement, ce qui couvre les redémarrages et les enchères créées
+    par d'autres workers.
+    """
+
+    def __init__(self, session_factory, batch_size=BATCH_SIZE, reload_seconds=RELOAD_SECONDS, horizon_seconds=HORIZON_SECONDS):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.reload_seconds = reload_seconds
+        self.horizon_seconds = horizon_seconds
+        self._heap = []
+        self._deadlines = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def _push(self, kind: str, auction_id: int, when: datetime):
+        deadline = _timestamp(when)
+        if deadline > time.time() + self.horizon_seconds or self._deadlines.get((kind, auction_id)) == deadline:
+            return
+        # Une ancienne entrée du tas pour cette enchère devient périmée
+        self._deadlines[(kind, auction_id)] = deadline
+        entry = (deadline, kind, auction_id)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] == entry:
+            self._wakeup.set()
+
+    def schedule(self, auction_id: int, end_time: datetime, start_time: datetime = None):
+        # start_time : enchère créée en attente, à ouvrir à cette date
+        if start_time is not None:
+            self._push(START, auction_id, start_time)
+        self._push(END, auction_id, end_time)
+
+    async def reload(self):
+        horizon = datetime.now(timezone.utc) + timedelta(seconds=self.horizon_seconds)
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(Auction.id, Auction.status, Auction.start_time, Auction.end_time)
+                .where(
+                    Auction.status.in_(OPEN_STATUSES),
+                    or_(Auction.end_time <= horizon, and_(Auction.status == AuctionStatus.pending, Auction.start_time <= horizon)),
+                )
+            )
+            for auction_id, status, start_time, end_time in result:
+                pending = status in (AuctionStatus.pending, AuctionStatus.pending.value)
+                self.schedule(auction_id, end_time, start_time if pending else None)
+
+    def _pop_due(self, now: float) -> tuple:
+        starts, ends = [], []
+        while self._heap and self._heap[0][0] <= now and len(starts) + len(ends) < self.batch_size:
+            deadline, kind, auction_id = heapq.heappop(self._heap)
+            if self._deadlines.get((kind, auction_id)) != deadline:
+                continue
+            del self._deadlines[(kind, auction_id)]
+            (starts if kind == START else ends).append(auction_id)
+        return starts, ends
+
+    async def activate(self, auction_ids: list) -> list:
+        now = datetime.now(timezone.utc)
+        async with self.session_factory() as db:
+            async with db.begin():
+                # Conditionnel : une enchère déjà ouverte, close ou décalée n'est pas touchée
+                result = await db.execute(
+                    update(Auction)
+                    .where(
+                        Auction.id.in_(auction_ids), Auction.status == AuctionStatus.pending,
+                        Auction.start_time <= now, Auction.end_time > now,
+                    )
+                    .values(status=AuctionStatus.active)
+                    .returning(Auction.id)
+                    .execution_options(synchronize_session=False)
+                )
+                started = result.scalars().all()
+        await entity_cache.invalidate_many("auction", started)
+        for auction_id in started:
+            hub.publish(auction_id, {"type": "started", "auction_id": auction_id, "status": AuctionStatus.active})
+        return started
+
+    async def settle(self, auction_ids: list) -> list:
+        now = datetime.now(timezone.utc)
+        async with self.session_factory() as db:
+            async with db.begin():
+                # Conditionnel : une enchère déjà fermée (autre worker) ou
+                # prolongée n'est pas touchée.
+                result = await db.execute(
+                    update(Auction)
+                    .where(Auction.id.in_(auction_ids), Auction.status.in_(OPEN_STATUSES), Auction.end_time <= now)
+                    .values(status=AuctionStatus.closed)
+                    .returning(Auction.id)
+                    .execution_options(synchronize_session=False)
+                )
+                closed = result.scalars().all()
+                if not closed:
+                    return []
+
+                ranked = (
+                    select(
+                        Bid.id, Bid.auction_id, Bid.bidder_id, Bid.amount,
+                        func.row_number().over(
+                            partition_by=Bid.auction_id,
+                            order_by=(Bid.amount.desc(), Bid.bid_time, Bid.id),
+                        ).label("rank"),
+                    )
+                    .where(Bid.auction_id.in_(closed))
+                    .subquery()
+                )
+                winners = (await db.execute(select(ranked).where(ranked.c.rank == 1))).all()
+                if winners:
+                    await db.execute(insert(AuctionWinner), [
+                        {"auction_id": w.auction_id, "winner_id": w.bidder_id, "winning_bid_id": w.id}
+                        for w in winners
+                    ])
+                    await notify_many(db, [
+                        {
+                            "user_id": w.bidder_id,
+                            "type": NotificationType.auction_won,
+                            "message": f"Vous avez remporté l'enchère #{w.auction_id} pour {w.amount}",
+                            "related_auction_id": w.auction_id,
+                            "related_bid_id": w.id,
+                        }
+                        for w in winners
+                    ])
+
+        await entity_cache.invalidate_many("auction", closed)
+        winning = {w.auction_id: w for w in winners}
+        for auction_id in closed:
+            forget_auction(auction_id)
+            winner = winning.get(auction_id)
+            hub.publish(auction_id, {
+                "type": "closed",
+                "auction_id": auction_id,
+                "winner_id": winner.bidder_id if winner else None,
+                "winning_bid_id": winner.id if winner else None,
+                "current_price": winner.amount if winner else None,
+            })
+        return closed
+
+    async def run(self):
+        # Premier passage : rechargement immédiat des échéances en attente
+        next_reload = time.time()
+        while True:
+            now = time.time()
+            starts, ends = self._pop_due(now)
+            if ends:
+                try:
+                    await self.settle(ends)
+                except Exception:
+                    # Les enchères restent ouvertes en base : le prochain
+                    # rechargement les reprogramme.
+                    logger.exception("Échec de la clôture de %d enchères", len(ends))
+            if starts:
+                try:
+                    await self.activate(starts)
+                except Exception:
+                    logger.exception("Échec de l'ouverture de %d enchères", len(starts))
+            if starts or ends:
+                continue
+            if now >= next_reload:
+                try:
+                    await self.reload()
+                except Exception:
+                    logger.exception("Échec du rechargement des échéances")
+                next_reload = now + self.reload_seconds
+                continue
+            timeout = next_reload - now
+            if self._heap:
+                timeout = min(timeout, self._heap[0][0] - now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+auction_closer = AuctionCloser(AsyncSessionLocal)
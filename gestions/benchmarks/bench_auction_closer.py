@@ -0,0 +1,92 @@
+# benchmarks/bench_auction_closer.py
+"""Clôture des enchères : clôtures par minute, objectif 100 000.
+
+    python benchmarks/bench_auction_closer.py [--auctions 100000] [--bids 3] [--batch-size 1000]
+
+Les enchères sont insérées déjà échues avec --bids offres chacune, puis
+rechargées par AuctionCloser.reload() comme après un redémarrage. La
+mesure couvre le dépilement du tas et settle() par lots : fermeture,
+désignation du gagnant, AuctionWinner et notification auction_won.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, select
+
+from common import percentile, setup_schema
+from auction_scheduler import AuctionCloser
+from database import AsyncSessionLocal
+from models import Ad, Auction, AuctionWinner, Bid, User
+
+CHUNK = 10000
+
+
+async def seed(auctions: int, bids: int):
+    rng = random.Random(1)
+    async with AsyncSessionLocal() as db:
+        users = [User(username=f"bench{index}", email=f"bench{index}@example.com", password_hash="x") for index in range(50)]
+        db.add_all(users)
+        await db.flush()
+        ad = Ad(user_id=users[0].id, title="Annonce")
+        db.add(ad)
+        await db.flush()
+        now = datetime.now(timezone.utc)
+        for offset in range(0, auctions, CHUNK):
+            result = await db.execute(insert(Auction).returning(Auction.id), [
+                {
+                    "ad_id": ad.id, "starting_price": 10, "current_price": 10, "bid_increment": 1, "status": "active",
+                    "start_time": now - timedelta(hours=2), "end_time": now - timedelta(seconds=1),
+                }
+                for _ in range(offset, min(auctions, offset + CHUNK))
+            ])
+            ids = result.scalars().all()
+            if bids:
+                await db.execute(insert(Bid), [
+                    {
+                        "auction_id": auction_id, "bidder_id": rng.choice(users).id, "amount": 10 + rng.randint(1, 500),
+                        "bid_time": now - timedelta(minutes=rng.randint(1, 60)),
+                    }
+                    for auction_id in ids for _ in range(bids)
+                ])
+        await db.commit()
+
+
+async def main(args):
+    await setup_schema()
+    start = time.perf_counter()
+    await seed(args.auctions, args.bids)
+    print(f"{args.auctions} enchères échues ({args.bids} offres chacune) insérées en {time.perf_counter() - start:.1f} s")
+
+    closer = AuctionCloser(AsyncSessionLocal, batch_size=args.batch_size)
+    start = time.perf_counter()
+    await closer.reload()
+    print(f"rechargement du tas : {len(closer._heap)} échéances en {time.perf_counter() - start:.2f} s")
+
+    batches, closed = [], 0
+    start = time.perf_counter()
+    while True:
+        _, ends = closer._pop_due(time.time())
+        if not ends:
+            break
+        batch_start = time.perf_counter()
+        closed += len(await closer.settle(ends))
+        batches.append(time.perf_counter() - batch_start)
+    elapsed = time.perf_counter() - start
+
+    async with AsyncSessionLocal() as db:
+        winners = (await db.execute(select(func.count()).select_from(AuctionWinner))).scalar_one()
+    print(
+        f"{closed} enchères closes ({winners} gagnants) en {elapsed:.2f} s : {closed / elapsed * 60:,.0f} clôtures/min, "
+        f"lot de {args.batch_size} p50 {percentile(batches, 0.5) * 1000:.0f} ms, p99 {percentile(batches, 0.99) * 1000:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--auctions", type=int, default=100000)
+    parser.add_argument("--bids", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,54 @@
+# benchmarks/bench_bid_stream.py
+"""Diffusion des offres : latence publication -> réception selon le nombre d'abonnés.
+
+    python benchmarks/bench_bid_stream.py [--subscribers 100,1000,5000,10000] [--messages 50]
+
+Chaque abonné est une tâche qui lit sa file comme le fait un flux SSE ou
+WebSocket. La latence mesurée va de l'appel à publish() à la lecture du
+message par l'abonné ; elle doit rester plate quand le nombre d'abonnés croît.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from common import percentile
+from bid_stream import AuctionHub
+
+
+async def measure(subscribers: int, messages: int) -> tuple:
+    hub = AuctionHub()
+    latencies = []
+
+    async def subscriber(subscription):
+        for _ in range(messages):
+            message = json.loads(await subscription.queue.get())
+            latencies.append(time.perf_counter() - message["sent"])
+
+    tasks = [asyncio.ensure_future(subscriber(hub.subscribe(1))) for _ in range(subscribers)]
+    await asyncio.sleep(0)
+    publish_times = []
+    for _ in range(messages):
+        start = time.perf_counter()
+        hub.publish(1, {"type": "bid", "sent": start})
+        publish_times.append(time.perf_counter() - start)
+        await asyncio.sleep(0.001)  # laisse les abonnés lire
+    await asyncio.gather(*tasks)
+    return publish_times, latencies
+
+
+async def main(args):
+    for subscribers in args.subscribers:
+        publish_times, latencies = await measure(subscribers, args.messages)
+        print(
+            f"{subscribers:6} abonnés : publish p50 {percentile(publish_times, 0.5) * 1000:.2f} ms, "
+            f"réception p50 {percentile(latencies, 0.5) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms, "
+            f"par abonné {percentile(publish_times, 0.5) / subscribers * 1e6:.2f} µs"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=lambda value: [int(part) for part in value.split(",")], default=[100, 1000, 5000, 10000])
+    parser.add_argument("--messages", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,96 @@
+# benchmarks/bench_bidding.py
+"""Offres concurrentes : offres acceptées par seconde et latence p99.
+
+    python benchmarks/bench_bidding.py [--bidders 200] [--bids 5000] [--cold 10000]
+
+Deux scénarios : toutes les offres sur une seule enchère (montants
+croissants dans l'ordre d'envoi ; une offre doublée par une plus haute est
+refusée), puis les offres réparties au hasard sur --cold enchères, chacune
+au-dessus du dernier prix vu.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import insert
+
+from common import client, login, percentile, setup_schema
+from database import AsyncSessionLocal
+from models import Ad, Auction, User
+
+
+async def seed(auctions: int) -> User:
+    async with AsyncSessionLocal() as db:
+        user = User(username="bench", email="bench@example.com", password_hash="x")
+        db.add(user)
+        await db.flush()
+        ad = Ad(user_id=user.id, title="Annonce")
+        db.add(ad)
+        await db.flush()
+        now = datetime.now(timezone.utc)
+        await db.execute(insert(Auction), [
+            {
+                "ad_id": ad.id, "starting_price": 10, "current_price": 10, "bid_increment": 1, "status": "active",
+                "start_time": now - timedelta(hours=1), "end_time": now + timedelta(days=1),
+            }
+            for _ in range(auctions)
+        ])
+        await db.commit()
+        return user
+
+
+async def run(http, bidders: int, bids: int, pick) -> tuple:
+    # pick(seen) -> (auction_id, amount) ; seen : dernier prix vu par enchère
+    seen, latencies, accepted = {}, [], 0
+    remaining = iter(range(bids))
+
+    async def bidder():
+        nonlocal accepted
+        for _ in remaining:
+            auction_id, amount = pick(seen)
+            start = time.perf_counter()
+            response = await http.post("/api/bids/", json={"auction_id": auction_id, "amount": str(amount)})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code == 201:
+                accepted += 1
+                seen[auction_id] = max(seen.get(auction_id, 0), amount)
+            else:
+                detail = response.json()["detail"]
+                if detail.startswith("Bid must be at least "):
+                    seen[auction_id] = max(seen.get(auction_id, 0), Decimal(detail.rsplit(" ", 1)[1]) - 1)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bidder() for _ in range(bidders)))
+    return accepted / (time.perf_counter() - start), latencies
+
+
+def report(label: str, rate: float, latencies: list):
+    print(f"{label:16} {rate:8.0f} offres acceptées/s, p50 {percentile(latencies, 0.5) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+
+async def main(args):
+    await setup_schema()
+    login(await seed(1 + args.cold))
+    async with client() as http:
+        amounts = itertools.count(11)
+        rate, latencies = await run(http, args.bidders, args.bids, lambda seen: (1, Decimal(next(amounts))))
+        report("1 enchère", rate, latencies)
+
+        def cold(seen):
+            auction_id = random.randint(2, args.cold + 1)
+            return auction_id, seen.get(auction_id, Decimal(10)) + 1
+
+        rate, latencies = await run(http, args.bidders, args.bids, cold)
+        report(f"{args.cold} enchères", rate, latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bidders", type=int, default=200)
+    parser.add_argument("--bids", type=int, default=5000)
+    parser.add_argument("--cold", type=int, default=10000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,144 @@
+# benchmarks/bench_feed.py
+"""Fil d'accueil pré-classé contre la liste d'annonces lue en base.
+
+    python benchmarks/bench_feed.py [--ads 200000] [--limit 20] [--repeat 50] [--concurrency 50] [--requests 2000]
+
+Compare GET /api/ads/feed (segments en mémoire, voir feed.py) à
+GET /api/ads/?status=active&cursor= (pagination par curseur en base), sur
+la page d'accueil puis sur une catégorie racine avec ses sous-catégories.
+La première requête du fil, qui le construit, est mesurée à part. Chaque
+page est mesurée en latence (requêtes successives) puis en débit
+(--concurrency clients simultanés). En dernier, la latence du fil pendant
+une reconstruction périodique, faite en tâche de fond pendant que
+l'ancien fil reste servi.
+
+Le débit est plafonné par la pile HTTP en mémoire (client httpx, FastAPI,
+middlewares), mesurée sur une route triviale ; le coût du traitement seul,
+hors HTTP, est donc mesuré à part. Sur SQLite, la lecture en flux
+d'aiosqlite bloque encore la boucle environ une seconde pendant la
+reconstruction : c'est le « max » de la dernière ligne.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, select
+
+from common import client, percentile, setup_schema, summary, timed
+from database import AsyncSessionLocal
+from feed import feed
+from models import Ad, AdStatus, Category, User
+from pagination import fetch_page
+from schemas import AdRead, Page
+from serialization import json_response, row_columns
+
+ROOTS = 20
+CHILDREN = 5
+
+
+async def seed(count: int) -> int:
+    rng = random.Random(1)
+    async with AsyncSessionLocal() as db:
+        user = User(username="bench", email="bench@example.com", password_hash="x")
+        roots = [Category(name=f"Racine {index}", slug=f"racine-{index}") for index in range(ROOTS)]
+        db.add_all([user, *roots])
+        await db.flush()
+        children = [
+            Category(name=f"Rubrique {root.id}.{index}", slug=f"rubrique-{root.id}-{index}", parent_id=root.id)
+            for root in roots for index in range(CHILDREN)
+        ]
+        db.add_all(children)
+        await db.flush()
+        leaves = [category.id for category in children]
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in range(0, count, 10000):
+            await db.execute(insert(Ad), [
+                {
+                    "user_id": user.id, "title": f"Annonce {index}", "category_id": rng.choice(leaves),
+                    "status": "active" if rng.random() < 0.8 else "expired", "is_featured": rng.random() < 0.02,
+                    "created_at": start + timedelta(seconds=index),
+                }
+                for index in range(offset, min(count, offset + 10000))
+            ])
+        await db.commit()
+        return roots[0].id
+
+
+async def throughput(http, url: str, concurrency: int, requests: int) -> float:
+    # Requêtes par seconde avec `concurrency` clients qui enchaînent les requêtes
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            assert (await http.get(url)).status_code == 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start)
+
+
+async def main(args):
+    await setup_schema()
+    root_id = await seed(args.ads)
+    async with client() as http:
+        start = time.perf_counter()
+        assert (await http.get(f"/api/ads/feed?limit={args.limit}")).status_code == 200
+        print(f"construction du fil {time.perf_counter() - start:.2f} s")
+        pages = (
+            ("accueil", f"/api/ads/feed?limit={args.limit}", f"/api/ads/?status=active&cursor=&limit={args.limit}"),
+            (
+                "catégorie",
+                f"/api/ads/feed?category_id={root_id}&limit={args.limit}",
+                f"/api/ads/?status=active&category_id={root_id}&include_subcategories=true&cursor=&limit={args.limit}",
+            ),
+        )
+        for label, feed_url, list_url in pages:
+            rates = {}
+            for mode, url in (("fil", feed_url), ("liste", list_url)):
+                response = await http.get(url)
+                assert response.status_code == 200 and len(response.json()["items"]) == args.limit, response.text
+                samples = [await timed(lambda: http.get(url)) for _ in range(args.repeat)]
+                rates[mode] = await throughput(http, url, args.concurrency, args.requests)
+                print(f"{mode:6} {label:10} {summary(samples)}, {rates[mode]:.0f} req/s à {args.concurrency} clients")
+            print(f"{'':6} {label:10} débit fil / liste : x{rates['fil'] / rates['liste']:.1f}")
+
+        # Plancher : route triviale (sans base), même pile HTTP et middlewares
+        floor = await throughput(http, "/api/cache/stats", args.concurrency, args.requests)
+        print(f"route triviale /api/cache/stats : {floor:.0f} req/s à {args.concurrency} clients")
+
+        # Traitement seul, hors HTTP : page du fil contre requête de la liste
+        async def list_page():
+            async with AsyncSessionLocal() as db:
+                query = select(*row_columns(Ad, AdRead)).where(Ad.status == AdStatus.active)
+                page = await fetch_page(db, query, [Ad.created_at, Ad.id], None, args.limit, {"status": "active"}, rows=True)
+                return json_response(Page[AdRead], page)
+
+        async def feed_page():
+            return feed.page(None, None, args.limit, {"category_id": None})
+
+        costs = {}
+        for mode, call in (("fil", feed_page), ("liste", list_page)):
+            samples = [await timed(call) for _ in range(args.repeat)]
+            costs[mode] = percentile(samples, 0.5)
+            print(f"{mode:6} traitement seul {summary(samples)}")
+        print(f"{'':6} traitement seul fil / liste : x{costs['liste'] / costs['fil']:.0f}")
+
+        # Fil périmé : les requêtes suivantes ne doivent pas attendre la reconstruction
+        feed._loaded_at -= feed.refresh_seconds
+        url = pages[0][1]
+        samples = [await timed(lambda: http.get(url))]
+        while not feed._refresh.done():
+            samples.append(await timed(lambda: http.get(url)))
+        print(f"fil pendant la reconstruction {summary(samples)}, max {max(samples) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
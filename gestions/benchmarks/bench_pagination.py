@@ -0,0 +1,67 @@
+# benchmarks/bench_pagination.py
+"""Page 1 contre page profonde, en mode offset et en mode curseur.
+
+    python benchmarks/bench_pagination.py [--ads 200000] [--limit 20] [--repeat 20]
+
+La page profonde est la dernière (page 10 000 avec les valeurs par défaut).
+En mode offset son coût croît avec la profondeur ; en mode curseur il doit
+rester celui de la page 1.
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, select
+
+from common import client, setup_schema, summary, timed
+from database import AsyncSessionLocal
+from models import Ad, User
+from pagination import encode_cursor
+
+
+async def seed(count: int):
+    async with AsyncSessionLocal() as db:
+        user = User(username="bench", email="bench@example.com", password_hash="x")
+        db.add(user)
+        await db.flush()
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in range(0, count, 10000):
+            await db.execute(insert(Ad), [
+                {"user_id": user.id, "title": f"Annonce {index}", "status": "active", "created_at": start + timedelta(seconds=index)}
+                for index in range(offset, min(count, offset + 10000))
+            ])
+        await db.commit()
+
+
+async def cursor_at(depth: int) -> str:
+    # Curseur tel que renvoyé par la page précédant `depth` (0 = première page)
+    if depth == 0:
+        return ""
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(Ad.created_at, Ad.id).order_by(Ad.created_at.desc(), Ad.id.desc()).offset(depth - 1).limit(1)
+        )).one()
+    return encode_cursor([row.created_at, row.id], {"status": None, "category_id": None, "include_subcategories": None})
+
+
+async def main(args):
+    await setup_schema()
+    await seed(args.ads)
+    deep = args.ads - args.limit
+    async with client() as http:
+        for label, skip in (("page 1", 0), (f"page {deep // args.limit + 1}", deep)):
+            cursor = await cursor_at(skip)
+            offset_url = f"/api/ads/?skip={skip}&limit={args.limit}"
+            cursor_url = f"/api/ads/?cursor={cursor}&limit={args.limit}"
+            for mode, url in (("offset", offset_url), ("curseur", cursor_url)):
+                assert (await http.get(url)).status_code == 200
+                samples = [await timed(lambda: http.get(url)) for _ in range(args.repeat)]
+                print(f"{mode:8} {label:12} {summary(samples)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,57 @@
+# benchmarks/bench_password_hashing.py
+"""Latence d'un autre endpoint pendant une rafale d'inscriptions.
+
+    python benchmarks/bench_password_hashing.py [--signups 40] [--probes 200] [--on-loop]
+
+Mesure GET /api/categories/ au repos, puis pendant --signups inscriptions
+simultanées (bcrypt au coût BCRYPT_ROUNDS). --on-loop refait la mesure
+avec le hachage exécuté sur la boucle d'événements, comme avant le pool de
+threads, pour comparaison.
+"""
+import argparse
+import asyncio
+import time
+
+from common import client, setup_schema, summary, timed
+from routers import users
+from security import BCRYPT_ROUNDS, pwd_context
+
+
+async def probe(http, count: int) -> list:
+    samples = []
+    for _ in range(count):
+        samples.append(await timed(lambda: http.get("/api/categories/")))
+        await asyncio.sleep(0.005)
+    return samples
+
+
+async def hash_on_loop(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+async def main(args):
+    await setup_schema()
+    if args.on_loop:
+        users.hash_password = hash_on_loop
+    async with client() as http:
+        await http.get("/api/categories/")
+        print(f"au repos            {summary(await probe(http, args.probes))}")
+        start = time.perf_counter()
+        signups = asyncio.gather(*(
+            http.post("/api/users/", json={"username": f"user{index}", "email": f"user{index}@example.com", "password": "mot-de-passe"})
+            for index in range(args.signups)
+        ))
+        samples = await probe(http, args.probes)
+        responses = await signups
+        elapsed = time.perf_counter() - start
+        assert all(response.status_code == 201 for response in responses)
+        print(f"pendant inscriptions {summary(samples)}")
+        print(f"{args.signups} inscriptions (bcrypt coût {BCRYPT_ROUNDS}) en {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--signups", type=int, default=40)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--on-loop", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,66 @@
+# benchmarks/bench_search.py
+"""Recherche plein texte : latence de GET /api/ads/search?q=… sur un gros volume.
+
+    python benchmarks/bench_search.py [--ads 1000000] [--repeat 20]
+
+Sur Postgres la requête passe par l'index GIN idx_ads_search
+(migrations/007_full_text_search.sql) ; sur SQLite par l'index inversé en
+mémoire, chargé avant la première mesure. Les textes sont tirés d'un petit
+vocabulaire avec accents, pour avoir des termes fréquents et des termes rares.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import insert
+
+from common import client, setup_schema, summary, timed
+from database import AsyncSessionLocal
+from models import Ad, User
+
+COMMON = ["vélo", "voiture", "canapé", "téléphone", "maison", "appartement", "table", "chaise", "lampe", "manteau"]
+QUALIFIERS = ["neuf", "occasion", "très bon état", "à réparer", "électrique", "ancien", "récent", "garanti"]
+RARE = [f"référence{index}" for index in range(5000)]
+
+QUERIES = ["velo", "vélo électrique", "canape occasion", "maison récente", "référence42", "telephone garanti neuf"]
+
+
+async def seed(count: int):
+    rng = random.Random(1)
+    async with AsyncSessionLocal() as db:
+        user = User(username="bench", email="bench@example.com", password_hash="x")
+        db.add(user)
+        await db.flush()
+        for offset in range(0, count, 10000):
+            await db.execute(insert(Ad), [
+                {
+                    "user_id": user.id, "status": "active", "is_featured": rng.random() < 0.05,
+                    "title": f"{rng.choice(COMMON)} {rng.choice(QUALIFIERS)}",
+                    "description": " ".join([rng.choice(COMMON), rng.choice(QUALIFIERS), rng.choice(RARE)]),
+                }
+                for _ in range(offset, min(count, offset + 10000))
+            ])
+        await db.commit()
+
+
+async def main(args):
+    await setup_schema()
+    start = time.perf_counter()
+    await seed(args.ads)
+    print(f"{args.ads} annonces insérées en {time.perf_counter() - start:.1f} s")
+    async with client() as http:
+        start = time.perf_counter()
+        assert (await http.get("/api/ads/search?q=vélo&limit=20")).status_code == 200
+        print(f"première requête (chargement éventuel de l'index) {time.perf_counter() - start:.2f} s")
+        for q in QUERIES:
+            url = f"/api/ads/search?q={q}&limit=20"
+            samples = [await timed(lambda: http.get(url)) for _ in range(args.repeat)]
+            print(f"{q:24} {summary(samples)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,88 @@
+# benchmarks/bench_serialization.py
+"""Sérialisation des listes : objets ORM + response_model contre json_response.
+
+    python benchmarks/bench_serialization.py [--ads 5000] [--rows 1000] [--repeat 30]
+
+Même page de --rows annonces servie par deux routes : GET /api/ads/ (colonnes
+lues en dicts, JSON encodé par pydantic-core, voir serialization.py) et une
+route de référence qui renvoie les objets ORM et laisse FastAPI appliquer
+response_model, comme avant. Les deux corps sont comparés octet pour octet
+avant la mesure ; les temps sont donnés pour 1000 lignes.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import insert
+from sqlalchemy.future import select
+
+from common import client, percentile, setup_schema
+from database import AsyncSessionLocal, get_db
+from models import Ad, User
+from schemas import AdRead
+
+reference = FastAPI()
+
+
+@reference.get("/ads", response_model=List[AdRead])
+async def reference_ads(limit: int, db=Depends(get_db)):
+    return (await db.execute(select(Ad).limit(limit))).scalars().all()
+
+
+async def seed(count: int):
+    rng = random.Random(1)
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        user = User(username="bench", email="bench@example.com", password_hash="x")
+        db.add(user)
+        await db.flush()
+        await db.execute(insert(Ad), [
+            {
+                "user_id": user.id, "status": "active", "title": f"Annonce {index}", "price": rng.randint(1, 100000) / 100,
+                "description": "Très bon état, peu servi" if index % 2 else None, "location": "Lyon",
+                "latitude": 45.76 + rng.random() / 10, "longitude": 4.83 + rng.random() / 10,
+                "created_at": now - timedelta(seconds=index), "expires_at": now + timedelta(days=30),
+            }
+            for index in range(count)
+        ])
+        await db.commit()
+
+
+async def measure(http, url: str, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await http.get(url)
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    return samples
+
+
+async def main(args):
+    await setup_schema()
+    await seed(args.ads)
+    scale = 1000 / args.rows
+    transport = httpx.ASGITransport(app=reference)
+    async with client() as http, httpx.AsyncClient(transport=transport, base_url="http://bench") as ref:
+        fast_url, slow_url = f"/api/ads/?limit={args.rows}", f"/ads?limit={args.rows}"
+        fast, slow = await http.get(fast_url), await ref.get(slow_url)
+        print(f"corps identiques : {fast.content == slow.content} ({len(fast.content)} octets)")
+        results = {}
+        for label, session, url in (("ORM + response_model", ref, slow_url), ("json_response", http, fast_url)):
+            samples = await measure(session, url, args.repeat)
+            results[label] = percentile(samples, 0.5) * scale
+            print(f"{label:22} p50 {results[label] * 1000:.2f} ms, p99 {percentile(samples, 0.99) * scale * 1000:.2f} ms pour 1000 lignes")
+        print(f"gain : x{results['ORM + response_model'] / results['json_response']:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=5000)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=30)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+# benchmarks/bench_stripe_webhooks.py
+"""Rafale de webhooks Stripe : latence d'accusé de réception et vidage des files.
+
+    python benchmarks/bench_stripe_webhooks.py [--events 5000] [--concurrency 100] [--duplicates 0.1]
+
+Générateur local d'événements Stripe signés : payment_intent.succeeded et
+charge.refunded sur des paiements existants, customer.subscription.updated,
+plus une part de relivraisons (même event_id). La rafale est postée sur
+POST /api/webhooks/stripe avec les tâches de traitement démarrées ; on mesure
+la latence de réponse (enregistrement seul) puis le temps jusqu'à ce que
+tous les événements soient traités.
+"""
+import os
+
+os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_bench")
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from sqlalchemy import func, insert, select
+
+from common import client, setup_schema, summary
+from database import AsyncSessionLocal
+from models import Payment, StripeWebhookLog, User
+from stripe_events import STRIPE_WEBHOOK_SECRET, sign_payload, stripe_events
+
+
+def fake_events(count: int, payments: int, duplicates: float, rng: random.Random) -> list:
+    # Corps JSON prêts à signer ; une relivraison reprend un corps déjà émis
+    events = []
+    for index in range(count):
+        if events and rng.random() < duplicates:
+            events.append(rng.choice(events))
+            continue
+        intent = f"pi_{rng.randrange(payments)}"
+        kind = rng.random()
+        if kind < 0.7:
+            event_type, obj = "payment_intent.succeeded", {"id": intent, "object": "payment_intent"}
+        elif kind < 0.9:
+            event_type = "charge.refunded"
+            obj = {"id": f"ch_{index}", "object": "charge", "payment_intent": intent, "refunded": True,
+                   "refunds": {"data": [{"id": f"re_{index}"}]}}
+        else:
+            event_type = "customer.subscription.updated"
+            obj = {"id": f"sub_{rng.randrange(100)}", "object": "subscription", "customer": "cus_bench", "status": "active",
+                   "metadata": {"user_id": "1"}, "items": {"data": [{"price": {"id": "price_pro", "nickname": "pro"}}]}}
+        events.append(json.dumps({"id": f"evt_{index}", "type": event_type, "created": int(time.time()), "data": {"object": obj}}).encode())
+    return events
+
+
+async def seed(payments: int):
+    async with AsyncSessionLocal() as db:
+        user = User(username="bench", email="bench@example.com", password_hash="x")
+        db.add(user)
+        await db.flush()
+        await db.execute(insert(Payment), [
+            {"user_id": user.id, "amount": 10 + index % 90, "currency": "EUR", "payment_status": "pending", "payment_intent_id": f"pi_{index}"}
+            for index in range(payments)
+        ])
+        await db.commit()
+
+
+async def main(args):
+    await setup_schema()
+    await seed(args.payments)
+    events = fake_events(args.events, args.payments, args.duplicates, random.Random(1))
+    distinct = len(set(events))
+    stripe_events.start()
+    latencies = []
+    remaining = iter(events)
+
+    async def sender(http):
+        for payload in remaining:
+            start = time.perf_counter()
+            # Signé à l'envoi, comme Stripe : horodatage dans la tolérance
+            response = await http.post(
+                "/api/webhooks/stripe", content=payload,
+                headers={"Stripe-Signature": sign_payload(payload, STRIPE_WEBHOOK_SECRET), "Content-Type": "application/json"},
+            )
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+
+    try:
+        async with client() as http:
+            start = time.perf_counter()
+            await asyncio.gather(*(sender(http) for _ in range(args.concurrency)))
+            acked = time.perf_counter() - start
+            await asyncio.gather(*(queue.join() for queue in stripe_events._queues))
+            drained = time.perf_counter() - start
+    finally:
+        await stripe_events.stop()
+
+    async with AsyncSessionLocal() as db:
+        pending = (await db.execute(select(func.count()).where(StripeWebhookLog.processed_at.is_(None)))).scalar_one()
+    stats = stripe_events.stats()
+    print(f"{len(events)} événements postés ({distinct} distincts), {args.concurrency} envois simultanés")
+    print(f"accusé de réception : {summary(latencies)}, rafale acceptée en {acked:.2f} s ({len(events) / acked:.0f} événements/s)")
+    print(f"files vidées {drained - acked:.2f} s après le dernier accusé, {drained:.2f} s au total ({distinct / drained:.0f} événements traités/s)")
+    print(
+        f"traités {stats['processed']}, doublons {stats['duplicates']}, débordements {stats['overflow']}, "
+        f"échecs {stats['failed']}, encore en attente en base {pending}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--payments", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duplicates", type=float, default=0.1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,54 @@
+# benchmarks/common.py
+"""Outils communs aux scripts de mesure : python benchmarks/bench_<sujet>.py
+
+Par défaut les mesures tournent sur une base SQLite jetable créée par
+metadata.create_all. Avec DATABASE_URL=postgresql+asyncpg://… elles
+tournent sur cette base, qui doit être dédiée aux mesures : le schéma doit
+y exister (bd.sql puis migrate.py) et les scripts y insèrent leurs données.
+"""
+import os
+import sys
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(prefix='gestions-bench-'), 'bench.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import database
+import main
+from models import Base, User
+
+
+async def setup_schema():
+    if database.engine.dialect.name == "sqlite":
+        async with database.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+
+def client() -> httpx.AsyncClient:
+    # Application appelée en mémoire, sans serveur ni réseau (lifespan non démarré)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+
+
+def login(user):
+    # Même remplacement de l'utilisateur courant que dans les tests
+    main.app.dependency_overrides[User] = lambda: user
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summary(samples: list) -> str:
+    # Durées en secondes -> médiane et p99 en ms
+    return f"p50 {percentile(samples, 0.5) * 1000:.2f} ms, p99 {percentile(samples, 0.99) * 1000:.2f} ms ({len(samples)} mesures)"
+
+
+async def timed(call) -> float:
+    start = time.perf_counter()
+    await call()
+    return time.perf_counter() - start
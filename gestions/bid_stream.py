@@ -0,0 +1,131 @@
+# bid_stream.py
+import asyncio
+import json
+import os
+from collections import defaultdict
+
+QUEUE_SIZE = int(os.getenv("BID_STREAM_QUEUE_SIZE", "32"))
+KEEPALIVE_SECONDS = float(os.getenv("BID_STREAM_KEEPALIVE_SECONDS", "15"))
+
+
+class Subscription:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, maxsize: int):
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def offer(self, message: str):
+        # File pleine : le client est trop lent, on jette le plus ancien
+        # message plutôt que de bloquer la diffusion (seul le dernier prix compte).
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class AuctionHub:
+    """Pub/sub en mémoire : une file bornée par abonné et par enchère."""
+
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, auction_id: int) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        self._subscribers[auction_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, auction_id: int, subscription: Subscription):
+        subscribers = self._subscribers.get(auction_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[auction_id]
+
+    def publish(self, auction_id: int, event: dict):
+        subscribers = self._subscribers.get(auction_id)
+        if not subscribers:
+            return
+        # Encodé une seule fois, partagé par tous les abonnés ; aucun await :
+        # un abonné lent ne peut pas retarder les autres.
+        message = json.dumps(event, default=str)
+        for subscription in tuple(subscribers):
+            subscription.offer(message)
+
+    def subscriber_count(self, auction_id: int = None) -> int:
+        if auction_id is not None:
+            return len(self._subscribers.get(auction_id, ()))
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+hub = AuctionHub()
+
+
+def auction_snapshot(auction) -> dict:
+    return {
+        "type": "snapshot",
+        "auction_id": auction.id,
+        "status": auction.status,
+        "current_price": auction.current_price,
+        "end_time": auction.end_time.isoformat(),
+    }
+
+
+def publish_bid(bid):
+    # Une offre acceptée devient le prix courant de l'enchère
+    hub.publish(bid.auction_id, {
+        "type": "bid",
+        "auction_id": bid.auction_id,
+        "bid_id": bid.id,
+        "bidder_id": bid.bidder_id,
+        "amount": bid.amount,
+        "current_price": bid.amount,
+        "bid_time": bid.bid_time.isoformat() if bid.bid_time else None,
+    })
+
+
+async def sse_events(auction_id: int, snapshot: dict):
+    subscription = hub.subscribe(auction_id)
+    try:
+        yield f"data: {json.dumps(snapshot, default=str)}\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"data: {message}\n\n"
+    finally:
+        hub.unsubscribe(auction_id, subscription)
+
+
+async def websocket_events(websocket, auction_id: int, snapshot: dict):
+    # Attend à la fois le client et la file : une déconnexion est vue tout
+    # de suite, même si l'enchère reste silencieuse. Sans message pendant
+    # KEEPALIVE_SECONDS, un keepalive détecte aussi les connexions mortes.
+    subscription = hub.subscribe(auction_id)
+    receiver = asyncio.ensure_future(websocket.receive())
+    getter = None
+    try:
+        await websocket.send_text(json.dumps(snapshot, default=str))
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait((receiver, getter), timeout=KEEPALIVE_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                await websocket.send_text(getter.result())
+                getter = None
+            elif not done:
+                await websocket.send_text('{"type":"keepalive"}')
+            if receiver in done:
+                if receiver.result()["type"] == "websocket.disconnect":
+                    return
+                # Messages du client ignorés : le flux est en lecture seule
+                receiver = asyncio.ensure_future(websocket.receive())
+    finally:
+        for task in (receiver, getter):
+            if task is not None:
+                task.cancel()
+        hub.unsubscribe(auction_id, subscription)
@@ -0,0 +1,128 @@
+# bidding.py
+import asyncio
+import logging
+import os
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, func
+
+from models import Auction, AuctionStatus, Bid, NotificationType
+from bid_stream import publish_bid
+from cache import entity_cache
+from notify import fan_out
+
+logger = logging.getLogger(__name__)
+
+# Nombre d'enchères dont ce worker garde le montant minimum en mémoire
+BID_FLOOR_CACHE_SIZE = int(os.getenv("BID_FLOOR_CACHE_SIZE", "10000"))
+
+# Un verrou par enchère : dans un worker, les enchérisseurs d'une même enchère
+# passent l'un après l'autre au lieu d'attendre le verrou de ligne en
+# bloquant chacun une connexion. Les autres enchères ne sont jamais bloquées.
+_auction_locks = weakref.WeakValueDictionary()
+
+# Montant minimum de la prochaine enchère, tel que vu par ce worker. Le prix
+# d'une enchère ne fait que monter : une offre en dessous peut être refusée
+# sans aller en base. Borné (LRU) et purgé dès qu'une enchère n'est plus
+# ouverte, y compris dans les workers qui ne l'ont pas fermée.
+_min_next_amount = OrderedDict()
+
+
+def _lock_for(auction_id: int) -> asyncio.Lock:
+    lock = _auction_locks.get(auction_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _auction_locks[auction_id] = lock
+    return lock
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _remember_floor(auction_id: int, amount: Decimal):
+    _min_next_amount[auction_id] = amount
+    _min_next_amount.move_to_end(auction_id)
+    while len(_min_next_amount) > BID_FLOOR_CACHE_SIZE:
+        _min_next_amount.popitem(last=False)
+
+
+def forget_auction(auction_id: int):
+    _min_next_amount.pop(auction_id, None)
+
+
+async def _reject(db, auction_id: int):
+    # L'UPDATE conditionnel n'a rien modifié : on relit l'enchère pour
+    # expliquer pourquoi.
+    auction = await db.get(Auction, auction_id)
+    if not auction:
+        forget_auction(auction_id)
+        raise HTTPException(status_code=404, detail="Auction not found")
+    if auction.status != AuctionStatus.active:
+        forget_auction(auction_id)
+        raise HTTPException(status_code=400, detail="Auction is not active")
+    now = datetime.now(timezone.utc)
+    if _as_utc(auction.start_time) > now or _as_utc(auction.end_time) <= now:
+        forget_auction(auction_id)
+        raise HTTPException(status_code=400, detail="Auction is not open for bidding")
+    minimum = auction.current_price + auction.bid_increment
+    _remember_floor(auction_id, minimum)
+    raise HTTPException(status_code=400, detail=f"Bid must be at least {minimum}")
+
+
+async def place_bid(db, auction_id: int, bidder_id: int, amount: Decimal) -> Bid:
+    floor = _min_next_amount.get(auction_id)
+    if floor is not None and amount < floor:
+        raise HTTPException(status_code=400, detail=f"Bid must be at least {floor}")
+
+    async with _lock_for(auction_id):
+        # Validation et mise à jour du prix en une seule instruction : la
+        # ligne de l'enchère est verrouillée jusqu'au commit, deux offres
+        # concurrentes ne peuvent pas être acceptées au même prix.
+        result = await db.execute(
+            update(Auction)
+            .where(
+                Auction.id == auction_id,
+                Auction.status == AuctionStatus.active,
+                Auction.start_time <= func.now(),
+                Auction.end_time > func.now(),
+                Auction.current_price + Auction.bid_increment <= amount,
+            )
+            .values(current_price=amount)
+            .returning(Auction.bid_increment)
+            .execution_options(synchronize_session=False)
+        )
+        row = result.first()
+        if row is None:
+            await db.rollback()
+            await _reject(db, auction_id)
+
+        bid = Bid(auction_id=auction_id, bidder_id=bidder_id, amount=amount)
+        db.add(bid)
+        await db.commit()
+        _remember_floor(auction_id, amount + row.bid_increment)
+
+    await entity_cache.invalidate("auction", auction_id)
+    await db.refresh(bid)
+    publish_bid(bid)
+    await _notify_outbid(db, bid)
+    return bid
+
+
+async def _notify_outbid(db, bid: Bid):
+    # Hors du verrou et après le commit : une erreur ici n'annule pas l'offre
+    previous_bidders = select(Bid.bidder_id).where(Bid.auction_id == bid.auction_id, Bid.bidder_id != bid.bidder_id)
+    try:
+        await fan_out(
+            db, previous_bidders, NotificationType.bid_placed,
+            f"Nouvelle offre de {bid.amount} sur l'enchère #{bid.auction_id}",
+            related_auction_id=bid.auction_id, related_bid_id=bid.id,
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        logger.exception("Échec des notifications de l'offre #%s", bid.id)
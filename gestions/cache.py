@@ -0,0 +1,151 @@
+# cache.py
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+
+_MISSING = object()
+
+
+class InMemoryLRUBackend:
+    """Cache local au worker : éviction LRU au-delà de max_entries, expiration par TTL."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # clé -> (expire_à, valeur)
+        self.evictions = 0
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _set(self, key, value, ttl=None):
+        self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key):
+        return self._get(key)
+
+    async def set(self, key, value, ttl=None):
+        self._set(key, value, ttl)
+
+    async def delete(self, key):
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalSharedBackend(InMemoryLRUBackend):
+    """Remplaçant local d'un cache partagé (type Redis).
+
+    Même interface asynchrone, mais les valeurs sont stockées sérialisées en
+    JSON comme elles le seraient sur le réseau : ce qui passe ici passera
+    avec un vrai client partagé.
+    """
+
+    async def get(self, key):
+        raw = self._get(key)
+        return raw if raw is _MISSING else json.loads(raw)
+
+    async def set(self, key, value, ttl=None):
+        self._set(key, json.dumps(value).encode(), ttl)
+
+
+class EntityCache:
+    """Cache en lecture seule devant la base (read-through).
+
+    Une seule requête par clé absente, même sous forte concurrence : les
+    lectures suivantes attendent le chargement en cours (garde anti-stampede).
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self._inflight = {}
+        self._stale = set()
+
+    @staticmethod
+    def key(kind: str, entity_id) -> str:
+        return f"{kind}:{entity_id}"
+
+    async def get_or_load(self, kind: str, entity_id, loader):
+        key = self.key(kind, entity_id)
+        value = await self.backend.get(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            self.loads += 1
+            value = await loader()
+            # Invalidé pendant le chargement : la valeur lue est peut-être déjà périmée
+            if value is not None and key not in self._stale:
+                await self.backend.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # évite l'avertissement si personne n'attendait
+            raise
+        finally:
+            del self._inflight[key]
+            self._stale.discard(key)
+
+    async def invalidate(self, kind: str, entity_id):
+        key = self.key(kind, entity_id)
+        self.invalidations += 1
+        if key in self._inflight:
+            self._stale.add(key)
+        await self.backend.delete(key)
+
+    async def invalidate_many(self, kind: str, entity_ids):
+        for entity_id in entity_ids:
+            await self.invalidate(kind, entity_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "evictions": self.backend.evictions,
+        }
+
+
+_BACKENDS = {"memory": InMemoryLRUBackend, "shared": LocalSharedBackend}
+
+entity_cache = EntityCache(_BACKENDS[CACHE_BACKEND]())
@@ -0,0 +1,104 @@
+# category_tree.py
+import asyncio
+import os
+import time
+
+from sqlalchemy import select
+
+from models import Category
+
+CATEGORY_TREE_TTL = float(os.getenv("CATEGORY_TREE_TTL", "300"))
+
+
+class CategoryNode:
+    __slots__ = ("id", "parent_id", "name", "slug", "ancestors", "descendants", "path")
+
+    def __init__(self, id, parent_id, name, slug):
+        self.id = id
+        self.parent_id = parent_id
+        self.name = name
+        self.slug = slug
+        self.ancestors = ()          # ids, de la racine au parent direct
+        self.descendants = frozenset()
+        self.path = ()               # slugs, de la racine au nœud
+
+
+def build_nodes(rows) -> dict:
+    nodes = {row.id: CategoryNode(row.id, row.parent_id, row.name, row.slug) for row in rows}
+    children = {}
+    for node in nodes.values():
+        if node.parent_id in nodes and node.parent_id != node.id:
+            children.setdefault(node.parent_id, []).append(node.id)
+
+    # Parcours depuis les racines (parent absent) ; un cycle éventuel dans
+    # parent_id n'est jamais atteint et ses nœuds restent isolés.
+    roots = [node.id for node in nodes.values() if node.parent_id not in nodes or node.parent_id == node.id]
+    order = []
+    stack = [(root, (), ()) for root in roots]
+    while stack:
+        node_id, ancestors, path = stack.pop()
+        node = nodes[node_id]
+        node.ancestors = ancestors
+        node.path = path + (node.slug,)
+        order.append(node_id)
+        for child_id in children.get(node_id, ()):
+            stack.append((child_id, ancestors + (node_id,), node.path))
+
+    # Descendants : les enfants sont toujours visités après leur parent,
+    # on remonte donc l'ordre de parcours à l'envers.
+    descendants = {node_id: set() for node_id in order}
+    for node_id in reversed(order):
+        for child_id in children.get(node_id, ()):
+            descendants[node_id].add(child_id)
+            descendants[node_id] |= descendants[child_id]
+    for node_id, ids in descendants.items():
+        nodes[node_id].descendants = frozenset(ids)
+    return nodes
+
+
+class CategoryTree:
+    """Arbre des catégories matérialisé en mémoire (un par worker).
+
+    Reconstruit à la demande après invalidation par le router des catégories,
+    et au plus tard toutes les CATEGORY_TREE_TTL secondes pour voir les
+    modifications faites par les autres workers.
+    """
+
+    def __init__(self, ttl: float = CATEGORY_TREE_TTL):
+        self.ttl = ttl
+        self._nodes = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._nodes = None
+        self._version += 1
+
+    def _fresh(self) -> bool:
+        return self._nodes is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def nodes(self, db) -> dict:
+        if not self._fresh():
+            async with self._lock:
+                if not self._fresh():
+                    version = self._version
+                    result = await db.execute(select(Category.id, Category.parent_id, Category.name, Category.slug))
+                    nodes = build_nodes(result.all())
+                    # Invalidé pendant le chargement : servi une fois, rechargé ensuite
+                    self._nodes = nodes
+                    self._loaded_at = time.monotonic() if version == self._version else 0.0
+                    return nodes
+        return self._nodes
+
+    async def get(self, db, category_id: int):
+        return (await self.nodes(db)).get(category_id)
+
+    async def subtree_ids(self, db, category_id: int) -> list:
+        node = await self.get(db, category_id)
+        if node is None:
+            return [category_id]
+        return [category_id, *node.descendants]
+
+
+category_tree = CategoryTree()
@@ -0,0 +1,163 @@
+# counters.py
+import asyncio
+import inspect
+import logging
+import os
+
+from sqlalchemy import Integer, bindparam, column, func, select, update, values
+
+from database import AsyncSessionLocal, upsert_insert
+from models import AccountType, Ad, ProStat, User
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = float(os.getenv("COUNTERS_FLUSH_SECONDS", "5"))
+FLUSH_CHUNK = int(os.getenv("COUNTERS_FLUSH_CHUNK", "1000"))
+
+FIELDS = ("views", "messages", "favorites")
+
+
+class AdCounterBuffer:
+    """Compteurs d'annonces en écriture différée (un tampon par worker).
+
+    Les événements (vues, messages, favoris) sont agrégés en mémoire puis
+    appliqués périodiquement à ads.views_count et pro_stats (annonces des
+    vendeurs pro, ligne créée au besoin) par lots d'au plus FLUSH_CHUNK
+    annonces, une instruction par table et par lot.
+    """
+
+    def __init__(self, session_factory, flush_seconds: float = FLUSH_SECONDS, chunk_size: int = FLUSH_CHUNK):
+        self.session_factory = session_factory
+        self.flush_seconds = flush_seconds
+        self.chunk_size = chunk_size
+        self.on_flush = []   # rappels(ad_ids), éventuellement async, après chaque lot écrit
+        self._pending = {}   # ad_id -> [vues, messages, favoris]
+        self._flushing = {}  # lot en cours d'écriture, encore compté à la lecture
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def record(self, ad_id: int, field: str = "views", amount: int = 1):
+        deltas = self._pending.get(ad_id)
+        if deltas is None:
+            deltas = self._pending[ad_id] = [0, 0, 0]
+        deltas[FIELDS.index(field)] += amount
+
+    def pending(self, ad_id: int) -> tuple:
+        # Deltas pas encore en base, à ajouter aux valeurs lues
+        totals = [0, 0, 0]
+        for source in (self._pending, self._flushing):
+            deltas = source.get(ad_id)
+            if deltas:
+                totals = [total + delta for total, delta in zip(totals, deltas)]
+        return tuple(totals)
+
+    @staticmethod
+    def _pro_stats_upsert(db, deltas):
+        # deltas : sous-requête (ad_id, views, messages, favorites). Seules les
+        # annonces de vendeurs pro ont des statistiques ; leur ligne est créée
+        # au premier événement.
+        rows = (
+            select(Ad.user_id, deltas.c.ad_id, deltas.c.views, deltas.c.messages, deltas.c.favorites, func.now())
+            .select_from(deltas)
+            .join(Ad, Ad.id == deltas.c.ad_id)
+            .join(User, User.id == Ad.user_id)
+            .where(User.account_type == AccountType.professionnel)
+        )
+        stats = ProStat.__table__
+        upsert = upsert_insert(db, stats)
+        return upsert.from_select(
+            ["user_id", "ad_id", "views_count", "messages_count", "favorites_count", "last_update"], rows
+        ).on_conflict_do_update(
+            index_elements=[stats.c.ad_id],
+            set_={
+                "views_count": func.coalesce(stats.c.views_count, 0) + upsert.excluded.views_count,
+                "messages_count": func.coalesce(stats.c.messages_count, 0) + upsert.excluded.messages_count,
+                "favorites_count": func.coalesce(stats.c.favorites_count, 0) + upsert.excluded.favorites_count,
+                "last_update": func.now(),
+            },
+        )
+
+    async def _write(self, db, rows: list):
+        if db.bind.dialect.name == "postgresql":
+            deltas = values(
+                column("ad_id", Integer), column("views", Integer),
+                column("messages", Integer), column("favorites", Integer),
+                name="deltas",
+            ).data([(ad_id, *counts) for ad_id, counts in rows])
+            await db.execute(
+                update(Ad)
+                .where(Ad.id == deltas.c.ad_id, deltas.c.views != 0)
+                .values(views_count=func.coalesce(Ad.views_count, 0) + deltas.c.views, updated_at=Ad.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+            await db.execute(self._pro_stats_upsert(db, deltas))
+            return
+
+        # Autres bases (SQLite…) : pas de VALUES dans UPDATE … FROM, executemany
+        params = [
+            {"b_ad_id": ad_id, "b_views": views, "b_messages": messages, "b_favorites": favorites}
+            for ad_id, (views, messages, favorites) in rows
+        ]
+        ads = Ad.__table__
+        await db.execute(
+            update(ads)
+            .where(ads.c.id == bindparam("b_ad_id"))
+            .values(views_count=func.coalesce(ads.c.views_count, 0) + bindparam("b_views"), updated_at=ads.c.updated_at),
+            params,
+        )
+        deltas = select(*[
+            bindparam(f"b_{name}", type_=Integer).label(name) for name in ("ad_id", "views", "messages", "favorites")
+        ]).subquery("deltas")
+        await db.execute(self._pro_stats_upsert(db, deltas), params)
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+            rows = list(self._flushing.items())
+            written = 0
+            try:
+                for start in range(0, len(rows), self.chunk_size):
+                    chunk = rows[start:start + self.chunk_size]
+                    async with self.session_factory() as db:
+                        async with db.begin():
+                            await self._write(db, chunk)
+                    written = start + len(chunk)
+                    for ad_id, _ in chunk:
+                        del self._flushing[ad_id]
+                    for callback in self.on_flush:
+                        result = callback([ad_id for ad_id, _ in chunk])
+                        if inspect.isawaitable(result):
+                            await result
+            except Exception:
+                # Les lots non écrits retournent dans le tampon pour le prochain passage
+                logger.exception("Échec de l'écriture des compteurs d'annonces")
+                for ad_id, counts in rows[written:]:
+                    for field, amount in zip(FIELDS, counts):
+                        if amount:
+                            self.record(ad_id, field, amount)
+            finally:
+                self._flushing = {}
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+ad_counters = AdCounterBuffer(AsyncSessionLocal)
@@ -0,0 +1,80 @@
+# favorite_cache.py
+import os
+
+from sqlalchemy import select
+
+from cache import InMemoryLRUBackend, _MISSING
+from models import Favorite
+
+FAVORITES_CACHE_ENABLED = os.getenv("FAVORITES_CACHE_ENABLED", "1") == "1"
+FAVORITES_CACHE_USERS = int(os.getenv("FAVORITES_CACHE_USERS", "10000"))
+FAVORITES_CACHE_TTL_SECONDS = float(os.getenv("FAVORITES_CACHE_TTL_SECONDS", "60"))
+# Au-delà, l'ensemble n'est pas gardé en mémoire : requête IN à chaque appel
+FAVORITES_CACHE_MAX_SET = int(os.getenv("FAVORITES_CACHE_MAX_SET", "5000"))
+
+_TOO_LARGE = "too_large"
+
+
+class FavoriteSets:
+    """Ensembles des annonces favorites par utilisateur (un cache par worker).
+
+    Répond à « lesquelles de ces annonces sont en favori ? » par une
+    intersection en mémoire. Les ajouts et retraits faits par ce worker sont
+    appliqués directement ; ceux des autres workers sont visibles au plus
+    tard après le TTL.
+    """
+
+    def __init__(self, enabled: bool = FAVORITES_CACHE_ENABLED, max_set: int = FAVORITES_CACHE_MAX_SET):
+        self.enabled = enabled
+        self.max_set = max_set
+        self.backend = InMemoryLRUBackend(FAVORITES_CACHE_USERS, FAVORITES_CACHE_TTL_SECONDS)
+        self.hits = 0
+        self.misses = 0
+
+    async def _load(self, db, user_id: int):
+        result = await db.execute(select(Favorite.ad_id).where(Favorite.user_id == user_id).limit(self.max_set + 1))
+        ad_ids = set(result.scalars())
+        value = _TOO_LARGE if len(ad_ids) > self.max_set else ad_ids
+        await self.backend.set(user_id, value)
+        return value
+
+    async def favorited(self, db, user_id: int, ad_ids) -> list:
+        # Une requête au plus, quel que soit le nombre d'annonces demandées
+        ad_ids = list(dict.fromkeys(ad_ids))
+        if not ad_ids:
+            return []
+        favorites = _TOO_LARGE
+        if self.enabled:
+            favorites = await self.backend.get(user_id)
+            if favorites is _MISSING:
+                self.misses += 1
+                favorites = await self._load(db, user_id)
+            else:
+                self.hits += 1
+        if favorites is _TOO_LARGE:
+            result = await db.execute(
+                select(Favorite.ad_id).where(Favorite.user_id == user_id, Favorite.ad_id.in_(ad_ids))
+            )
+            favorites = set(result.scalars())
+        return [ad_id for ad_id in ad_ids if ad_id in favorites]
+
+    async def added(self, user_id: int, ad_id: int):
+        favorites = await self.backend.get(user_id)
+        if isinstance(favorites, set):
+            favorites.add(ad_id)
+            if len(favorites) > self.max_set:
+                await self.backend.set(user_id, _TOO_LARGE)
+
+    async def removed(self, user_id: int, ad_id: int):
+        favorites = await self.backend.get(user_id)
+        if isinstance(favorites, set):
+            favorites.discard(ad_id)
+
+    async def forget(self, user_id: int):
+        await self.backend.delete(user_id)
+
+    def stats(self) -> dict:
+        return {"users": len(self.backend), "hits": self.hits, "misses": self.misses, "evictions": self.backend.evictions}
+
+
+favorite_sets = FavoriteSets()
@@ -0,0 +1,208 @@
+# feed.py
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_right, insort
+from datetime import timezone
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from models import Ad, AdStatus
+from schemas import AdRead
+from category_tree import category_tree
+from pagination import encode_cursor
+from serialization import row_columns
+
+logger = logging.getLogger(__name__)
+
+FEED_SEGMENT_SIZE = int(os.getenv("FEED_SEGMENT_SIZE", "1000"))
+FEED_REFRESH_SECONDS = float(os.getenv("FEED_REFRESH_SECONDS", "60"))
+REBUILD_YIELD_ROWS = 500  # lignes traitées entre deux passages de main aux requêtes
+
+GLOBAL = None  # segment de la page d'accueil, toutes catégories
+
+_ad_adapter = TypeAdapter(AdRead)
+
+
+def _timestamp(value) -> float:
+    if value is None:
+        return 0.0
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def sort_key(ad) -> tuple:
+    # Croissant = ordre du fil : en vedette d'abord, puis du plus récent au plus ancien
+    return (0 if ad.is_featured else 1, -_timestamp(ad.created_at), -ad.id)
+
+
+class FeedSnapshot:
+    """Fil d'accueil pré-classé, en mémoire (un par worker).
+
+    Un segment par catégorie (annonces de la catégorie et de ses
+    sous-catégories) plus un segment global, chacun limité aux
+    FEED_SEGMENT_SIZE premières annonces actives. Chaque annonce est
+    sérialisée une fois ; une page n'est qu'une concaténation. Les
+    modifications faites par ce worker sont appliquées au fil de l'eau,
+    la reconstruction périodique reprend celles des autres workers et
+    complète les segments entamés par des retraits. Seul le premier
+    chargement se fait pendant une requête ; ensuite le fil est reconstruit
+    en tâche de fond et l'ancien reste servi en attendant.
+    """
+
+    def __init__(self, segment_size: int = FEED_SEGMENT_SIZE, refresh_seconds: float = FEED_REFRESH_SECONDS):
+        self.segment_size = segment_size
+        self.refresh_seconds = refresh_seconds
+        self.loaded = False
+        self.rebuilds = 0
+        self._segments = {}   # catégorie (ou GLOBAL) -> [clés de tri]
+        self._entries = {}    # ad_id -> (clé, JSON, expires_at, segments)
+        self._by_key = {}     # clé -> ad_id
+        self._nodes = {}      # arbre des catégories de la dernière reconstruction
+        self._loaded_at = None
+        self._version = 0
+        self._lock = asyncio.Lock()
+        self._refresh = None
+
+    def _segments_of(self, category_id) -> tuple:
+        node = self._nodes.get(category_id)
+        ancestors = node.ancestors if node is not None else ()
+        return (GLOBAL,) + ((category_id, *ancestors) if category_id is not None else ())
+
+    def _add(self, ad, payload: bytes) -> bool:
+        key = sort_key(ad)
+        kept = []
+        for segment_id in self._segments_of(ad.category_id):
+            keys = self._segments.setdefault(segment_id, [])
+            if len(keys) >= self.segment_size and key > keys[-1]:
+                continue
+            insort(keys, key)
+            kept.append(segment_id)
+            if len(keys) > self.segment_size:
+                self._evict(segment_id, keys.pop())
+        if not kept:
+            return False
+        self._entries[ad.id] = (key, payload, _timestamp(ad.expires_at) or None, kept)
+        self._by_key[key] = ad.id
+        return True
+
+    def _evict(self, segment_id, key):
+        # Annonce sortie d'un segment plein ; oubliée si elle n'est plus dans aucun
+        ad_id = self._by_key[key]
+        entry = self._entries[ad_id]
+        entry[3].remove(segment_id)
+        if not entry[3]:
+            del self._entries[ad_id]
+            del self._by_key[key]
+
+    def remove(self, ad_id: int):
+        self._version += 1
+        entry = self._entries.pop(ad_id, None)
+        if entry is None:
+            return
+        key, _, _, segments = entry
+        del self._by_key[key]
+        for segment_id in segments:
+            keys = self._segments[segment_id]
+            del keys[bisect_right(keys, key) - 1]
+
+    def upsert(self, ad):
+        # `ad` : objet Ad (ou ligne avec les champs d'AdRead et expires_at)
+        if not self.loaded:
+            return
+        self.remove(ad.id)
+        status = ad.status.value if hasattr(ad.status, "value") else ad.status
+        if status != AdStatus.active.value:
+            return
+        self._add(ad, _ad_adapter.dump_json(AdRead.model_validate(ad)))
+
+    def _stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds
+
+    async def ensure_fresh(self, db):
+        if not self._stale():
+            return
+        if self.loaded:
+            if self._refresh is None or self._refresh.done():
+                self._refresh = asyncio.create_task(self._refresh_in_background())
+            return
+        await self.rebuild(db)
+
+    async def _refresh_in_background(self):
+        try:
+            async with AsyncSessionLocal() as db:
+                await self.rebuild(db)
+        except Exception:
+            # Le fil actuel reste servi ; nouvel essai à la prochaine requête
+            logger.exception("Échec de la reconstruction du fil d'accueil")
+
+    async def rebuild(self, db):
+        async with self._lock:
+            if not self._stale():
+                return
+            version = self._version
+            fresh = FeedSnapshot(self.segment_size, self.refresh_seconds)
+            fresh._nodes = await category_tree.nodes(db)
+            # Parcours dans l'ordre du fil : chaque segment garde ses premières
+            # annonces, la sérialisation n'est faite que pour celles retenues.
+            result = await db.stream(
+                select(*row_columns(Ad, AdRead), Ad.expires_at)
+                .where(Ad.status == AdStatus.active)
+                .order_by(Ad.is_featured.desc(), Ad.created_at.desc(), Ad.id.desc())
+            )
+            scanned = 0
+            async for row in result:
+                scanned += 1
+                if scanned % REBUILD_YIELD_ROWS == 0:
+                    # Les lignes arrivent par lots déjà en mémoire : sans pause,
+                    # la boucle d'événements resterait bloquée jusqu'à la fin
+                    await asyncio.sleep(0)
+                if fresh._full(row.category_id):
+                    continue
+                fresh._add(row, _ad_adapter.dump_json(AdRead.model_validate(row)))
+            self._segments, self._entries, self._by_key = fresh._segments, fresh._entries, fresh._by_key
+            self._nodes = fresh._nodes
+            self.loaded = True
+            self.rebuilds += 1
+            # Modifié pendant le chargement : servi tel quel, reconstruit à la prochaine requête
+            self._loaded_at = time.monotonic() if version == self._version else None
+
+    def _full(self, category_id) -> bool:
+        return all(
+            len(self._segments.get(segment_id, ())) >= self.segment_size
+            for segment_id in self._segments_of(category_id)
+        )
+
+    def page(self, category_id, position, limit: int, filters: dict) -> Response:
+        # Réponse Page[AdRead] déjà sérialisée ; position = clé de la dernière annonce vue
+        keys = self._segments.get(category_id, ())
+        start = bisect_right(keys, tuple(position)) if position else 0
+        now = time.time()
+        items, last = [], None
+        index = start
+        while index < len(keys) and len(items) < limit:
+            key = keys[index]
+            index += 1
+            _, payload, expires_at, _ = self._entries[self._by_key[key]]
+            if expires_at is not None and expires_at <= now:
+                continue  # pas encore passée par le balayage
+            items.append(payload)
+            last = key
+        next_cursor = encode_cursor(list(last), filters) if last is not None and index < len(keys) else None
+        body = b'{"items":[' + b",".join(items) + b'],"next_cursor":' + json.dumps(next_cursor).encode() + b"}"
+        return Response(body, media_type="application/json")
+
+    def stats(self) -> dict:
+        return {
+            "ads": len(self._entries),
+            "segments": len(self._segments),
+            "rebuilds": self.rebuilds,
+            "loaded": self.loaded,
+        }
+
+
+feed = FeedSnapshot()
@@ -0,0 +1,69 @@
+# geo.py
+import math
+
+from sqlalchemy import and_, or_, func, literal_column
+
+from models import Ad
+
+try:
+    import numpy as np
+except ImportError:  # numpy est optionnel : repli en Python pur
+    np = None
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Même expression que l'index GiST idx_ads_geo (voir migrations/008_proximity_search.sql)
+AD_POINT = literal_column("point(ads.longitude::float8, ads.latitude::float8)")
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> tuple:
+    """Rectangle (min_lat, max_lat, [(min_lon, max_lon), ...]) contenant le cercle.
+
+    Deux plages de longitude quand le cercle traverse l'antiméridien ; toutes
+    les longitudes quand il contient un pôle.
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - delta_lat, lat + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+    delta_lon = math.degrees(math.asin(math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))))
+    min_lon, max_lon = lon - delta_lon, lon + delta_lon
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def box_filter(dialect: str, lat: float, lon: float, radius_km: float):
+    min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+    if dialect == "postgresql":
+        # Préfiltre servi par l'index GiST sur point(longitude, latitude)
+        boxes = [
+            AD_POINT.op("<@")(func.box(func.point(min_lon, min_lat), func.point(max_lon, max_lat)))
+            for min_lon, max_lon in lon_ranges
+        ]
+    else:
+        boxes = [
+            and_(Ad.latitude.between(min_lat, max_lat), Ad.longitude.between(min_lon, max_lon))
+            for min_lon, max_lon in lon_ranges
+        ]
+    return and_(Ad.latitude.isnot(None), Ad.longitude.isnot(None), or_(*boxes))
+
+
+def haversine_km(lat: float, lon: float, lats, lons):
+    """Distances (km) entre (lat, lon) et chaque point, calcul vectorisé si numpy est présent."""
+    if np is not None:
+        lat1, lon1 = np.radians(lat), np.radians(lon)
+        lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+        lon2 = np.radians(np.asarray(lons, dtype=np.float64))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))).tolist()
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    cos_lat1 = math.cos(lat1)
+    distances = []
+    for other_lat, other_lon in zip(lats, lons):
+        lat2, lon2 = math.radians(other_lat), math.radians(other_lon)
+        a = math.sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))))
+    return distances
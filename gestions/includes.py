@@ -0,0 +1,64 @@
+# includes.py
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import Ad, Auction
+from schemas import AdRead, AuctionRead
+
+# Relations chargées à la demande (?include=images,category,…). Chaque
+# relation demandée coûte au plus une requête pour toute la page :
+# jointure pour les relations simples, selectin (IN) pour les collections.
+# Rien n'est chargé paresseusement, ce qui échouerait en session async.
+
+AD_INCLUDES = {
+    "images": ("images", lambda: selectinload(Ad.images)),
+    "category": ("category", lambda: joinedload(Ad.category)),
+    "seller": ("seller", lambda: joinedload(Ad.user)),
+    "auction": ("auctions", lambda: selectinload(Ad.auctions)),
+}
+
+AUCTION_INCLUDES = {
+    "ad": ("ad", lambda: joinedload(Auction.ad)),
+    "bids": ("bids", lambda: selectinload(Auction.bids)),
+}
+
+# Attribut ORM lu pour chaque champ de réponse
+_SOURCES = {"seller": "user"}
+
+
+def parse_includes(include: Optional[str], allowed: dict) -> list:
+    if not include:
+        return []
+    names = []
+    for name in include.split(","):
+        name = name.strip()
+        if not name or name in names:
+            continue
+        if name not in allowed:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown include '{name}' (allowed: {', '.join(allowed)})",
+            )
+        names.append(name)
+    return names
+
+
+def load_options(names: list, allowed: dict) -> list:
+    return [allowed[name][1]() for name in names]
+
+
+def _expand(data: dict, obj, names: list, allowed: dict) -> dict:
+    for name in names:
+        field = allowed[name][0]
+        data[field] = getattr(obj, _SOURCES.get(field, field))
+    return data
+
+
+def ad_detail(ad, names: list) -> dict:
+    return _expand(AdRead.model_validate(ad).model_dump(), ad, names, AD_INCLUDES)
+
+
+def auction_detail(auction, names: list) -> dict:
+    return _expand(AuctionRead.model_validate(auction).model_dump(), auction, names, AUCTION_INCLUDES)
@@ -1,10 +1,63 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from routers import auctions, bids, users, ads, payments, notifications, categories  # à créer
-from fastapi import FastAPI
+from routers import auctions, bids, users, ads, payments, notifications, categories, advertisements, messages, webhooks, favorites  # à créer
+from fastapi.responses import PlainTextResponse
 from routers.bids import router as bids_router
 from routers.notifications import router as notifications_router
+from auction_scheduler import auction_closer
+from counters import ad_counters
+from ad_tracking import ad_events
+from stripe_events import stripe_events
+from favorite_cache import favorite_sets
+from sweeper import sweeper
+from feed import feed
+from cache import entity_cache
+from database import warm_up_pool, pool_stats
+from metrics import MetricsMiddleware, collectors, render_prometheus
+
+AUCTION_CLOSER_ENABLED = os.getenv("AUCTION_CLOSER_ENABLED", "1") == "1"
+SWEEPER_ENABLED = os.getenv("SWEEPER_ENABLED", "1") == "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up_pool()
+    if AUCTION_CLOSER_ENABLED:
+        auction_closer.start()
+    ad_counters.start()
+    ad_events.start()
+    stripe_events.start()
+    if SWEEPER_ENABLED:
+        sweeper.start()
+    yield
+    await sweeper.stop()
+    await stripe_events.stop()
+    await auction_closer.stop()
+    await ad_counters.stop()  # dernier envoi des compteurs en attente
+    await ad_events.stop()
+
+app = FastAPI(title="Plateforme Annonces & Enchères", lifespan=lifespan)
+
+app.add_middleware(MetricsMiddleware)
+collectors["cache"] = entity_cache.stats
+collectors["db_pool"] = pool_stats
+collectors["ad_events"] = ad_events.stats
+collectors["stripe_events"] = stripe_events.stats
+collectors["favorites_cache"] = favorite_sets.stats
+collectors["sweeper"] = sweeper.stats
+collectors["feed"] = feed.stats
+
+@app.get("/metrics", tags=["monitoring"], response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/cache/stats", tags=["monitoring"])
+async def cache_stats():
+    return entity_cache.stats()
 
-app = FastAPI(title="Plateforme Annonces & Enchères")
+@app.get("/api/db/pool", tags=["monitoring"])
+async def db_pool_stats():
+    return pool_stats()
 
 app.include_router(auctions.router, prefix="/api/auctions", tags=["auctions"])
 app.include_router(bids.router, prefix="/api/bids", tags=["bids"])
@@ -13,5 +66,9 @@ app.include_router(ads.router, prefix="/api/ads", tags=["ads"])
 app.include_router(payments.router, prefix="/api/payments", tags=["payments"])
 app.include_router(notifications.router, prefix="/api/notifications", tags=["notifications"])
 app.include_router(categories.router, prefix="/api/categories", tags=["categories"])
+app.include_router(advertisements.router, prefix="/api/advertisements", tags=["advertisements"])
+app.include_router(messages.router, prefix="/api/messages", tags=["messages"])
+app.include_router(webhooks.router, prefix="/api/webhooks", tags=["webhooks"])
+app.include_router(favorites.router, prefix="/api/favorites", tags=["favorites"])
 app.include_router(bids_router, prefix="/api/bids", tags=["bids"])
 app.include_router(notifications_router, prefix="/api/notifications", tags=["notifications"])
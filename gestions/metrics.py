@@ -0,0 +1,202 @@
+# metrics.py
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from database import engine, track_pool_usage
+
+logger = logging.getLogger(__name__)
+
+# Durée au-delà de laquelle une requête est journalisée avec ses requêtes SQL (0 = désactivé)
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0"))
+SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS", "50"))
+# En-tête Server-Timing avec l'attente de connexion, pour le débogage seulement
+# (il révèle la charge de la base à tout client)
+DB_POOL_TIMING_HEADER = os.getenv("DB_POOL_TIMING_HEADER", "0") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTrace:
+    __slots__ = ("sql_count", "db_time", "statements")
+
+    def __init__(self, keep_statements: bool):
+        self.sql_count = 0
+        self.db_time = 0.0
+        self.statements = [] if keep_statements else None
+
+
+class RouteStats:
+    __slots__ = ("buckets", "count", "total", "sql_count", "db_time", "pool_checkouts", "pool_wait")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # dernier = +Inf
+        self.count = 0
+        self.total = 0.0
+        self.sql_count = 0
+        self.db_time = 0.0
+        self.pool_checkouts = 0
+        self.pool_wait = 0.0
+
+
+_trace = ContextVar("request_trace", default=None)
+routes = {}  # (méthode, gabarit de route) -> RouteStats
+collectors = {}  # préfixe -> fonction renvoyant un dict de statistiques (cache, pool…)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _trace.get() is not None:
+        conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _trace.get()
+    if trace is None:
+        return
+    elapsed = time.perf_counter() - conn.info.pop("query_start", time.perf_counter())
+    trace.sql_count += 1
+    trace.db_time += elapsed
+    if trace.statements is not None and len(trace.statements) < SLOW_REQUEST_MAX_STATEMENTS:
+        trace.statements.append((elapsed, statement))
+
+
+def route_template(scope) -> str:
+    # Gabarit reconstruit depuis le chemin et ses paramètres (/api/ads/12 ->
+    # /api/ads/{ad_id}), préfixes des routeurs inclus compris.
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    params = scope.get("path_params")
+    if not params:
+        return scope["path"]
+    segments = scope["path"].split("/")
+    for name, value in params.items():
+        text = str(value)
+        for index in range(len(segments) - 1, -1, -1):
+            if segments[index] == text:
+                segments[index] = "{" + name + "}"
+                break
+        else:
+            return getattr(route, "path", "unmatched")
+    return "/".join(segments)
+
+
+def _with_pool_timing(send, usage: dict):
+    async def send_with_header(message):
+        if message["type"] == "http.response.start" and usage["checkouts"]:
+            value = f'db-pool;dur={usage["wait_seconds"] * 1000:.2f};desc="{usage["checkouts"]} checkout(s)"'
+            message = {**message, "headers": [*message.get("headers", []), (b"server-timing", value.encode())]}
+        await send(message)
+    return send_with_header
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : latence, nombre de requêtes SQL, temps base et
+    attente de connexion au pool par route.
+
+    Les routes sont identifiées par leur gabarit (/api/ads/{ad_id}) pour
+    garder un nombre de séries borné.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = RequestTrace(SLOW_REQUEST_SECONDS > 0)
+        token = _trace.set(trace)
+        usage = track_pool_usage()
+        if DB_POOL_TIMING_HEADER:
+            send = _with_pool_timing(send, usage)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - start
+            _trace.reset(token)
+            key = (scope["method"], route_template(scope))
+            stats = routes.get(key)
+            if stats is None:
+                stats = routes[key] = RouteStats()
+            stats.buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            stats.count += 1
+            stats.total += elapsed
+            stats.sql_count += trace.sql_count
+            stats.db_time += trace.db_time
+            stats.pool_checkouts += usage["checkouts"]
+            stats.pool_wait += usage["wait_seconds"]
+            if SLOW_REQUEST_SECONDS and elapsed >= SLOW_REQUEST_SECONDS:
+                _log_slow_request(key, elapsed, trace)
+
+
+def _log_slow_request(key, elapsed: float, trace: RequestTrace):
+    lines = [f"  {duration * 1000:.1f} ms  {' '.join(statement.split())}" for duration, statement in trace.statements]
+    if trace.sql_count > len(trace.statements):
+        lines.append(f"  … {trace.sql_count - len(trace.statements)} autre(s)")
+    logger.warning(
+        "Requête lente %s %s : %.1f ms, %d requête(s) SQL, %.1f ms en base\n%s",
+        key[0], key[1], elapsed * 1000, trace.sql_count, trace.db_time * 1000, "\n".join(lines),
+    )
+
+
+def _labels(method: str, route: str) -> str:
+    route = route.replace("\\", "\\\\").replace('"', '\\"')
+    return f'method="{method}",route="{route}"'
+
+
+def render_prometheus() -> str:
+    lines = [
+        "# HELP http_request_duration_seconds Durée des requêtes HTTP par route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), stats in sorted(routes.items()):
+        labels = _labels(method, route)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stats.buckets):
+            cumulative += count
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"http_request_duration_seconds_sum{{{labels}}} {stats.total}")
+        lines.append(f"http_request_duration_seconds_count{{{labels}}} {stats.count}")
+    lines += [
+        "# HELP http_request_sql_statements_total Requêtes SQL exécutées, par route.",
+        "# TYPE http_request_sql_statements_total counter",
+    ]
+    lines += [
+        f"http_request_sql_statements_total{{{_labels(*key)}}} {stats.sql_count}" for key, stats in sorted(routes.items())
+    ]
+    lines += [
+        "# HELP http_request_db_seconds_total Temps passé en base, par route.",
+        "# TYPE http_request_db_seconds_total counter",
+    ]
+    lines += [
+        f"http_request_db_seconds_total{{{_labels(*key)}}} {stats.db_time}" for key, stats in sorted(routes.items())
+    ]
+    lines += [
+        "# HELP http_request_db_pool_checkouts_total Connexions prises au pool, par route.",
+        "# TYPE http_request_db_pool_checkouts_total counter",
+    ]
+    lines += [
+        f"http_request_db_pool_checkouts_total{{{_labels(*key)}}} {stats.pool_checkouts}" for key, stats in sorted(routes.items())
+    ]
+    lines += [
+        "# HELP http_request_db_pool_wait_seconds_total Attente d'une connexion du pool, par route.",
+        "# TYPE http_request_db_pool_wait_seconds_total counter",
+    ]
+    lines += [
+        f"http_request_db_pool_wait_seconds_total{{{_labels(*key)}}} {stats.pool_wait}" for key, stats in sorted(routes.items())
+    ]
+    for prefix, collect in collectors.items():
+        for name, value in collect().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+    return "\n".join(lines) + "\n"
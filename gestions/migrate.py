@@ -0,0 +1,39 @@
+# migrate.py
+"""Applique les scripts de migrations/ à la base (Postgres) : python migrate.py
+
+Le schéma de production vient du dump bd.sql ; chaque évolution de schéma
+est livrée sous forme de script SQL idempotent (IF NOT EXISTS, dédoublonnage
+avant contrainte d'unicité…), appliqué dans l'ordre des noms de fichiers,
+une transaction par script. Relancer la commande est sans effet.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+from database import engine
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+
+def scripts(names=None) -> list:
+    paths = sorted(MIGRATIONS_DIR.glob("*.sql"))
+    if names:
+        paths = [path for path in paths if path.stem in names or path.name in names]
+    return paths
+
+
+async def migrate(names=None):
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("Les migrations ciblent Postgres (DATABASE_URL)")
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        # Connexion asyncpg : exécution d'un script à plusieurs instructions
+        driver = raw.driver_connection
+        for path in scripts(names):
+            async with driver.transaction():
+                await driver.execute(path.read_text(encoding="utf-8"))
+            print(f"{path.name} appliqué")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate(sys.argv[1:]))
@@ -0,0 +1,11 @@
+-- Pagination par curseur (pagination.fetch_page) : index sur la clé de tri
+-- (created_at, id), précédée de la colonne filtrée quand il y en a une.
+CREATE INDEX IF NOT EXISTS idx_users_created_id ON users (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_ads_created_id ON ads (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_ads_status_created_id ON ads (status, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_ads_category_created_id ON ads (category_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_payments_user_created_id ON payments (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_auctions_created_id ON auctions (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_auctions_status_created_id ON auctions (status, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_bids_time_id ON bids (bid_time, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_created_id ON notifications (created_at, id);
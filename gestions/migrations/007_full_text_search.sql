@@ -0,0 +1,15 @@
+-- Recherche plein texte sur les annonces (search.py) : configuration
+-- française sans accents et index GIN sur la même expression que
+-- search.SEARCH_VECTOR.
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+DO $$ BEGIN
+    CREATE TEXT SEARCH CONFIGURATION french_unaccent (COPY = french);
+    ALTER TEXT SEARCH CONFIGURATION french_unaccent
+        ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem;
+EXCEPTION WHEN unique_violation OR duplicate_object THEN NULL;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_ads_search ON ads USING gin (
+    to_tsvector('french_unaccent', coalesce(ads.title, '') || ' ' || coalesce(ads.description, ''))
+);
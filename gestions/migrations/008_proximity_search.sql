@@ -0,0 +1,5 @@
+-- Recherche de proximité (geo.py) : index GiST sur la même expression que
+-- geo.AD_POINT, limité aux annonces géolocalisées.
+CREATE INDEX IF NOT EXISTS idx_ads_geo ON ads USING gist (
+    point(ads.longitude::float8, ads.latitude::float8)
+) WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
@@ -0,0 +1,23 @@
+-- Compteurs différés (counters.AdCounterBuffer) : une ligne pro_stats par
+-- annonce, alimentée par INSERT … ON CONFLICT (ad_id).
+-- Les doublons éventuels sont d'abord fusionnés dans la ligne la plus ancienne.
+UPDATE pro_stats AS kept
+SET views_count = merged.views_count,
+    messages_count = merged.messages_count,
+    favorites_count = merged.favorites_count
+FROM (
+    SELECT min(id) AS id,
+           sum(coalesce(views_count, 0)) AS views_count,
+           sum(coalesce(messages_count, 0)) AS messages_count,
+           sum(coalesce(favorites_count, 0)) AS favorites_count
+    FROM pro_stats
+    GROUP BY ad_id
+    HAVING count(*) > 1
+) AS merged
+WHERE kept.id = merged.id;
+
+DELETE FROM pro_stats AS duplicate
+USING pro_stats AS kept
+WHERE duplicate.ad_id = kept.ad_id AND duplicate.id > kept.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_pro_stats_ad ON pro_stats (ad_id);
@@ -0,0 +1,18 @@
+-- Compteur de notifications non lues par utilisateur (notify.py), tenu à
+-- jour à chaque écriture pour que le badge se lise sans COUNT.
+CREATE TABLE IF NOT EXISTS notification_counters (
+    user_id integer PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+    unread integer NOT NULL DEFAULT 0
+);
+
+-- mark_all_read : notifications non lues d'un utilisateur
+CREATE INDEX IF NOT EXISTS idx_notifications_user_read ON notifications (user_id, is_read);
+
+-- Compteurs initiaux depuis les notifications existantes ; sans effet sur
+-- les utilisateurs déjà comptés (le script peut être rejoué)
+INSERT INTO notification_counters (user_id, unread)
+SELECT user_id, count(*)
+FROM notifications
+WHERE is_read IS NOT TRUE
+GROUP BY user_id
+ON CONFLICT (user_id) DO NOTHING;
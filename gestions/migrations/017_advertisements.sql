@@ -0,0 +1,4 @@
+-- Campagnes (routers/advertisements.py) : liste paginée par curseur, et
+-- chargement du ciblage par campagne pour l'index de diffusion (ad_serving.py).
+CREATE INDEX IF NOT EXISTS idx_advertisements_created_id ON advertisements (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_advertisement_targeting_ad ON advertisement_targeting (advertisement_id);
@@ -0,0 +1,23 @@
+-- Statistiques des campagnes (ad_tracking.py) : une ligne par campagne et
+-- par jour, cible de INSERT … ON CONFLICT (advertisement_id, stat_date).
+-- Les doublons éventuels sont d'abord fusionnés dans la ligne la plus ancienne.
+UPDATE advertisement_stats AS kept
+SET views_count = merged.views_count,
+    clicks_count = merged.clicks_count
+FROM (
+    SELECT min(id) AS id,
+           sum(coalesce(views_count, 0)) AS views_count,
+           sum(coalesce(clicks_count, 0)) AS clicks_count
+    FROM advertisement_stats
+    GROUP BY advertisement_id, stat_date
+    HAVING count(*) > 1
+) AS merged
+WHERE kept.id = merged.id;
+
+DELETE FROM advertisement_stats AS duplicate
+USING advertisement_stats AS kept
+WHERE duplicate.advertisement_id = kept.advertisement_id
+  AND duplicate.stat_date = kept.stat_date
+  AND duplicate.id > kept.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_advertisement_stats_day ON advertisement_stats (advertisement_id, stat_date);
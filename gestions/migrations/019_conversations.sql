@@ -0,0 +1,41 @@
+-- Messagerie (routers/messages.py) : têtes de conversation tenues à jour à
+-- chaque message, et index des fils.
+CREATE TABLE IF NOT EXISTS conversation_heads (
+    id serial PRIMARY KEY,
+    owner_id integer NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    counterpart_id integer NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    ad_key integer NOT NULL DEFAULT 0,  -- ad_id, 0 hors annonce
+    last_message_id integer NOT NULL REFERENCES messages (id) ON DELETE CASCADE,
+    last_message_at timestamp with time zone NOT NULL,
+    unread_count integer NOT NULL DEFAULT 0,
+    CONSTRAINT uq_conversation_heads_pair UNIQUE (owner_id, counterpart_id, ad_key)
+);
+CREATE INDEX IF NOT EXISTS idx_conversation_heads_inbox ON conversation_heads (owner_id, last_message_at, id);
+
+-- Messages d'une conversation dans un sens (marquage comme lus)
+CREATE INDEX IF NOT EXISTS idx_messages_thread ON messages (sender_id, receiver_id, ad_id, created_at, id);
+-- Fil dans les deux sens : même expression que models.conversation_pair
+CREATE INDEX IF NOT EXISTS idx_messages_pair ON messages (
+    (CASE WHEN sender_id < receiver_id THEN sender_id ELSE receiver_id END),
+    (CASE WHEN sender_id < receiver_id THEN receiver_id ELSE sender_id END),
+    ad_id, created_at, id
+);
+CREATE INDEX IF NOT EXISTS idx_messages_receiver_read ON messages (receiver_id, read_at);
+
+-- Têtes des conversations existantes, vues par chacun des deux participants ;
+-- celles déjà présentes ne sont pas touchées (le script peut être rejoué)
+INSERT INTO conversation_heads (owner_id, counterpart_id, ad_key, last_message_id, last_message_at, unread_count)
+SELECT DISTINCT ON (owner_id, counterpart_id, ad_key)
+       owner_id, counterpart_id, ad_key, id, coalesce(created_at, now()),
+       count(*) FILTER (WHERE receiver_id = owner_id AND read_at IS NULL)
+           OVER (PARTITION BY owner_id, counterpart_id, ad_key)
+FROM (
+    SELECT sender_id AS owner_id, receiver_id AS counterpart_id, coalesce(ad_id, 0) AS ad_key, id, created_at, receiver_id, read_at
+    FROM messages
+    UNION ALL
+    SELECT receiver_id, sender_id, coalesce(ad_id, 0), id, created_at, receiver_id, read_at
+    FROM messages
+) AS sides
+WHERE owner_id <> counterpart_id
+ORDER BY owner_id, counterpart_id, ad_key, created_at DESC NULLS LAST, id DESC
+ON CONFLICT (owner_id, counterpart_id, ad_key) DO NOTHING;
@@ -0,0 +1,24 @@
+-- Traitement des webhooks Stripe (stripe_events.py) : suivi de chaque
+-- événement enregistré, pour la reprise au démarrage et le rejeu.
+-- Les événements reçus avant cette migration ont déjà été traités par
+-- l'ancien webhook synchrone : ils sont marqués traités pour ne pas être
+-- rejoués. Seulement à l'ajout de la colonne (le script peut être rejoué).
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'stripe_webhook_logs' AND column_name = 'processed_at'
+    ) THEN
+        ALTER TABLE stripe_webhook_logs ADD COLUMN processed_at timestamp with time zone;
+        UPDATE stripe_webhook_logs SET processed_at = coalesce(received_at, now());
+    END IF;
+END
+$$;
+ALTER TABLE stripe_webhook_logs ADD COLUMN IF NOT EXISTS attempts integer NOT NULL DEFAULT 0;
+ALTER TABLE stripe_webhook_logs ADD COLUMN IF NOT EXISTS last_error text;
+
+-- Événements restant à traiter, dans l'ordre de réception
+CREATE INDEX IF NOT EXISTS idx_stripe_webhook_logs_pending ON stripe_webhook_logs (received_at) WHERE processed_at IS NULL;
+-- Paiement retrouvé par son PaymentIntent (événements payment_intent.*)
+CREATE INDEX IF NOT EXISTS idx_payments_payment_intent ON payments (payment_intent_id);
+-- Déduplication sur event_id (ON CONFLICT) : stripe_webhook_logs_event_id_key dans bd.sql
@@ -0,0 +1,25 @@
+-- Agrégats quotidiens des paiements (rollups.py) : une ligne par jour (UTC
+-- de created_at), devise et statut, tenue à jour dans la transaction qui
+-- modifie les paiements.
+CREATE TABLE IF NOT EXISTS payment_daily_rollups (
+    id serial PRIMARY KEY,
+    day date NOT NULL,
+    currency character varying(10) NOT NULL,
+    payment_status public.payment_status NOT NULL,
+    payment_count integer NOT NULL DEFAULT 0,
+    amount numeric(16,2) NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_payment_daily_rollups_key ON payment_daily_rollups (day, currency, payment_status);
+
+-- Calcul initial, comme rollups.rebuild ; les lignes déjà tenues à jour par
+-- l'application ne sont pas touchées (le script peut être rejoué). En cas de
+-- doute : python rollups.py verify, puis rebuild.
+INSERT INTO payment_daily_rollups (day, currency, payment_status, payment_count, amount)
+SELECT (created_at AT TIME ZONE 'UTC')::date,
+       coalesce(currency, 'EUR'),
+       coalesce(payment_status, 'pending'),
+       count(*),
+       coalesce(sum(amount), 0)
+FROM payments
+GROUP BY 1, 2, 3
+ON CONFLICT (day, currency, payment_status) DO NOTHING;
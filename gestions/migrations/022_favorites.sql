@@ -0,0 +1,26 @@
+-- Favoris (routers/favorites.py) : l'ajout idempotent repose sur
+-- ON CONFLICT (user_id, ad_id). Doublons supprimés (le plus ancien est gardé)
+-- avant de créer l'index unique, sauf si la base en a déjà un
+-- (favorites_user_id_ad_id_key dans bd.sql).
+DELETE FROM favorites AS duplicate
+USING favorites AS kept
+WHERE duplicate.user_id = kept.user_id AND duplicate.ad_id = kept.ad_id AND duplicate.id > kept.id;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index AS i
+        JOIN pg_attribute AS a1 ON a1.attrelid = i.indrelid AND a1.attnum = i.indkey[0]
+        JOIN pg_attribute AS a2 ON a2.attrelid = i.indrelid AND a2.attnum = i.indkey[1]
+        WHERE i.indrelid = 'favorites'::regclass AND i.indisunique AND i.indnatts = 2
+          AND a1.attname = 'user_id' AND a2.attname = 'ad_id'
+    ) THEN
+        CREATE UNIQUE INDEX uq_favorites_user_ad ON favorites (user_id, ad_id);
+    END IF;
+END
+$$;
+
+-- Liste paginée des favoris d'un utilisateur, recomptage par annonce
+CREATE INDEX IF NOT EXISTS idx_favorites_user_created_id ON favorites (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_favorites_ad ON favorites (ad_id);
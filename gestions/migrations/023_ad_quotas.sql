@@ -0,0 +1,10 @@
+-- Quotas d'annonces des abonnements pro (quotas.py) : annonces en ligne et en
+-- vedette par utilisateur, tenues à jour dans la transaction qui écrit les
+-- annonces. Pas de calcul initial : la ligne d'un utilisateur est créée
+-- depuis ses annonces à sa première réservation (quotas._seed).
+CREATE TABLE IF NOT EXISTS user_ad_usage (
+    user_id integer PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+    ads_count integer NOT NULL DEFAULT 0,
+    featured_count integer NOT NULL DEFAULT 0
+);
+-- Plafonds de l'abonnement en cours (quotas.limits) : idx_pro_subs_user dans bd.sql
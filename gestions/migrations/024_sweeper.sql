@@ -0,0 +1,6 @@
+-- Balayage périodique (sweeper.py) : index partiels limités aux lignes
+-- encore à traiter, qui restent petits quand l'historique grossit.
+-- Annonces en ligne à expirer
+CREATE INDEX IF NOT EXISTS idx_ads_expires_due ON ads (expires_at) WHERE status IN ('pending', 'active');
+-- Campagnes actives à terminer
+CREATE INDEX IF NOT EXISTS idx_advertisements_end_due ON advertisements (end_date) WHERE status = 'active';
@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Column, Integer, String, ForeignKey, Numeric, DateTime, Boolean, Text, JSON, func
+from sqlalchemy import Column, Integer, String, ForeignKey, Numeric, Date, DateTime, Boolean, Text, JSON, Index, UniqueConstraint, case, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql.sqltypes import Enum as PgEnum
@@ -98,10 +98,15 @@ class User(Base):
     ads = relationship("Ad", back_populates="user")
     bids = relationship("Bid", back_populates="bidder")
     notifications = relationship("Notification", back_populates="user")
-    payments = relationship("Payment", back_populates="user")
+    payments = relationship("Payment", back_populates="user", passive_deletes=True)
     pro_subscriptions = relationship("ProSubscription", back_populates="user")
     pro_documents = relationship("ProDocument", back_populates="user")
 
+    __table_args__ = (
+        # Pagination par curseur (created_at, id)
+        Index("idx_users_created_id", "created_at", "id"),
+    )
+
 
 class Category(Base):
     __tablename__ = "categories"
@@ -140,10 +145,24 @@ class Ad(Base):
     user = relationship("User", back_populates="ads")
     category = relationship("Category", back_populates="ads")
     images = relationship("AdImage", back_populates="ad")
-    bids = relationship("Bid", back_populates="ad")
     auctions = relationship("Auction", back_populates="ad")
     payments = relationship("Payment", back_populates="ad")
 
+    __table_args__ = (
+        # Pagination par curseur (created_at, id), avec ou sans filtre
+        Index("idx_ads_created_id", "created_at", "id"),
+        Index("idx_ads_status_created_id", "status", "created_at", "id"),
+        Index("idx_ads_category_created_id", "category_id", "created_at", "id"),
+        # Préfiltre géographique hors Postgres (voir migrations/008_proximity_search.sql sinon)
+        Index("idx_ads_lat_lon", "latitude", "longitude"),
+        # Annonces en ligne à expirer (voir sweeper.py)
+        Index(
+            "idx_ads_expires_due", "expires_at",
+            postgresql_where=status.in_([AdStatus.pending, AdStatus.active]),
+            sqlite_where=status.in_([AdStatus.pending, AdStatus.active]),
+        ),
+    )
+
 
 class AdImage(Base):
     __tablename__ = "ad_images"
@@ -167,10 +186,19 @@ class Favorite(Base):
 
     __table_args__ = (
         # Ensure user cannot favorite the same ad twice
-        # UniqueConstraint is handled by Unique in migration, can be added here via __table_args__
+        UniqueConstraint("user_id", "ad_id", name="uq_favorites_user_ad"),
+        Index("idx_favorites_user_created_id", "user_id", "created_at", "id"),
+        Index("idx_favorites_ad", "ad_id"),
     )
 
 
+def conversation_pair(sender_id, receiver_id) -> tuple:
+    # (plus petit, plus grand) des deux participants : même clé dans les deux
+    # sens, celle de idx_messages_pair (voir migrations/019_conversations.sql)
+    lower = sender_id < receiver_id
+    return case((lower, sender_id), else_=receiver_id), case((lower, receiver_id), else_=sender_id)
+
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -185,6 +213,42 @@ class Message(Base):
     sender = relationship("User", foreign_keys=[sender_id])
     receiver = relationship("User", foreign_keys=[receiver_id])
 
+    __table_args__ = (
+        # Messages d'une conversation dans un sens (marquage comme lus)
+        Index("idx_messages_thread", "sender_id", "receiver_id", "ad_id", "created_at", "id"),
+        # Fil d'une conversation (les deux sens), du plus récent au plus ancien
+        Index("idx_messages_pair", *conversation_pair(sender_id, receiver_id), "ad_id", "created_at", "id"),
+        # Messages non lus d'un destinataire
+        Index("idx_messages_receiver_read", "receiver_id", "read_at"),
+    )
+
+
+class ConversationHead(Base):
+    # Résumé d'une conversation vu par l'un des deux participants : tenu à
+    # jour à chaque message, il évite de regrouper la table des messages
+    # pour afficher la boîte de réception.
+    __tablename__ = "conversation_heads"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    counterpart_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    ad_key = Column(Integer, nullable=False, default=0, server_default="0")  # ad_id, 0 hors annonce
+    last_message_id = Column(Integer, ForeignKey("messages.id", ondelete="CASCADE"), nullable=False)
+    last_message_at = Column(DateTime(timezone=True), nullable=False)
+    unread_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    last_message = relationship("Message")
+
+    __table_args__ = (
+        UniqueConstraint("owner_id", "counterpart_id", "ad_key", name="uq_conversation_heads_pair"),
+        # Boîte de réception paginée par curseur
+        Index("idx_conversation_heads_inbox", "owner_id", "last_message_at", "id"),
+    )
+
+    @property
+    def ad_id(self):
+        return self.ad_key or None
+
 
 class Report(Base):
     __tablename__ = "reports"
@@ -216,6 +280,31 @@ class Payment(Base):
     user = relationship("User", back_populates="payments")
     ad = relationship("Ad", back_populates="payments")
 
+    # created_at relu par RETURNING à l'insertion (jour des agrégats)
+    __mapper_args__ = {"eager_defaults": True}
+
+    __table_args__ = (
+        Index("idx_payments_user_created_id", "user_id", "created_at", "id"),
+        Index("idx_payments_payment_intent", "payment_intent_id"),
+    )
+
+
+class PaymentDailyRollup(Base):
+    # Agrégats des paiements par jour (UTC de created_at), devise et statut,
+    # tenus à jour par rollups.py
+    __tablename__ = "payment_daily_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    currency = Column(String(10), nullable=False)
+    payment_status = Column(PgEnum(PaymentStatus), nullable=False)
+    payment_count = Column(Integer, nullable=False, default=0)
+    amount = Column(Numeric(16,2), nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("day", "currency", "payment_status", name="uq_payment_daily_rollups_key"),
+    )
+
 
 class StripeSubscription(Base):
     __tablename__ = "stripe_subscriptions"
@@ -241,6 +330,17 @@ class StripeWebhookLog(Base):
     event_type = Column(String(150), nullable=True)
     payload = Column(JSON, nullable=True)
     received_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # Événements restant à traiter (reprise au démarrage)
+        Index(
+            "idx_stripe_webhook_logs_pending", "received_at",
+            postgresql_where=processed_at.is_(None), sqlite_where=processed_at.is_(None),
+        ),
+    )
 
 
 class ProSubscription(Base):
@@ -259,6 +359,16 @@ class ProSubscription(Base):
     user = relationship("User", back_populates="pro_subscriptions")
 
 
+class UserAdUsage(Base):
+    # Annonces en ligne (et en vedette) par utilisateur, tenu à jour dans la
+    # même transaction que les annonces (voir quotas.py)
+    __tablename__ = "user_ad_usage"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ads_count = Column(Integer, nullable=False, default=0, server_default="0")
+    featured_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+
 class ProStat(Base):
     __tablename__ = "pro_stats"
 
@@ -270,6 +380,11 @@ class ProStat(Base):
     favorites_count = Column(Integer, default=0)
     last_update = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Une ligne par annonce, cible des upserts de counters.py
+        Index("uq_pro_stats_ad", "ad_id", unique=True),
+    )
+
 class ProDocument(Base):
     __tablename__ = "pro_documents"
 
@@ -304,7 +419,16 @@ class Advertisement(Base):
     advertiser = relationship("User")
     category = relationship("Category", back_populates="advertisements")
     stats = relationship("AdvertisementStat", back_populates="advertisement")
-    targetings = relationship("AdvertisementTargeting", back_populates="advertisement")
+    targetings = relationship("AdvertisementTargeting", back_populates="advertisement", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("idx_advertisements_created_id", "created_at", "id"),
+        # Campagnes actives à terminer (voir sweeper.py)
+        Index(
+            "idx_advertisements_end_due", "end_date",
+            postgresql_where=status == AdStatusType.active, sqlite_where=status == AdStatusType.active,
+        ),
+    )
 
 
 class AdvertisementStat(Base):
@@ -318,6 +442,11 @@ class AdvertisementStat(Base):
 
     advertisement = relationship("Advertisement", back_populates="stats")
 
+    __table_args__ = (
+        # Une ligne par campagne et par jour (stat_date à minuit UTC), cible des upserts d'ad_tracking.py
+        UniqueConstraint("advertisement_id", "stat_date", name="uq_advertisement_stats_day"),
+    )
+
 
 class AdvertisementTargeting(Base):
     __tablename__ = "advertisement_targeting"
@@ -329,6 +458,10 @@ class AdvertisementTargeting(Base):
 
     advertisement = relationship("Advertisement", back_populates="targetings")
 
+    __table_args__ = (
+        Index("idx_advertisement_targeting_ad", "advertisement_id"),
+    )
+
 
 class Auction(Base):
     __tablename__ = "auctions"
@@ -347,6 +480,11 @@ class Auction(Base):
     bids = relationship("Bid", back_populates="auction")
     winners = relationship("AuctionWinner", back_populates="auction")
 
+    __table_args__ = (
+        Index("idx_auctions_created_id", "created_at", "id"),
+        Index("idx_auctions_status_created_id", "status", "created_at", "id"),
+    )
+
 
 class Bid(Base):
     __tablename__ = "bids"
@@ -360,6 +498,10 @@ class Bid(Base):
     auction = relationship("Auction", back_populates="bids")
     bidder = relationship("User", back_populates="bids")
 
+    __table_args__ = (
+        Index("idx_bids_time_id", "bid_time", "id"),
+    )
+
 
 class AuctionWinner(Base):
     __tablename__ = "auction_winners"
@@ -390,3 +532,17 @@ class Notification(Base):
     related_bid_id = Column(Integer, ForeignKey("bids.id", ondelete="SET NULL"), nullable=True)
 
     user = relationship("User", back_populates="notifications")
+
+    __table_args__ = (
+        Index("idx_notifications_created_id", "created_at", "id"),
+        # mark_all_read : notifications non lues d'un utilisateur
+        Index("idx_notifications_user_read", "user_id", "is_read"),
+    )
+
+
+class NotificationCounter(Base):
+    # Nombre de notifications non lues, tenu à jour à chaque écriture (voir notify.py)
+    __tablename__ = "notification_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread = Column(Integer, nullable=False, default=0, server_default="0")
@@ -0,0 +1,120 @@
+# notify.py
+import asyncio
+import sys
+from collections import Counter
+
+from sqlalchemy import select, insert, update, delete, literal, case, func
+from sqlalchemy.sql import Select
+
+from database import upsert_insert
+from models import Notification, NotificationCounter
+
+# Envoi groupé de notifications : une instruction INSERT pour tous les
+# destinataires, et un compteur de non-lues par utilisateur mis à jour dans
+# la même transaction, pour que le badge se lise sans COUNT. Les fonctions
+# ne valident pas la transaction : c'est à l'appelant de le faire.
+
+INSERT_CHUNK = 1000  # lignes par INSERT multi-valeurs (limite de paramètres du driver)
+
+COLUMNS = ["user_id", "type", "message", "related_auction_id", "related_bid_id"]
+
+
+def _counter_upsert(db):
+    upsert = upsert_insert(db, NotificationCounter)
+    return upsert, {"unread": NotificationCounter.unread + upsert.excluded.unread}
+
+
+async def add_unread(db, increments: dict):
+    # increments : user_id -> nombre de nouvelles notifications non lues
+    if not increments:
+        return
+    rows = [{"user_id": user_id, "unread": count} for user_id, count in increments.items()]
+    for start in range(0, len(rows), INSERT_CHUNK):
+        upsert, set_ = _counter_upsert(db)
+        await db.execute(
+            upsert.values(rows[start:start + INSERT_CHUNK])
+            .on_conflict_do_update(index_elements=[NotificationCounter.user_id], set_=set_)
+        )
+
+
+async def remove_unread(db, user_id: int, count: int = 1):
+    await db.execute(
+        update(NotificationCounter)
+        .where(NotificationCounter.user_id == user_id)
+        .values(unread=case((NotificationCounter.unread > count, NotificationCounter.unread - count), else_=0))
+    )
+
+
+async def unread_count(db, user_id: int) -> int:
+    counter = await db.get(NotificationCounter, user_id)
+    return counter.unread if counter else 0
+
+
+async def notify_many(db, notifications: list):
+    """Insère des notifications (dicts) de contenus différents, par INSERT multi-valeurs."""
+    rows = [{column: entry.get(column) for column in COLUMNS} for entry in notifications]
+    for start in range(0, len(rows), INSERT_CHUNK):
+        await db.execute(insert(Notification).values(rows[start:start + INSERT_CHUNK]))
+    await add_unread(db, Counter(row["user_id"] for row in rows))
+
+
+async def fan_out(db, recipients, type, message: str, related_auction_id=None, related_bid_id=None):
+    """Même notification pour chaque destinataire.
+
+    `recipients` : liste d'identifiants, ou requête SELECT d'une colonne
+    d'identifiants ; dans ce cas la requête n'est évaluée qu'une fois
+    (INSERT … SELECT … RETURNING user_id), les compteurs sont incrémentés
+    depuis les lignes insérées (une instruction par tranche de INSERT_CHUNK
+    destinataires).
+    """
+    if not isinstance(recipients, Select):
+        user_ids = list(dict.fromkeys(recipients))
+        await notify_many(db, [
+            {"user_id": user_id, "type": type, "message": message,
+             "related_auction_id": related_auction_id, "related_bid_id": related_bid_id}
+            for user_id in user_ids
+        ])
+        return
+
+    table = Notification.__table__
+    users = recipients.distinct().subquery()
+    result = await db.execute(
+        insert(Notification).from_select(
+            COLUMNS,
+            select(
+                list(users.c)[0],
+                literal(type, table.c.type.type),
+                literal(message, table.c.message.type),
+                literal(related_auction_id, table.c.related_auction_id.type),
+                literal(related_bid_id, table.c.related_bid_id.type),
+            ),
+        ).returning(Notification.user_id)
+    )
+    await add_unread(db, Counter(result.scalars()))
+
+
+async def rebuild_counters(db):
+    # Recalcule tous les compteurs depuis les notifications (mise en place, réparation)
+    await db.execute(delete(NotificationCounter))
+    await db.execute(
+        insert(NotificationCounter).from_select(
+            ["user_id", "unread"],
+            select(Notification.user_id, func.count())
+            .where(Notification.is_read.isnot(True))
+            .group_by(Notification.user_id),
+        )
+    )
+
+
+async def _main(command: str):
+    from database import AsyncSessionLocal
+
+    if command != "rebuild":
+        raise SystemExit("usage: python notify.py rebuild")
+    async with AsyncSessionLocal() as db:
+        async with db.begin():
+            await rebuild_counters(db)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else ""))
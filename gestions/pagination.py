@@ -0,0 +1,90 @@
+# pagination.py
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, String, func, literal, tuple_, type_coerce
+
+# Pagination par curseur (keyset) : on se positionne après la dernière ligne
+# renvoyée au lieu de sauter `skip` lignes, le coût d'une page ne dépend donc
+# plus de sa profondeur.
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    raise TypeError(f"Type non sérialisable dans un curseur : {type(value)!r}")
+
+
+def _object_hook(obj):
+    if "$dt" in obj:
+        return datetime.fromisoformat(obj["$dt"])
+    return obj
+
+
+def encode_cursor(position: list, filters: Optional[dict] = None) -> str:
+    payload = {"k": position, "f": filters or {}}
+    raw = json.dumps(payload, default=_default, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw, object_hook=_object_hook)
+        return payload["k"], payload.get("f", {})
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def resolve_cursor(cursor: str, filters: dict) -> tuple:
+    # Curseur vide = première page. Les filtres mémorisés dans le curseur
+    # s'appliquent si la requête ne les précise pas, et ne peuvent pas changer
+    # en cours de pagination.
+    if not cursor:
+        return None, filters
+    position, saved = decode_cursor(cursor)
+    merged = dict(filters)
+    for key, value in saved.items():
+        if merged.get(key) is None:
+            merged[key] = value
+        elif merged[key] != value:
+            raise HTTPException(status_code=400, detail=f"Cursor does not match filter '{key}'")
+    return position, merged
+
+
+def _comparable(db, column):
+    # SQLite stocke les dates en texte : 'AAAA-MM-JJ HH:MM:SS' pour
+    # CURRENT_TIMESTAMP, 'AAAA-MM-JJ HH:MM:SS.ffffff' pour les valeurs (et
+    # les curseurs) passés par SQLAlchemy. Sans mise au même format, une
+    # ligne de la même seconde que le curseur passe pour antérieure à lui.
+    if db.bind.dialect.name == "sqlite" and isinstance(column.type, DateTime):
+        padded = func.substr(column.op("||")(literal(".000000", String)), 1, 26)
+        return type_coerce(padded, column.type)
+    return column
+
+
+async def fetch_page(db, query, columns: list, position: Optional[list], limit: int, filters: Optional[dict] = None, rows: bool = False) -> dict:
+    # `columns` : clé de tri décroissante, terminée par une colonne unique (id).
+    # rows=True : `query` sélectionne des colonnes, les éléments sont des dicts.
+    if position is not None:
+        if len(position) != len(columns):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        keys = [_comparable(db, column) for column in columns]
+        query = query.where(tuple_(*keys) < tuple_(*position))
+        if keys[0] is not columns[0]:
+            # Même borne sur la colonne brute, pour que l'index serve encore
+            query = query.where(columns[0] <= position[0])
+    query = query.order_by(*[column.desc() for column in columns]).limit(limit + 1)
+    result = await db.execute(query)
+    items = [dict(row) for row in result.mappings()] if rows else result.scalars().all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        key = last.__getitem__ if rows else lambda name: getattr(last, name)
+        next_cursor = encode_cursor([key(column.key) for column in columns], filters)
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,115 @@
+# quotas.py
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, literal, or_, select, update
+
+from cache import entity_cache
+from database import upsert_insert
+from models import Ad, AdStatus, ProSubscription, SubscriptionStatus, UserAdUsage
+
+# Statuts comptés dans le quota (annonces en ligne ou en attente de modération)
+LIVE_STATUSES = (AdStatus.pending, AdStatus.active)
+
+
+class QuotaExceeded(HTTPException):
+    def __init__(self, detail: str):
+        super().__init__(status_code=403, detail=detail)
+
+
+def usage_of(status, is_featured) -> tuple:
+    # (annonces, vedettes) occupées par une annonce dans cet état
+    live = AdStatus(status or AdStatus.pending) in LIVE_STATUSES
+    return (1, 1 if is_featured else 0) if live else (0, 0)
+
+
+async def limits(db, user_id: int) -> dict:
+    # Plafonds de l'abonnement pro en cours (0 = illimité), mis en cache
+    async def load():
+        now = datetime.now(timezone.utc)
+        result = await db.execute(
+            select(func.max(ProSubscription.ads_limit), func.max(ProSubscription.featured_limit))
+            .where(
+                ProSubscription.user_id == user_id,
+                ProSubscription.status == SubscriptionStatus.active,
+                ProSubscription.start_date <= now,
+                or_(ProSubscription.end_date.is_(None), ProSubscription.end_date > now),
+            )
+        )
+        ads_limit, featured_limit = result.one()
+        return {"ads_limit": ads_limit or 0, "featured_limit": featured_limit or 0}
+
+    return await entity_cache.get_or_load("quota", user_id, load)
+
+
+async def _seed(db, user_id: int):
+    # Première utilisation : compteurs initialisés depuis les annonces existantes
+    live = Ad.status.in_(LIVE_STATUSES)
+    upsert = upsert_insert(db, UserAdUsage)
+    await db.execute(
+        upsert.from_select(
+            ["user_id", "ads_count", "featured_count"],
+            select(
+                literal(user_id),
+                func.count(Ad.id).filter(live),
+                func.count(Ad.id).filter(and_(live, Ad.is_featured.is_(True))),
+            ).where(Ad.user_id == user_id),
+        ).on_conflict_do_nothing(index_elements=[UserAdUsage.user_id])
+    )
+
+
+async def reserve(db, user_id: int, ads: int = 0, featured: int = 0):
+    """Réserve `ads` annonces et `featured` vedettes, ou lève QuotaExceeded.
+
+    À appeler dans la transaction qui écrit les annonces, avant leur flush.
+    L'UPDATE conditionnel verrouille la ligne de l'utilisateur : deux
+    créations simultanées sont sérialisées et la seconde voit la première.
+    Les deltas négatifs (retraits) ne sont jamais refusés.
+    """
+    if not ads and not featured:
+        return
+    quota = await limits(db, user_id)
+    statement = (
+        update(UserAdUsage)
+        .where(UserAdUsage.user_id == user_id)
+        .values(ads_count=UserAdUsage.ads_count + ads, featured_count=UserAdUsage.featured_count + featured)
+        .returning(UserAdUsage.user_id)
+        .execution_options(synchronize_session=False)
+    )
+    if ads > 0 and quota["ads_limit"] > 0:
+        statement = statement.where(UserAdUsage.ads_count + ads <= quota["ads_limit"])
+    if featured > 0 and quota["featured_limit"] > 0:
+        statement = statement.where(UserAdUsage.featured_count + featured <= quota["featured_limit"])
+    if (await db.execute(statement)).first() is not None:
+        return
+    # Pas de ligne (ou quota atteint) : initialisation, par nous ou par une
+    # transaction concurrente, puis nouvel essai
+    await _seed(db, user_id)
+    if (await db.execute(statement)).first() is not None:
+        return
+    usage = await db.get(UserAdUsage, user_id, populate_existing=True)
+    if ads > 0 and quota["ads_limit"] > 0 and usage.ads_count + ads > quota["ads_limit"]:
+        raise QuotaExceeded(f"Ad quota exceeded ({usage.ads_count}/{quota['ads_limit']})")
+    raise QuotaExceeded(f"Featured ad quota exceeded ({usage.featured_count}/{quota['featured_limit']})")
+
+
+async def release(db, user_id: int, ads: int = 0, featured: int = 0):
+    # Retrait (suppression, expiration…) ; sans ligne, le prochain _seed comptera juste
+    if not ads and not featured:
+        return
+    await db.execute(
+        update(UserAdUsage)
+        .where(UserAdUsage.user_id == user_id)
+        .values(ads_count=UserAdUsage.ads_count - ads, featured_count=UserAdUsage.featured_count - featured)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def apply_change(db, user_id: int, before: tuple, after: tuple):
+    # before/after : usage_of(...) de l'annonce avant et après modification
+    ads, featured = after[0] - before[0], after[1] - before[1]
+    if ads > 0 or featured > 0:
+        await reserve(db, user_id, ads, featured)
+    elif ads or featured:
+        await release(db, user_id, -ads, -featured)
+
@@ -0,0 +1,197 @@
+# rollups.py
+import asyncio
+import sys
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import Date, cast, delete, func, insert, select
+
+from database import upsert_insert
+from models import Payment, PaymentDailyRollup, PaymentStatus
+
+DEFAULT_CURRENCY = "EUR"
+
+_CENT = Decimal("0.01")
+
+
+def _amount(value) -> Decimal:
+    return Decimal(str(value or 0)).quantize(_CENT)
+
+
+def _as_date(value) -> date:
+    # SQLite renvoie date() sous forme de texte
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def payment_day(created_at: datetime) -> date:
+    # Jour UTC, comme _day_column côté SQL
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.date()
+
+
+def payment_key(payment, payment_status=None) -> tuple:
+    # `payment` : objet Payment ou ligne avec created_at, currency, payment_status
+    payment_status = payment.payment_status if payment_status is None else payment_status
+    return (
+        payment_day(payment.created_at),
+        payment.currency or DEFAULT_CURRENCY,
+        PaymentStatus(payment_status or PaymentStatus.pending),
+    )
+
+
+def add(deltas: dict, payment, sign: int = 1, payment_status=None):
+    # Accumule ±1 paiement (et son montant) dans deltas[(jour, devise, statut)]
+    key = payment_key(payment, payment_status)
+    count, amount = deltas.get(key, (0, Decimal(0)))
+    deltas[key] = (count + sign, amount + sign * _amount(payment.amount))
+
+
+def move(deltas: dict, payment, old_status, new_status):
+    if PaymentStatus(old_status or PaymentStatus.pending) == PaymentStatus(new_status or PaymentStatus.pending):
+        return
+    add(deltas, payment, -1, old_status)
+    add(deltas, payment, 1, new_status)
+
+
+async def apply(db, deltas: dict):
+    # À exécuter dans la transaction qui modifie les paiements. Clés triées :
+    # ordre de verrouillage constant entre transactions concurrentes.
+    rows = [
+        {"day": day, "currency": currency, "payment_status": payment_status, "payment_count": count, "amount": amount}
+        for (day, currency, payment_status), (count, amount) in sorted(deltas.items(), key=lambda item: (item[0][0], item[0][1], item[0][2].value))
+        if count or amount
+    ]
+    if not rows:
+        return
+    upsert = upsert_insert(db, PaymentDailyRollup)
+    await db.execute(
+        upsert.values(rows).on_conflict_do_update(
+            index_elements=[PaymentDailyRollup.day, PaymentDailyRollup.currency, PaymentDailyRollup.payment_status],
+            set_={
+                "payment_count": PaymentDailyRollup.payment_count + upsert.excluded.payment_count,
+                "amount": PaymentDailyRollup.amount + upsert.excluded.amount,
+            },
+        )
+    )
+
+
+async def record_created(db, payment):
+    deltas = {}
+    add(deltas, payment)
+    await apply(db, deltas)
+
+
+async def record_deleted(db, payment):
+    deltas = {}
+    add(deltas, payment, -1)
+    await apply(db, deltas)
+
+
+async def record_status_change(db, payment, old_status):
+    deltas = {}
+    move(deltas, payment, old_status, payment.payment_status)
+    await apply(db, deltas)
+
+
+def _day_column(db):
+    if db.bind.dialect.name == "postgresql":
+        return cast(func.timezone("UTC", Payment.created_at), Date)
+    return func.date(Payment.created_at)
+
+
+def report_query(db, start: date, end: date, period: str = "day", currency: str = None, payment_status=None):
+    # Agrégats entre start et end inclus, regroupés par jour, mois ou année
+    # (colonne `day` = premier jour de la période)
+    rollup = PaymentDailyRollup
+    if period == "day":
+        bucket = rollup.day
+    elif db.bind.dialect.name == "postgresql":
+        bucket = cast(func.date_trunc(period, rollup.day), Date)
+    else:
+        bucket = func.date(rollup.day, f"start of {period}")
+    query = select(
+        bucket.label("day"), rollup.currency, rollup.payment_status,
+        func.sum(rollup.payment_count).label("payment_count"), cast(func.sum(rollup.amount), rollup.amount.type).label("amount"),
+    ).where(rollup.day >= start, rollup.day <= end)
+    if currency:
+        query = query.where(rollup.currency == currency)
+    if payment_status:
+        query = query.where(rollup.payment_status == payment_status)
+    return (
+        query.group_by(bucket, rollup.currency, rollup.payment_status)
+        .having(func.sum(rollup.payment_count) != 0)
+        .order_by(bucket, rollup.currency, rollup.payment_status)
+    )
+
+
+def _aggregate(db, *where):
+    day = _day_column(db)
+    currency = func.coalesce(Payment.currency, DEFAULT_CURRENCY)
+    payment_status = func.coalesce(Payment.payment_status, PaymentStatus.pending.value)
+    return (
+        select(day, currency, payment_status, func.count(), func.coalesce(func.sum(Payment.amount), 0))
+        .where(*where)
+        .group_by(day, currency, payment_status)
+    )
+
+
+async def remove_user_payments(db, user_id: int):
+    # Avant la suppression d'un utilisateur : ses paiements partent en cascade côté base
+    deltas = {}
+    for day, currency, payment_status, count, amount in await db.execute(_aggregate(db, Payment.user_id == user_id)):
+        deltas[(_as_date(day), currency, PaymentStatus(payment_status))] = (-count, -_amount(amount))
+    await apply(db, deltas)
+
+
+async def rebuild(db) -> int:
+    # Recalcul complet depuis payments (mise en place, réparation)
+    await db.execute(delete(PaymentDailyRollup))
+    result = await db.execute(
+        insert(PaymentDailyRollup).from_select(
+            ["day", "currency", "payment_status", "payment_count", "amount"], _aggregate(db)
+        )
+    )
+    return result.rowcount
+
+
+async def verify(db) -> list:
+    # Écarts entre la table d'agrégats et un recalcul complet (liste vide = identiques)
+    expected = {
+        (_as_date(day), currency, PaymentStatus(payment_status)): (count, _amount(amount))
+        for day, currency, payment_status, count, amount in await db.execute(_aggregate(db))
+    }
+    actual = {
+        (row.day, row.currency, PaymentStatus(row.payment_status)): (row.payment_count, _amount(row.amount))
+        for row in (await db.execute(select(PaymentDailyRollup))).scalars()
+        if row.payment_count or row.amount
+    }
+    differences = []
+    for key in sorted(expected.keys() | actual.keys(), key=lambda key: (key[0], key[1], key[2].value)):
+        if expected.get(key) != actual.get(key):
+            day, currency, payment_status = key
+            differences.append({
+                "day": day.isoformat(), "currency": currency, "payment_status": payment_status.value,
+                "expected": expected.get(key, (0, Decimal(0))), "actual": actual.get(key, (0, Decimal(0))),
+            })
+    return differences
+
+
+async def _main(command: str):
+    from database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        if command == "rebuild":
+            async with db.begin():
+                print(f"{await rebuild(db)} ligne(s) d'agrégats")
+        elif command == "verify":
+            differences = await verify(db)
+            for difference in differences:
+                print(difference)
+            raise SystemExit(1 if differences else 0)
+        else:
+            raise SystemExit("usage: python rollups.py rebuild|verify")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else ""))
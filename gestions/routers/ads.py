@@ -1,48 +1,207 @@
 # ads.py
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from models import Ad, User
-from schemas import AdCreate, AdRead, AdUpdate
+from models import Ad, User, AccountType
+from schemas import AdCreate, AdRead, AdDetailRead, AdUpdate, AdNearbyRead, AdImportReport, Page
 from database import get_db
-from typing import List, Optional
+from pagination import resolve_cursor, fetch_page
+from category_tree import category_tree
+from search import search_ads, search_index
+from geo import box_filter, haversine_km
+from counters import ad_counters
+from ad_import import import_ads, iter_lines, iter_csv_records, iter_jsonl_records
+from cache import entity_cache
+from serialization import row_columns, fetch_rows, json_response
+from includes import AD_INCLUDES, parse_includes, load_options, ad_detail
+from feed import feed
+import quotas
+from typing import List, Optional, Union
 
 router = APIRouter()
 
+# Après écriture des compteurs, la valeur en cache (sans les deltas) est périmée
+ad_counters.on_flush.append(lambda ad_ids: entity_cache.invalidate_many("ad", ad_ids))
+
 @router.post("/", response_model=AdRead, status_code=status.HTTP_201_CREATED)
 async def create_ad(ad: AdCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends()):
     # Ici tu peux ajouter une dépendance pour l’utilisateur connecté si tu as auth
     # Exemple: current_user = Depends(get_current_user)
+    # Quota de l'abonnement pro, réservé dans la même transaction
+    await quotas.reserve(db, current_user.id, *quotas.usage_of(ad.status, ad.is_featured))
     db_ad = Ad(**ad.dict(), user_id=current_user.id)
     db.add(db_ad)
     await db.commit()
     await db.refresh(db_ad)
+    search_index.upsert(db_ad)
+    feed.upsert(db_ad)
     return db_ad
 
-@router.get("/{ad_id}", response_model=AdRead)
-async def read_ad(ad_id: int, db: AsyncSession = Depends(get_db)):
-    ad = await db.get(Ad, ad_id)
+@router.post("/import", response_model=AdImportReport)
+async def import_ads_endpoint(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$", description="csv ou jsonl (sinon déduit du Content-Type)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(),
+):
+    # Import en masse réservé aux comptes professionnels ; le corps est lu en
+    # flux, validé et inséré par lots, les lignes invalides sont rapportées.
+    if current_user.account_type != AccountType.professionnel:
+        raise HTTPException(status_code=403, detail="Bulk import is reserved to professional accounts")
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "jsonl"
+    lines = iter_lines(request.stream())
+    records = iter_csv_records(lines) if format == "csv" else iter_jsonl_records(lines)
+
+    def on_inserted(ads):
+        for ad in ads:
+            search_index.upsert(ad)
+            feed.upsert(ad)
+
+    return await import_ads(db, current_user.id, records, on_inserted)
+
+@router.get("/feed", response_model=Page[AdRead])
+async def home_feed(
+    category_id: Optional[int] = Query(None, description="Fil d'une catégorie (sous-catégories comprises)"),
+    limit: int = Query(20, le=100),
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par la page précédente"),
+    db: AsyncSession = Depends(get_db),
+):
+    # Annonces actives, en vedette d'abord puis les plus récentes, servies
+    # depuis le fil pré-classé en mémoire (voir feed.py)
+    position, filters = resolve_cursor(cursor or "", {"category_id": category_id})
+    if position is not None and (len(position) != 3 or not all(isinstance(value, (int, float)) for value in position)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    await feed.ensure_fresh(db)
+    return feed.page(filters["category_id"], position, limit, filters)
+
+@router.get("/search", response_model=Page[AdRead])
+async def search(
+    q: Optional[str] = Query(None, min_length=1, description="Texte recherché dans le titre et la description"),
+    limit: int = Query(20, le=100),
+    status: Optional[str] = Query(None, description="Filtrer par status"),
+    category_id: Optional[int] = Query(None, description="Filtrer par catégorie"),
+    include_subcategories: bool = Query(False, description="Inclure les sous-catégories de category_id"),
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par la page précédente"),
+    db: AsyncSession = Depends(get_db),
+):
+    # Classement par pertinence, annonces mises en avant favorisées
+    filters = {"q": q, "status": status, "category_id": category_id, "include_subcategories": include_subcategories or None}
+    position, filters = resolve_cursor(cursor or "", filters)
+    if not filters["q"]:
+        raise HTTPException(status_code=400, detail="Missing search query")
+    category_ids = None
+    if filters["category_id"] and filters["include_subcategories"]:
+        category_ids = await category_tree.subtree_ids(db, filters["category_id"])
+    elif filters["category_id"]:
+        category_ids = [filters["category_id"]]
+    return await search_ads(db, filters["q"], filters, category_ids, position, limit)
+
+@router.get("/nearby", response_model=List[AdNearbyRead])
+async def nearby_ads(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(10, gt=0, le=1000),
+    limit: int = Query(50, le=500),
+    status: Optional[str] = Query(None, description="Filtrer par status"),
+    category_id: Optional[int] = Query(None, description="Filtrer par catégorie"),
+    include_subcategories: bool = Query(False, description="Inclure les sous-catégories de category_id"),
+    db: AsyncSession = Depends(get_db),
+):
+    # 1) candidats dans le rectangle englobant (index), colonnes minimales
+    query = select(Ad.id, Ad.latitude, Ad.longitude).where(box_filter(db.bind.dialect.name, lat, lon, radius_km))
+    if status:
+        query = query.where(Ad.status == status)
+    if category_id and include_subcategories:
+        query = query.where(Ad.category_id.in_(await category_tree.subtree_ids(db, category_id)))
+    elif category_id:
+        query = query.where(Ad.category_id == category_id)
+    candidates = (await db.execute(query)).all()
+    if not candidates:
+        return []
+
+    # 2) distance exacte (haversine) sur tous les candidats d'un coup
+    distances = haversine_km(lat, lon, [float(row.latitude) for row in candidates], [float(row.longitude) for row in candidates])
+    nearest = sorted(
+        (distance, row.id) for distance, row in zip(distances, candidates) if distance <= radius_km
+    )[:limit]
+    if not nearest:
+        return []
+
+    result = await db.execute(select(Ad).where(Ad.id.in_([ad_id for _, ad_id in nearest])))
+    ads = {ad.id: ad for ad in result.scalars()}
+    return [
+        AdNearbyRead(**AdRead.model_validate(ads[ad_id]).model_dump(), distance_km=round(distance, 3))
+        for distance, ad_id in nearest if ad_id in ads
+    ]
+
+INCLUDE_DESCRIPTION = "Relations à inclure, séparées par des virgules : images, category, seller, auction"
+
+@router.get("/{ad_id}", response_model=AdDetailRead, response_model_exclude_unset=True)
+async def read_ad(
+    ad_id: int,
+    include: Optional[str] = Query(None, description=INCLUDE_DESCRIPTION),
+    db: AsyncSession = Depends(get_db),
+):
+    includes = parse_includes(include, AD_INCLUDES)
+    if includes:
+        # Relations demandées : lecture directe, hors cache
+        result = await db.execute(select(Ad).where(Ad.id == ad_id).options(*load_options(includes, AD_INCLUDES)))
+        ad = result.unique().scalar_one_or_none()
+        ad = AdDetailRead.model_validate(ad_detail(ad, includes)).model_dump(mode="json", exclude_unset=True) if ad else None
+    else:
+        async def load():
+            ad = await db.get(Ad, ad_id)
+            return AdRead.model_validate(ad).model_dump(mode="json") if ad else None
+
+        ad = await entity_cache.get_or_load("ad", ad_id, load)
     if not ad:
         raise HTTPException(status_code=404, detail="Ad not found")
-    return ad
+    # Vue comptée en mémoire, écrite en base par lots (voir counters.py)
+    ad_counters.record(ad_id, "views")
+    views, _, _ = ad_counters.pending(ad_id)
+    return {**ad, "views_count": (ad["views_count"] or 0) + views}
 
-@router.get("/", response_model=List[AdRead])
+@router.get("/", response_model=Union[List[AdDetailRead], Page[AdDetailRead]], response_model_exclude_unset=True)
 async def list_ads(
     skip: int = 0,
     limit: int = Query(100, le=1000),
     status: Optional[str] = Query(None, description="Filtrer par status"),
     category_id: Optional[int] = Query(None, description="Filtrer par catégorie"),
+    include_subcategories: bool = Query(False, description="Inclure les sous-catégories de category_id"),
+    cursor: Optional[str] = Query(None, description="Pagination par curseur (vide pour la première page)"),
+    include: Optional[str] = Query(None, description=INCLUDE_DESCRIPTION),
     db: AsyncSession = Depends(get_db),
 ):
-    query = select(Ad)
-    if status:
-        query = query.where(Ad.status == status)
-    if category_id:
-        query = query.where(Ad.category_id == category_id)
+    filters = {"status": status, "category_id": category_id, "include_subcategories": include_subcategories or None}
+    if cursor is not None:
+        position, filters = resolve_cursor(cursor, filters)
+    includes = parse_includes(include, AD_INCLUDES)
+    if includes:
+        # Objets ORM nécessaires pour les relations, chargées en une requête chacune
+        query = select(Ad).options(*load_options(includes, AD_INCLUDES))
+    else:
+        # Colonnes seules, sérialisées sans passer par les objets ORM (voir serialization.py)
+        query = select(*row_columns(Ad, AdRead))
+    if filters["status"]:
+        query = query.where(Ad.status == filters["status"])
+    if filters["category_id"] and filters["include_subcategories"]:
+        category_ids = await category_tree.subtree_ids(db, filters["category_id"])
+        query = query.where(Ad.category_id.in_(category_ids))
+    elif filters["category_id"]:
+        query = query.where(Ad.category_id == filters["category_id"])
+    if includes:
+        if cursor is not None:
+            page = await fetch_page(db, query, [Ad.created_at, Ad.id], position, limit, filters)
+            page["items"] = [ad_detail(ad, includes) for ad in page["items"]]
+            return json_response(Page[AdDetailRead], page, exclude_unset=True)
+        result = await db.execute(query.offset(skip).limit(limit))
+        return json_response(List[AdDetailRead], [ad_detail(ad, includes) for ad in result.unique().scalars()], exclude_unset=True)
+    if cursor is not None:
+        return json_response(Page[AdRead], await fetch_page(db, query, [Ad.created_at, Ad.id], position, limit, filters, rows=True))
     query = query.offset(skip).limit(limit)
-    result = await db.execute(query)
-    ads = result.scalars().all()
-    return ads
+    return json_response(List[AdRead], await fetch_rows(db, query))
 
 @router.patch("/{ad_id}", response_model=AdRead)
 async def update_ad(ad_id: int, ad_update: AdUpdate, db: AsyncSession = Depends(get_db), current_user: User = Depends()):
@@ -53,10 +212,19 @@ async def update_ad(ad_id: int, ad_update: AdUpdate, db: AsyncSession = Depends(
     if ad.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this ad")
     update_data = ad_update.dict(exclude_unset=True)
+    # Avant les setattr : l'autoflush ne doit pas précéder la réservation
+    await quotas.apply_change(
+        db, ad.user_id,
+        quotas.usage_of(ad.status, ad.is_featured),
+        quotas.usage_of(update_data.get("status", ad.status), update_data.get("is_featured", ad.is_featured)),
+    )
     for key, value in update_data.items():
         setattr(ad, key, value)
     await db.commit()
     await db.refresh(ad)
+    await entity_cache.invalidate("ad", ad_id)
+    search_index.upsert(ad)
+    feed.upsert(ad)
     return ad
 
 @router.delete("/{ad_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -67,6 +235,10 @@ async def delete_ad(ad_id: int, db: AsyncSession = Depends(get_db), current_user
     # Vérifier que current_user est bien propriétaire (ou admin)
     if ad.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this ad")
+    await quotas.release(db, ad.user_id, *quotas.usage_of(ad.status, ad.is_featured))
     await db.delete(ad)
     await db.commit()
+    await entity_cache.invalidate("ad", ad_id)
+    search_index.remove(ad_id)
+    feed.remove(ad_id)
     return
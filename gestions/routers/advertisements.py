@@ -0,0 +1,164 @@
+# advertisements.py
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+from models import Advertisement, AdvertisementTargeting, User, UserRole
+from schemas import (
+    AdvertisementCreate, AdvertisementRead, AdvertisementUpdate, AdvertisementServed,
+    AdPosition, AdStatusType, Page,
+)
+from database import get_db
+from pagination import resolve_cursor, fetch_page
+from category_tree import category_tree
+from ad_serving import serving_index, normalize
+from ad_tracking import ad_events
+from typing import List, Optional, Union
+
+router = APIRouter()
+
+
+async def _load(db: AsyncSession, advertisement_id: int):
+    result = await db.execute(
+        select(Advertisement)
+        .options(selectinload(Advertisement.targetings))
+        .where(Advertisement.id == advertisement_id)
+    )
+    return result.scalar_one_or_none()
+
+
+def _check_owner(advertisement: Advertisement, current_user: User):
+    if advertisement.advertiser_id != current_user.id and current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized to manage this advertisement")
+
+
+@router.post("/", response_model=AdvertisementRead, status_code=status.HTTP_201_CREATED)
+async def create_advertisement(advertisement: AdvertisementCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends()):
+    data = advertisement.dict(exclude={"targetings"})
+    if data["start_date"] is None:
+        data["start_date"] = datetime.now(timezone.utc)
+    db_advertisement = Advertisement(
+        **data,
+        advertiser_id=current_user.id,
+        targetings=[AdvertisementTargeting(**targeting.dict()) for targeting in advertisement.targetings],
+    )
+    db.add(db_advertisement)
+    await db.commit()
+    db_advertisement = await _load(db, db_advertisement.id)
+    serving_index.upsert(db_advertisement)
+    return db_advertisement
+
+@router.get("/serve", response_model=List[AdvertisementServed])
+async def serve_advertisements(
+    position: AdPosition = Query(..., description="Emplacement de la bannière"),
+    category: Optional[int] = Query(None, description="Catégorie de la page affichée"),
+    keywords: Optional[str] = Query(None, description="Mots-clés séparés par des virgules"),
+    device: Optional[str] = Query(None, description="mobile, desktop, tablet…"),
+    location: Optional[str] = Query(None, description="Ville ou région du visiteur"),
+    limit: int = Query(1, ge=1, le=10),
+    db: AsyncSession = Depends(get_db),
+):
+    # Décision prise en mémoire ; la base n'est lue qu'au rafraîchissement de l'index
+    await serving_index.ensure_fresh(db)
+    request = {}
+    if category is not None:
+        # Une campagne ciblant une catégorie parente s'affiche aussi sur ses sous-catégories
+        node = await category_tree.get(db, category)
+        request["category"] = [str(category_id) for category_id in (category, *(node.ancestors if node else ()))]
+    if keywords:
+        request["keyword"] = [normalize("keyword", keyword) for keyword in keywords.split(",") if keyword.strip()]
+    if device:
+        request["device"] = [normalize("device", device)]
+    if location:
+        request["location"] = [normalize("location", location)]
+    return serving_index.serve(position.value, request, limit)
+
+@router.post("/{advertisement_id}/impression", status_code=status.HTTP_204_NO_CONTENT)
+async def track_impression(advertisement_id: int, db: AsyncSession = Depends(get_db)):
+    # Compté en mémoire, écrit par lots (voir ad_tracking.py)
+    await serving_index.ensure_fresh(db)
+    campaign = serving_index.campaigns.get(advertisement_id)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Advertisement not found")
+    # Budget atteint ou période terminée depuis l'affichage : plus facturé
+    if campaign.running(datetime.now(timezone.utc)):
+        ad_events.record(advertisement_id, "impression")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get("/{advertisement_id}/click")
+async def track_click(advertisement_id: int, db: AsyncSession = Depends(get_db)):
+    # Lien de la bannière : compte le clic puis redirige vers l'annonceur
+    await serving_index.ensure_fresh(db)
+    campaign = serving_index.campaigns.get(advertisement_id)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Advertisement not found")
+    if campaign.running(datetime.now(timezone.utc)):
+        ad_events.record(advertisement_id, "click")
+    if campaign.payload["target_url"]:
+        return RedirectResponse(campaign.payload["target_url"], status_code=status.HTTP_302_FOUND)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get("/{advertisement_id}", response_model=AdvertisementRead)
+async def read_advertisement(advertisement_id: int, db: AsyncSession = Depends(get_db)):
+    advertisement = await _load(db, advertisement_id)
+    if not advertisement:
+        raise HTTPException(status_code=404, detail="Advertisement not found")
+    return advertisement
+
+@router.get("/", response_model=Union[List[AdvertisementRead], Page[AdvertisementRead]])
+async def list_advertisements(
+    skip: int = 0,
+    limit: int = Query(100, le=1000),
+    status: Optional[AdStatusType] = Query(None, description="Filtrer par status"),
+    position: Optional[AdPosition] = Query(None, description="Filtrer par emplacement"),
+    cursor: Optional[str] = Query(None, description="Pagination par curseur (vide pour la première page)"),
+    db: AsyncSession = Depends(get_db),
+):
+    filters = {"status": status.value if status else None, "position": position.value if position else None}
+    if cursor is not None:
+        position_key, filters = resolve_cursor(cursor, filters)
+    query = select(Advertisement).options(selectinload(Advertisement.targetings))
+    if filters["status"]:
+        query = query.where(Advertisement.status == filters["status"])
+    if filters["position"]:
+        query = query.where(Advertisement.position == filters["position"])
+    if cursor is not None:
+        return await fetch_page(db, query, [Advertisement.created_at, Advertisement.id], position_key, limit, filters)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.patch("/{advertisement_id}", response_model=AdvertisementRead)
+async def update_advertisement(
+    advertisement_id: int,
+    advertisement_update: AdvertisementUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(),
+):
+    advertisement = await _load(db, advertisement_id)
+    if not advertisement:
+        raise HTTPException(status_code=404, detail="Advertisement not found")
+    _check_owner(advertisement, current_user)
+    update_data = advertisement_update.dict(exclude_unset=True)
+    targetings = update_data.pop("targetings", None)
+    for key, value in update_data.items():
+        setattr(advertisement, key, value)
+    if targetings is not None:
+        advertisement.targetings = [AdvertisementTargeting(**targeting) for targeting in targetings]
+    await db.commit()
+    advertisement = await _load(db, advertisement_id)
+    serving_index.upsert(advertisement)
+    return advertisement
+
+@router.delete("/{advertisement_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_advertisement(advertisement_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends()):
+    advertisement = await _load(db, advertisement_id)
+    if not advertisement:
+        raise HTTPException(status_code=404, detail="Advertisement not found")
+    _check_owner(advertisement, current_user)
+    await db.delete(advertisement)
+    await db.commit()
+    serving_index.remove(advertisement_id)
+    ad_events.forget(advertisement_id)
+    return
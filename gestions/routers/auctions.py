@@ -1,10 +1,17 @@
 # routers/auctions.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from models import Auction
-from schemas import AuctionCreate, AuctionRead
+from models import Auction, AuctionStatus
+from schemas import AuctionCreate, AuctionRead, AuctionDetailRead, Page
 from database import get_db
+from pagination import resolve_cursor, fetch_page
+from bid_stream import auction_snapshot, sse_events, websocket_events
+from auction_scheduler import auction_closer
+from cache import entity_cache
+from includes import AUCTION_INCLUDES, parse_includes, load_options, auction_detail
+from typing import Optional, Union
 
 router = APIRouter()
 
@@ -14,17 +21,69 @@ async def create_auction(auction: AuctionCreate, db: AsyncSession = Depends(get_
     db.add(db_auction)
     await db.commit()
     await db.refresh(db_auction)
+    # Enchère en attente : ouverte par le planificateur à son start_time
+    start_time = db_auction.start_time if db_auction.status == AuctionStatus.pending else None
+    auction_closer.schedule(db_auction.id, db_auction.end_time, start_time)
     return db_auction
 
 @router.get("/{auction_id}", response_model=AuctionRead)
 async def get_auction(auction_id: int, db: AsyncSession = Depends(get_db)):
-    auction = await db.get(Auction, auction_id)
+    async def load():
+        auction = await db.get(Auction, auction_id)
+        return AuctionRead.model_validate(auction).model_dump(mode="json") if auction else None
+
+    auction = await entity_cache.get_or_load("auction", auction_id, load)
     if not auction:
         raise HTTPException(status_code=404, detail="Auction not found")
     return auction
 
-@router.get("/", response_model=list[AuctionRead])
-async def list_auctions(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Auction).offset(skip).limit(limit))
-    auctions = result.scalars().all()
-    return auctions
+@router.get("/", response_model=Union[list[AuctionDetailRead], Page[AuctionDetailRead]], response_model_exclude_unset=True)
+async def list_auctions(
+    skip: int = 0,
+    limit: int = 100,
+    status: Optional[str] = Query(None, description="Filtrer par status"),
+    cursor: Optional[str] = Query(None, description="Pagination par curseur (vide pour la première page)"),
+    include: Optional[str] = Query(None, description="Relations à inclure, séparées par des virgules : ad, bids"),
+    db: AsyncSession = Depends(get_db),
+):
+    filters = {"status": status}
+    if cursor is not None:
+        position, filters = resolve_cursor(cursor, filters)
+    includes = parse_includes(include, AUCTION_INCLUDES)
+    query = select(Auction).options(*load_options(includes, AUCTION_INCLUDES))
+    if filters["status"]:
+        query = query.where(Auction.status == filters["status"])
+    if cursor is not None:
+        page = await fetch_page(db, query, [Auction.created_at, Auction.id], position, limit, filters)
+        page["items"] = [auction_detail(auction, includes) for auction in page["items"]]
+        return page
+    result = await db.execute(query.offset(skip).limit(limit))
+    return [auction_detail(auction, includes) for auction in result.scalars()]
+
+@router.get("/{auction_id}/stream")
+async def stream_auction(auction_id: int, db: AsyncSession = Depends(get_db)):
+    # Server-Sent Events : état courant puis chaque offre acceptée
+    auction = await db.get(Auction, auction_id)
+    if not auction:
+        raise HTTPException(status_code=404, detail="Auction not found")
+    snapshot = auction_snapshot(auction)
+    await db.close()  # ne pas garder une connexion pendant tout le flux
+    return StreamingResponse(
+        sse_events(auction_id, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/{auction_id}/ws")
+async def auction_websocket(websocket: WebSocket, auction_id: int, db: AsyncSession = Depends(get_db)):
+    auction = await db.get(Auction, auction_id)
+    if not auction:
+        await websocket.close(code=4404)
+        return
+    snapshot = auction_snapshot(auction)
+    await db.close()
+    await websocket.accept()
+    try:
+        await websocket_events(websocket, auction_id, snapshot)
+    except WebSocketDisconnect:
+        pass
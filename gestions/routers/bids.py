@@ -1,20 +1,20 @@
 # bids.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from models import Bid
-from schemas import BidCreate, BidRead
+from models import Bid, User
+from schemas import BidCreate, BidRead, Page
 from database import get_db
+from pagination import resolve_cursor, fetch_page
+from bidding import place_bid
+from typing import Optional, Union
 
 router = APIRouter()
 
 @router.post("/", response_model=BidRead, status_code=status.HTTP_201_CREATED)
-async def create_bid(bid: BidCreate, db: AsyncSession = Depends(get_db)):
-    db_bid = Bid(**bid.dict())
-    db.add(db_bid)
-    await db.commit()
-    await db.refresh(db_bid)
-    return db_bid
+async def create_bid(bid: BidCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends()):
+    # Vérifie l'état de l'enchère et met à jour current_price de façon atomique
+    return await place_bid(db, bid.auction_id, current_user.id, bid.amount)
 
 @router.get("/{bid_id}", response_model=BidRead)
 async def read_bid(bid_id: int, db: AsyncSession = Depends(get_db)):
@@ -23,8 +23,16 @@ async def read_bid(bid_id: int, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Bid not found")
     return bid
 
-@router.get("/", response_model=list[BidRead])
-async def list_bids(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+@router.get("/", response_model=Union[list[BidRead], Page[BidRead]])
+async def list_bids(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Pagination par curseur (vide pour la première page)"),
+    db: AsyncSession = Depends(get_db),
+):
+    if cursor is not None:
+        position, filters = resolve_cursor(cursor, {})
+        return await fetch_page(db, select(Bid), [Bid.bid_time, Bid.id], position, limit, filters)
     result = await db.execute(select(Bid).offset(skip).limit(limit))
     bids = result.scalars().all()
     return bids
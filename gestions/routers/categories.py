@@ -5,6 +5,8 @@ from sqlalchemy.future import select
 from models import Category
 from schemas import CategoryCreate, CategoryRead, CategoryUpdate
 from database import get_db
+from category_tree import category_tree
+from cache import entity_cache
 from typing import List, Optional
 
 router = APIRouter()
@@ -19,16 +21,38 @@ async def create_category(category: CategoryCreate, db: AsyncSession = Depends(g
     db_category = Category(**category.dict())
     db.add(db_category)
     await db.commit()
+    category_tree.invalidate()
     await db.refresh(db_category)
     return db_category
 
 @router.get("/{category_id}", response_model=CategoryRead)
 async def read_category(category_id: int, db: AsyncSession = Depends(get_db)):
-    category = await db.get(Category, category_id)
+    async def load():
+        category = await db.get(Category, category_id)
+        return CategoryRead.model_validate(category).model_dump(mode="json") if category else None
+
+    category = await entity_cache.get_or_load("category", category_id, load)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     return category
 
+@router.get("/{category_id}/ancestors", response_model=List[CategoryRead])
+async def category_ancestors(category_id: int, db: AsyncSession = Depends(get_db)):
+    # Servi depuis l'arbre en mémoire, de la racine au parent direct
+    nodes = await category_tree.nodes(db)
+    node = nodes.get(category_id)
+    if node is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return [nodes[ancestor_id] for ancestor_id in node.ancestors]
+
+@router.get("/{category_id}/descendants", response_model=List[CategoryRead])
+async def category_descendants(category_id: int, db: AsyncSession = Depends(get_db)):
+    nodes = await category_tree.nodes(db)
+    node = nodes.get(category_id)
+    if node is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return [nodes[descendant_id] for descendant_id in sorted(node.descendants)]
+
 @router.get("/", response_model=List[CategoryRead])
 async def list_categories(skip: int = 0, limit: int = 100, parent_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
     query = select(Category)
@@ -48,6 +72,8 @@ async def update_category(category_id: int, category_update: CategoryUpdate, db:
     for key, value in update_data.items():
         setattr(category, key, value)
     await db.commit()
+    category_tree.invalidate()
+    await entity_cache.invalidate("category", category_id)
     await db.refresh(category)
     return category
 
@@ -58,4 +84,6 @@ async def delete_category(category_id: int, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Category not found")
     await db.delete(category)
     await db.commit()
+    category_tree.invalidate()
+    await entity_cache.invalidate("category", category_id)
     return
@@ -0,0 +1,72 @@
+# favorites.py
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import Favorite, User, Ad
+from schemas import FavoriteRead, Page
+from database import get_db, upsert_insert
+from pagination import resolve_cursor, fetch_page
+from counters import ad_counters
+from favorite_cache import favorite_sets
+from typing import List, Optional, Union
+
+router = APIRouter()
+
+@router.get("/lookup", response_model=List[int])
+async def lookup_favorites(
+    ad_ids: List[int] = Query(..., max_length=1000, description="Annonces affichées (?ad_ids=1&ad_ids=2…)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(),
+):
+    # Annonces de la liste mises en favori par current_user, en une requête au plus
+    return await favorite_sets.favorited(db, current_user.id, ad_ids)
+
+@router.get("/", response_model=Union[List[FavoriteRead], Page[FavoriteRead]])
+async def list_favorites(
+    skip: int = 0,
+    limit: int = Query(100, le=1000),
+    cursor: Optional[str] = Query(None, description="Pagination par curseur (vide pour la première page)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(),
+):
+    query = select(Favorite).where(Favorite.user_id == current_user.id)
+    if cursor is not None:
+        position, filters = resolve_cursor(cursor, {})
+        return await fetch_page(db, query, [Favorite.created_at, Favorite.id], position, limit, filters)
+    query = query.order_by(Favorite.created_at.desc(), Favorite.id.desc())
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.put("/{ad_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def add_favorite(ad_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends()):
+    # Idempotent : un second ajout ne change rien
+    if not await db.get(Ad, ad_id):
+        raise HTTPException(status_code=404, detail="Ad not found")
+    result = await db.execute(
+        upsert_insert(db, Favorite)
+        .values(user_id=current_user.id, ad_id=ad_id)
+        .on_conflict_do_nothing(index_elements=[Favorite.user_id, Favorite.ad_id])
+        .returning(Favorite.id)
+    )
+    created = result.first() is not None
+    await db.commit()
+    if created:
+        ad_counters.record(ad_id, "favorites")
+        await favorite_sets.added(current_user.id, ad_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.delete("/{ad_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_favorite(ad_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends()):
+    # Idempotent : retirer une annonce absente des favoris n'est pas une erreur
+    result = await db.execute(
+        delete(Favorite)
+        .where(Favorite.user_id == current_user.id, Favorite.ad_id == ad_id)
+        .returning(Favorite.id)
+    )
+    removed = result.first() is not None
+    await db.commit()
+    if removed:
+        ad_counters.record(ad_id, "favorites", -1)
+        await favorite_sets.removed(current_user.id, ad_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
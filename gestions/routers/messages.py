@@ -0,0 +1,134 @@
+# messages.py
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import insert, update, and_, case, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import joinedload
+from models import Message, ConversationHead, User, Ad, conversation_pair
+from schemas import MessageCreate, MessageRead, ConversationRead, Page
+from database import get_db, upsert_insert
+from pagination import resolve_cursor, fetch_page
+from counters import ad_counters
+from typing import List, Optional, Union
+
+router = APIRouter()
+
+
+def _thread_filter(user_id: int, counterpart_id: int, ad_id: Optional[int]):
+    # Les deux sens de la conversation par leur clé commune : un seul
+    # parcours de idx_messages_pair, déjà dans l'ordre du fil
+    same_ad = Message.ad_id.is_(None) if ad_id is None else Message.ad_id == ad_id
+    lower, upper = conversation_pair(Message.sender_id, Message.receiver_id)
+    return and_(lower == min(user_id, counterpart_id), upper == max(user_id, counterpart_id), same_ad)
+
+
+@router.post("/", response_model=MessageRead, status_code=status.HTTP_201_CREATED)
+async def send_message(message: MessageCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends()):
+    if message.receiver_id == current_user.id:
+        raise HTTPException(status_code=400, detail="Cannot send a message to yourself")
+    if not await db.get(User, message.receiver_id):
+        raise HTTPException(status_code=404, detail="Receiver not found")
+    if message.ad_id is not None and not await db.get(Ad, message.ad_id):
+        raise HTTPException(status_code=404, detail="Ad not found")
+
+    data = {**message.dict(), "sender_id": current_user.id}
+    row = (await db.execute(insert(Message).values(**data).returning(Message.id, Message.created_at))).one()
+
+    # Têtes de conversation des deux participants, en une instruction ;
+    # seul le destinataire voit son compteur de non-lus augmenter. Lignes
+    # dans l'ordre de owner_id : deux messages croisés verrouillent les
+    # mêmes têtes dans le même ordre, sans interblocage.
+    upsert = upsert_insert(db, ConversationHead)
+    ad_key = message.ad_id or 0
+    heads = sorted([
+        {"owner_id": current_user.id, "counterpart_id": message.receiver_id, "ad_key": ad_key,
+         "last_message_id": row.id, "last_message_at": row.created_at, "unread_count": 0},
+        {"owner_id": message.receiver_id, "counterpart_id": current_user.id, "ad_key": ad_key,
+         "last_message_id": row.id, "last_message_at": row.created_at, "unread_count": 1},
+    ], key=lambda head: head["owner_id"])
+    # Un message validé après un plus récent ne remplace pas le dernier message
+    newer = upsert.excluded.last_message_at >= ConversationHead.last_message_at
+    await db.execute(
+        upsert.values(heads).on_conflict_do_update(
+            index_elements=[ConversationHead.owner_id, ConversationHead.counterpart_id, ConversationHead.ad_key],
+            set_={
+                "last_message_id": case((newer, upsert.excluded.last_message_id), else_=ConversationHead.last_message_id),
+                "last_message_at": case((newer, upsert.excluded.last_message_at), else_=ConversationHead.last_message_at),
+                "unread_count": ConversationHead.unread_count + upsert.excluded.unread_count,
+            },
+        )
+    )
+    await db.commit()
+    if message.ad_id is not None:
+        ad_counters.record(message.ad_id, "messages")
+    return {**data, "id": row.id, "created_at": row.created_at, "read_at": None}
+
+@router.get("/conversations", response_model=Union[List[ConversationRead], Page[ConversationRead]])
+async def list_conversations(
+    skip: int = 0,
+    limit: int = Query(50, le=200),
+    cursor: Optional[str] = Query(None, description="Pagination par curseur (vide pour la première page)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(),
+):
+    # Boîte de réception : une ligne par (interlocuteur, annonce), lue dans
+    # conversation_heads sans regrouper les messages
+    query = (
+        select(ConversationHead)
+        .options(joinedload(ConversationHead.last_message))
+        .where(ConversationHead.owner_id == current_user.id)
+    )
+    if cursor is not None:
+        position, filters = resolve_cursor(cursor, {})
+        return await fetch_page(db, query, [ConversationHead.last_message_at, ConversationHead.id], position, limit, filters)
+    query = query.order_by(ConversationHead.last_message_at.desc(), ConversationHead.id.desc())
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.get("/conversations/{counterpart_id}", response_model=Union[List[MessageRead], Page[MessageRead]])
+async def read_thread(
+    counterpart_id: int,
+    ad_id: Optional[int] = Query(None, description="Conversation liée à une annonce"),
+    skip: int = 0,
+    limit: int = Query(50, le=200),
+    cursor: Optional[str] = Query(None, description="Pagination par curseur (vide pour la première page)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(),
+):
+    # Du plus récent au plus ancien
+    filters = {"ad_id": ad_id}
+    if cursor is not None:
+        position, filters = resolve_cursor(cursor, filters)
+    query = select(Message).where(_thread_filter(current_user.id, counterpart_id, filters["ad_id"]))
+    if cursor is not None:
+        return await fetch_page(db, query, [Message.created_at, Message.id], position, limit, filters)
+    query = query.order_by(Message.created_at.desc(), Message.id.desc())
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+@router.post("/conversations/{counterpart_id}/read")
+async def mark_thread_read(
+    counterpart_id: int,
+    ad_id: Optional[int] = Query(None, description="Conversation liée à une annonce"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(),
+):
+    # Tous les messages reçus non lus de la conversation, en une instruction
+    same_ad = Message.ad_id.is_(None) if ad_id is None else Message.ad_id == ad_id
+    result = await db.execute(
+        update(Message)
+        .where(Message.receiver_id == current_user.id, Message.sender_id == counterpart_id, same_ad, Message.read_at.is_(None))
+        .values(read_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(ConversationHead)
+        .where(
+            ConversationHead.owner_id == current_user.id,
+            ConversationHead.counterpart_id == counterpart_id,
+            ConversationHead.ad_key == (ad_id or 0),
+        )
+        .values(unread_count=0)
+    )
+    await db.commit()
+    return {"updated": result.rowcount}
@@ -1,10 +1,14 @@
 # notifications.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from models import Notification
-from schemas import NotificationCreate, NotificationRead
+from models import Notification, User
+from schemas import NotificationCreate, NotificationRead, Page
 from database import get_db
+from pagination import resolve_cursor, fetch_page
+from notify import add_unread, remove_unread, unread_count as read_unread_count
+from typing import Optional, Union
 
 router = APIRouter()
 
@@ -12,10 +16,31 @@ router = APIRouter()
 async def create_notification(notification: NotificationCreate, db: AsyncSession = Depends(get_db)):
     db_notification = Notification(**notification.dict())
     db.add(db_notification)
+    if not db_notification.is_read:
+        await add_unread(db, {db_notification.user_id: 1})
     await db.commit()
     await db.refresh(db_notification)
     return db_notification
 
+@router.get("/unread_count")
+async def unread_count(db: AsyncSession = Depends(get_db), current_user: User = Depends()):
+    # Compteur tenu à jour à l'écriture : lecture par clé primaire, sans COUNT
+    return {"unread": await read_unread_count(db, current_user.id)}
+
+@router.post("/mark_all_read")
+async def mark_all_read(db: AsyncSession = Depends(get_db), current_user: User = Depends()):
+    result = await db.execute(
+        update(Notification)
+        .where(Notification.user_id == current_user.id, Notification.is_read.isnot(True))
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+    # Décrément des lignes réellement marquées, pas remise à zéro : une
+    # notification arrivée après l'UPDATE reste comptée.
+    await remove_unread(db, current_user.id, result.rowcount)
+    await db.commit()
+    return {"updated": result.rowcount}
+
 @router.get("/{notification_id}", response_model=NotificationRead)
 async def read_notification(notification_id: int, db: AsyncSession = Depends(get_db)):
     notification = await db.get(Notification, notification_id)
@@ -23,8 +48,16 @@ async def read_notification(notification_id: int, db: AsyncSession = Depends(get
         raise HTTPException(status_code=404, detail="Notification not found")
     return notification
 
-@router.get("/", response_model=list[NotificationRead])
-async def list_notifications(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+@router.get("/", response_model=Union[list[NotificationRead], Page[NotificationRead]])
+async def list_notifications(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Pagination par curseur (vide pour la première page)"),
+    db: AsyncSession = Depends(get_db),
+):
+    if cursor is not None:
+        position, filters = resolve_cursor(cursor, {})
+        return await fetch_page(db, select(Notification), [Notification.created_at, Notification.id], position, limit, filters)
     result = await db.execute(select(Notification).offset(skip).limit(limit))
     notifications = result.scalars().all()
     return notifications
@@ -34,6 +67,11 @@ async def update_notification(notification_id: int, is_read: bool, db: AsyncSess
     notification = await db.get(Notification, notification_id)
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
+    if bool(notification.is_read) != is_read:
+        if is_read:
+            await remove_unread(db, notification.user_id)
+        else:
+            await add_unread(db, {notification.user_id: 1})
     notification.is_read = is_read
     await db.commit()
     await db.refresh(notification)
@@ -44,6 +82,8 @@ async def delete_notification(notification_id: int, db: AsyncSession = Depends(g
     notification = await db.get(Notification, notification_id)
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
+    if not notification.is_read:
+        await remove_unread(db, notification.user_id)
     await db.delete(notification)
     await db.commit()
     return
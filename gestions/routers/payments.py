@@ -2,10 +2,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from models import Payment, User, Ad
-from schemas import PaymentCreate, PaymentRead
+from datetime import date
+from models import Payment, PaymentStatus, User, UserRole, Ad
+from schemas import PaymentCreate, PaymentRead, PaymentRollupRead, Page
 from database import get_db
-from typing import List, Optional
+from pagination import resolve_cursor, fetch_page
+from serialization import row_columns, fetch_rows, json_response
+import rollups
+from typing import List, Literal, Optional, Union
 
 router = APIRouter()
 
@@ -23,10 +27,47 @@ async def create_payment(payment: PaymentCreate, db: AsyncSession = Depends(get_
 
     db_payment = Payment(**payment.dict())
     db.add(db_payment)
+    await db.flush()
+    await rollups.record_created(db, db_payment)
     await db.commit()
     await db.refresh(db_payment)
     return db_payment
 
+def _require_admin(current_user: User):
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+@router.get("/reports/daily", response_model=List[PaymentRollupRead])
+async def daily_report(
+    start: date,
+    end: date,
+    period: Literal["day", "month", "year"] = "day",
+    currency: Optional[str] = None,
+    payment_status: Optional[PaymentStatus] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends()
+):
+    # Lu dans payment_daily_rollups (une ligne par jour, devise et statut), bornes incluses
+    _require_admin(current_user)
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must be on or after start")
+    query = rollups.report_query(db, start, end, period, currency, payment_status)
+    return json_response(List[PaymentRollupRead], await fetch_rows(db, query))
+
+@router.post("/reports/rebuild")
+async def rebuild_report(db: AsyncSession = Depends(get_db), current_user: User = Depends()):
+    _require_admin(current_user)
+    rows = await rollups.rebuild(db)
+    await db.commit()
+    return {"rows": rows}
+
+@router.get("/reports/verify")
+async def verify_report(db: AsyncSession = Depends(get_db), current_user: User = Depends()):
+    # Compare les agrégats à un recalcul complet depuis payments
+    _require_admin(current_user)
+    differences = await rollups.verify(db)
+    return {"ok": not differences, "differences": differences}
+
 @router.get("/{payment_id}", response_model=PaymentRead)
 async def read_payment(payment_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends()):
     payment = await db.get(Payment, payment_id)
@@ -36,31 +77,41 @@ async def read_payment(payment_id: int, db: AsyncSession = Depends(get_db), curr
         raise HTTPException(status_code=403, detail="Not authorized to view this payment")
     return payment
 
-@router.get("/", response_model=List[PaymentRead])
+@router.get("/", response_model=Union[List[PaymentRead], Page[PaymentRead]])
 async def list_payments(
     skip: int = 0,
     limit: int = Query(100, le=1000),
     payment_status: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="Pagination par curseur (vide pour la première page)"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends()
 ):
-    query = select(Payment).where(Payment.user_id == current_user.id)
-    if payment_status:
-        query = query.where(Payment.payment_status == payment_status)
+    filters = {"payment_status": payment_status}
+    if cursor is not None:
+        position, filters = resolve_cursor(cursor, filters)
+    query = select(*row_columns(Payment, PaymentRead)).where(Payment.user_id == current_user.id)
+    if filters["payment_status"]:
+        query = query.where(Payment.payment_status == filters["payment_status"])
+    if cursor is not None:
+        return json_response(Page[PaymentRead], await fetch_page(db, query, [Payment.created_at, Payment.id], position, limit, filters, rows=True))
     query = query.offset(skip).limit(limit)
-    result = await db.execute(query)
-    payments = result.scalars().all()
-    return payments
+    return json_response(List[PaymentRead], await fetch_rows(db, query))
 
 @router.patch("/{payment_id}", response_model=PaymentRead)
 async def update_payment_status(payment_id: int, payment_status: str, db: AsyncSession = Depends(get_db), current_user: User = Depends()):
-    payment = await db.get(Payment, payment_id)
+    payment = await db.get(Payment, payment_id, with_for_update=True)
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     if payment.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this payment")
+    try:
+        new_status = PaymentStatus(payment_status)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid payment status")
 
-    payment.payment_status = payment_status
+    old_status = payment.payment_status
+    payment.payment_status = new_status
+    await rollups.record_status_change(db, payment, old_status)
     await db.commit()
     await db.refresh(payment)
     return payment
@@ -72,6 +123,7 @@ async def delete_payment(payment_id: int, db: AsyncSession = Depends(get_db), cu
         raise HTTPException(status_code=404, detail="Payment not found")
     if payment.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this payment")
+    await rollups.record_deleted(db, payment)
     await db.delete(payment)
     await db.commit()
     return
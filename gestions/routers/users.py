@@ -1,26 +1,33 @@
 # users.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from passlib.context import CryptContext
-from models import User
-from schemas import UserCreate, UserRead, UserUpdate
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from models import User, Favorite
+from schemas import UserCreate, UserRead, UserUpdate, UserLogin, Page
 from database import get_db
+from pagination import resolve_cursor, fetch_page
+from security import hash_password, verify_password
+from cache import entity_cache
+from counters import ad_counters
+from favorite_cache import favorite_sets
+import rollups
+from typing import Optional, Union
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
 
 @router.post("/", response_model=UserRead, status_code=status.HTTP_201_CREATED)
 async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    # Hachage avant toute requête : la session n'a pas encore de connexion
+    # et n'en bloque donc aucune pendant le calcul bcrypt
+    hashed_password = await hash_password(user.password)
+
     # Vérifier si email ou username existe déjà
-    existing_user = await db.execute(select(User).where((User.email == user.email) | (User.username == user.username)))
-    if existing_user.scalars().first():
+    existing_user = await db.execute(select(User.id).where((User.email == user.email) | (User.username == user.username)))
+    if existing_user.first():
         raise HTTPException(status_code=400, detail="Email or username already registered")
 
-    hashed_password = hash_password(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -35,19 +42,58 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
         company_website=user.company_website
     )
     db.add(db_user)
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Inscription concurrente avec le même email ou username
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Email or username already registered")
     await db.refresh(db_user)
     return db_user
 
+@router.post("/login", response_model=UserRead)
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(User.id, User.password_hash).where(User.email == credentials.email))
+    account = result.first()
+    # Fin de transaction : la connexion retourne au pool pendant le calcul bcrypt
+    await db.commit()
+    valid, new_hash = await verify_password(credentials.password, account.password_hash if account else None)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    values = {"last_login": func.now()}
+    if new_hash:
+        # Coût bcrypt modifié : on re-hache au passage
+        values["password_hash"] = new_hash
+    result = await db.execute(
+        update(User).where(User.id == account.id).values(**values).returning(User),
+        execution_options={"synchronize_session": False},
+    )
+    user = result.scalars().one()
+    await db.commit()
+    await entity_cache.invalidate("user", user.id)
+    return user
+
 @router.get("/{user_id}", response_model=UserRead)
 async def read_user(user_id: int, db: AsyncSession = Depends(get_db)):
-    user = await db.get(User, user_id)
+    async def load():
+        user = await db.get(User, user_id)
+        return UserRead.model_validate(user).model_dump(mode="json") if user else None
+
+    user = await entity_cache.get_or_load("user", user_id, load)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
-@router.get("/", response_model=list[UserRead])
-async def list_users(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+@router.get("/", response_model=Union[list[UserRead], Page[UserRead]])
+async def list_users(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Pagination par curseur (vide pour la première page)"),
+    db: AsyncSession = Depends(get_db),
+):
+    if cursor is not None:
+        position, filters = resolve_cursor(cursor, {})
+        return await fetch_page(db, select(User), [User.created_at, User.id], position, limit, filters)
     result = await db.execute(select(User).offset(skip).limit(limit))
     users = result.scalars().all()
     return users
@@ -63,6 +109,7 @@ async def update_user(user_id: int, user_update: UserUpdate, db: AsyncSession =
         setattr(user, key, value)
 
     await db.commit()
+    await entity_cache.invalidate("user", user_id)
     await db.refresh(user)
     return user
 
@@ -72,6 +119,13 @@ async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    # Ses paiements et favoris sont supprimés en cascade : on les retire des agrégats
+    await rollups.remove_user_payments(db, user_id)
+    favorited = (await db.execute(select(Favorite.ad_id).where(Favorite.user_id == user_id))).scalars().all()
     await db.delete(user)
     await db.commit()
+    await entity_cache.invalidate("user", user_id)
+    for ad_id in favorited:
+        ad_counters.record(ad_id, "favorites", -1)
+    await favorite_sets.forget(user_id)
     return
@@ -0,0 +1,19 @@
+# webhooks.py
+from fastapi import APIRouter, Depends, HTTPException, Request, Header
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db
+from stripe_events import stripe_events, verify_event
+from typing import Optional
+
+router = APIRouter()
+
+@router.post("/stripe")
+async def stripe_webhook(request: Request, stripe_signature: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    # Accusé de réception immédiat ; le traitement est fait par stripe_events
+    try:
+        event = verify_event(await request.body(), stripe_signature)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if await stripe_events.record(db, event):
+        stripe_events.submit(event)
+    return {"received": True}
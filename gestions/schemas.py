@@ -1,7 +1,7 @@
 # schemas.py
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
-from typing import Optional, List
+from typing import Optional, List, Generic, TypeVar
 from pydantic import BaseModel, EmailStr, constr, condecimal, ConfigDict
 
 # ENUMS
@@ -37,6 +37,30 @@ class NotificationType(str, Enum):
     auction_won = "auction_won"
     payment_completed = "payment_completed"
 
+class AdMediaType(str, Enum):
+    image = "image"
+    video = "video"
+    html = "html"
+
+class AdPosition(str, Enum):
+    header = "header"
+    sidebar = "sidebar"
+    footer = "footer"
+    inline = "inline"
+    popup = "popup"
+
+class AdStatusType(str, Enum):
+    draft = "draft"
+    active = "active"
+    paused = "paused"
+    ended = "ended"
+
+class TargetingType(str, Enum):
+    location = "location"
+    category = "category"
+    keyword = "keyword"
+    device = "device"
+
 # USER
 class UserBase(BaseModel):
     username: str
@@ -53,6 +77,10 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     password: str  # en clair à recevoir (hashé en backend)
 
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
+
 class UserUpdate(BaseModel):
     username: Optional[str]
     phone: Optional[str]
@@ -128,6 +156,19 @@ class AdRead(AdBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class AdNearbyRead(AdRead):
+    distance_km: float
+
+class AdImportError(BaseModel):
+    line: int
+    errors: List[str]
+
+class AdImportReport(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[AdImportError]
+    errors_truncated: bool = False
+
 
 # AUCTION
 class AuctionBase(BaseModel):
@@ -195,6 +236,15 @@ class PaymentRead(PaymentBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class PaymentRollupRead(BaseModel):
+    day: date
+    currency: str
+    payment_status: PaymentStatus
+    payment_count: int
+    amount: condecimal(max_digits=16, decimal_places=2)
+
+    model_config = ConfigDict(from_attributes=True)
+
 
 # NOTIFICATION
 class NotificationBase(BaseModel):
@@ -213,3 +263,137 @@ class NotificationRead(NotificationBase):
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+
+# ADVERTISEMENT (campagnes bannières)
+class AdvertisementTargetingBase(BaseModel):
+    type: TargetingType
+    value: constr(min_length=1, max_length=255)
+
+class AdvertisementTargetingRead(AdvertisementTargetingBase):
+    id: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+class AdvertisementBase(BaseModel):
+    category_id: Optional[int] = None
+    title: constr(max_length=150)
+    description: Optional[str] = None
+    media_url: constr(max_length=255)
+    media_type: AdMediaType = AdMediaType.image
+    target_url: Optional[str] = None
+    position: AdPosition = AdPosition.sidebar
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    budget: condecimal(max_digits=12, decimal_places=2) = 0.00
+    status: AdStatusType = AdStatusType.draft
+
+class AdvertisementCreate(AdvertisementBase):
+    targetings: List[AdvertisementTargetingBase] = []
+
+class AdvertisementUpdate(BaseModel):
+    category_id: Optional[int] = None
+    title: Optional[constr(max_length=150)] = None
+    description: Optional[str] = None
+    media_url: Optional[constr(max_length=255)] = None
+    media_type: Optional[AdMediaType] = None
+    target_url: Optional[str] = None
+    position: Optional[AdPosition] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    budget: Optional[condecimal(max_digits=12, decimal_places=2)] = None
+    status: Optional[AdStatusType] = None
+    # Remplace tout le ciblage si fourni
+    targetings: Optional[List[AdvertisementTargetingBase]] = None
+
+class AdvertisementRead(AdvertisementBase):
+    id: int
+    advertiser_id: Optional[int]
+    created_at: datetime
+    targetings: List[AdvertisementTargetingRead] = []
+
+    model_config = ConfigDict(from_attributes=True)
+
+class AdvertisementServed(BaseModel):
+    # Charge utile minimale renvoyée à l'affichage
+    id: int
+    title: str
+    media_url: str
+    media_type: AdMediaType
+    target_url: Optional[str] = None
+    position: AdPosition
+
+
+# FAVORITE
+class FavoriteRead(BaseModel):
+    id: int
+    ad_id: int
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# MESSAGE
+class MessageCreate(BaseModel):
+    receiver_id: int
+    ad_id: Optional[int] = None
+    content: constr(min_length=1)
+
+class MessageRead(BaseModel):
+    id: int
+    ad_id: Optional[int]
+    sender_id: int
+    receiver_id: int
+    content: str
+    created_at: datetime
+    read_at: Optional[datetime]
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ConversationRead(BaseModel):
+    id: int
+    counterpart_id: int
+    ad_id: Optional[int]
+    unread_count: int
+    last_message_at: datetime
+    last_message: MessageRead
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# RELATIONS (?include=…) : champs absents de la réponse s'ils ne sont pas demandés
+class AdImageRead(BaseModel):
+    id: int
+    image_url: str
+    position: Optional[int] = 0
+    uploaded_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class SellerRead(BaseModel):
+    # Profil public du vendeur (sans email ni téléphone)
+    id: int
+    username: str
+    account_type: AccountType
+    company_name: Optional[str] = None
+    company_logo: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class AdDetailRead(AdRead):
+    images: Optional[List[AdImageRead]] = None
+    category: Optional[CategoryRead] = None
+    seller: Optional[SellerRead] = None
+    auctions: Optional[List[AuctionRead]] = None
+
+class AuctionDetailRead(AuctionRead):
+    ad: Optional[AdRead] = None
+    bids: Optional[List[BidRead]] = None
+
+
+# PAGINATION
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,181 @@
+# search.py
+import asyncio
+import math
+import os
+import re
+import unicodedata
+
+from sqlalchemy import select, literal_column, func, case, tuple_
+
+from models import Ad
+from pagination import encode_cursor
+
+FEATURED_BOOST = float(os.getenv("SEARCH_FEATURED_BOOST", "2.0"))
+
+# Même texte que l'index GIN idx_ads_search (voir migrations/007_full_text_search.sql) : le planificateur
+# ne l'utilise que si l'expression est identique, constantes comprises.
+SEARCH_CONFIG = "french_unaccent"
+SEARCH_VECTOR = literal_column(
+    f"to_tsvector('{SEARCH_CONFIG}', coalesce(ads.title, '') || ' ' || coalesce(ads.description, ''))"
+)
+
+
+# Repli en Python pour les bases sans recherche plein texte (SQLite, tests) :
+# index inversé en mémoire, normalisation proche de la configuration
+# Postgres (minuscules, sans accents, racinisation légère).
+
+STOPWORDS = frozenset(
+    "a au aux avec ce ces dans de des du elle en et eux il je la le les leur lui ma mais me meme mes moi mon "
+    "ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre vous".split()
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def stem(word: str) -> str:
+    # Racinisation minimale du français (d'après Savoy) : pluriels, puis
+    # finales -er/-e et consonne doublée sur les mots assez longs
+    if len(word) > 3 and word.endswith("x"):
+        aux = word.endswith("aux") and not word.endswith("eaux") and len(word) > 4
+        word = word[:-3] + "al" if aux else word[:-1]
+    elif len(word) > 3 and word.endswith("s"):
+        word = word[:-1]
+    if len(word) < 5:
+        return word
+    if word.endswith("r"):
+        word = word[:-1]
+    if word.endswith("e"):
+        word = word[:-1]
+    if word[-1] == word[-2]:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list:
+    if not text:
+        return []
+    return [stem(token) for token in _TOKEN_RE.findall(fold(text)) if token not in STOPWORDS]
+
+
+class InvertedIndex:
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings = {}   # terme -> {ad_id: fréquence}
+        self.docs = {}       # ad_id -> (longueur, is_featured, status, category_id, termes)
+        self.total_length = 0
+        self.loaded = False
+        self._ready = False
+        self._lock = asyncio.Lock()
+
+    def upsert(self, ad):
+        if not self.loaded:
+            return
+        self.remove(ad.id)
+        terms = tokenize(ad.title) + tokenize(ad.description)
+        for term in terms:
+            postings = self.postings.setdefault(term, {})
+            postings[ad.id] = postings.get(ad.id, 0) + 1
+        status = ad.status.value if hasattr(ad.status, "value") else ad.status
+        self.docs[ad.id] = (len(terms), bool(ad.is_featured), status, ad.category_id, frozenset(terms))
+        self.total_length += len(terms)
+
+    def set_status(self, ad_id: int, status):
+        # Changement de statut seul (expiration en masse) : termes inchangés
+        doc = self.docs.get(ad_id)
+        if doc is not None:
+            self.docs[ad_id] = doc[:2] + (status.value if hasattr(status, "value") else status,) + doc[3:]
+
+    def remove(self, ad_id: int):
+        doc = self.docs.pop(ad_id, None)
+        if doc is None:
+            return
+        self.total_length -= doc[0]
+        for term in doc[4]:
+            postings = self.postings[term]
+            del postings[ad_id]
+            if not postings:
+                del self.postings[term]
+
+    async def ensure_loaded(self, db):
+        if self._ready:
+            return
+        async with self._lock:
+            if self._ready:
+                return
+            # Les modifications faites pendant le chargement sont appliquées aussi
+            self.loaded = True
+            result = await db.stream(select(Ad.id, Ad.title, Ad.description, Ad.is_featured, Ad.status, Ad.category_id))
+            async for row in result:
+                self.upsert(row)
+            self._ready = True
+
+    def search(self, query: str, status=None, category_ids=None) -> list:
+        terms = set(tokenize(query))
+        if not terms or not self.docs:
+            return []
+        postings = sorted((self.postings.get(term, {}) for term in terms), key=len)
+        # Tous les termes doivent être présents (comme websearch_to_tsquery)
+        candidates = set(postings[0])
+        for other in postings[1:]:
+            candidates &= other.keys()
+        average_length = self.total_length / len(self.docs) or 1
+        ranked = []
+        for ad_id in candidates:
+            length, featured, ad_status, category_id, _ = self.docs[ad_id]
+            if status and ad_status != status:
+                continue
+            if category_ids is not None and category_id not in category_ids:
+                continue
+            score = 0.0
+            for term_postings in postings:
+                frequency = term_postings[ad_id]
+                idf = math.log(1 + (len(self.docs) - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+                score += idf * frequency * (self.K1 + 1) / (frequency + self.K1 * (1 - self.B + self.B * length / average_length))
+            if featured:
+                score *= FEATURED_BOOST
+            ranked.append((score, ad_id))
+        ranked.sort(reverse=True)
+        return ranked
+
+
+search_index = InvertedIndex()
+
+
+def _page(items, scores, limit, filters):
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor([scores[limit - 1], items[-1].id], filters)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def search_ads(db, q: str, filters: dict, category_ids, position, limit: int) -> dict:
+    if db.bind.dialect.name == "postgresql":
+        tsquery = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'"), q)
+        score = (func.ts_rank_cd(SEARCH_VECTOR, tsquery) * case((Ad.is_featured, FEATURED_BOOST), else_=1.0)).label("score")
+        query = select(Ad, score).where(SEARCH_VECTOR.op("@@")(tsquery))
+        if filters["status"]:
+            query = query.where(Ad.status == filters["status"])
+        if category_ids is not None:
+            query = query.where(Ad.category_id.in_(category_ids))
+        if position is not None:
+            query = query.where(tuple_(score, Ad.id) < tuple_(*position))
+        query = query.order_by(score.desc(), Ad.id.desc()).limit(limit + 1)
+        rows = (await db.execute(query)).all()
+        return _page([row[0] for row in rows], [row[1] for row in rows], limit, filters)
+
+    await search_index.ensure_loaded(db)
+    ranked = search_index.search(q, filters["status"], category_ids)
+    if position is not None:
+        ranked = [entry for entry in ranked if entry < tuple(position)]
+    ranked = ranked[:limit + 1]
+    result = await db.execute(select(Ad).where(Ad.id.in_([ad_id for _, ad_id in ranked])))
+    ads = {ad.id: ad for ad in result.scalars()}
+    ranked = [(score, ad_id) for score, ad_id in ranked if ad_id in ads]
+    return _page([ads[ad_id] for _, ad_id in ranked], [score for score, _ in ranked], limit, filters)
@@ -0,0 +1,44 @@
+# security.py
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt relâche le GIL pendant le calcul : un pool de threads borné suffit
+# pour sortir le hachage de la boucle d'événements. La taille du pool limite
+# le nombre de hachages simultanés (et donc les cœurs consommés).
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, pwd_context.hash, password)
+
+
+_dummy_hash = None
+
+
+def _verify(password: str, password_hash):
+    global _dummy_hash
+    if password_hash is None:
+        # Compte inconnu : même calcul bcrypt qu'un vrai compte, pour que le
+        # temps de réponse ne révèle pas si l'adresse est inscrite.
+        if _dummy_hash is None:
+            _dummy_hash = pwd_context.hash("compte-inexistant")
+        pwd_context.verify(password, _dummy_hash)
+        return False, None
+    return pwd_context.verify_and_update(password, password_hash)
+
+
+async def verify_password(password: str, password_hash) -> tuple:
+    # Renvoie (valide, nouveau_hash) ; nouveau_hash est fourni quand le hash
+    # stocké utilise un coût différent de BCRYPT_ROUNDS. password_hash=None :
+    # compte inconnu, toujours refusé après un calcul de même durée.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _verify, password, password_hash)
@@ -0,0 +1,32 @@
+# serialization.py
+from functools import lru_cache
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+# Chemin rapide pour les grosses listes : on lit des colonnes (pas d'objets
+# ORM ni d'identity map), on valide des dicts et pydantic-core encode le JSON
+# directement, comme le fait FastAPI avec response_model : même sortie octet
+# pour octet.
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_type):
+    return TypeAdapter(response_type)
+
+
+def row_columns(model, schema) -> list:
+    # Colonnes de la table lues par le schéma, dans l'ordre de ses champs
+    table = model.__table__
+    return [table.c[name] for name in schema.model_fields if name in table.c]
+
+
+async def fetch_rows(db, query) -> list:
+    result = await db.execute(query)
+    return [dict(row) for row in result.mappings()]
+
+
+def json_response(response_type, content, exclude_unset: bool = False) -> Response:
+    adapter = _adapter(response_type)
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True), exclude_unset=exclude_unset)
+    return Response(body, media_type="application/json")
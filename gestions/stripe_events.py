@@ -0,0 +1,391 @@
+# stripe_events.py
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update, or_, func
+
+from cache import entity_cache
+from database import AsyncSessionLocal, upsert_insert
+from models import Payment, PaymentStatus, StripeSubscription, StripeWebhookLog, SubscriptionStatus
+import rollups
+
+logger = logging.getLogger(__name__)
+
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+STRIPE_WEBHOOK_TOLERANCE = int(os.getenv("STRIPE_WEBHOOK_TOLERANCE", "300"))
+STRIPE_WORKERS = int(os.getenv("STRIPE_WORKERS", "4"))
+STRIPE_QUEUE_SIZE = int(os.getenv("STRIPE_QUEUE_SIZE", "10000"))
+STRIPE_SWEEP_SECONDS = float(os.getenv("STRIPE_SWEEP_SECONDS", "60"))
+STRIPE_MAX_ATTEMPTS = int(os.getenv("STRIPE_MAX_ATTEMPTS", "5"))
+
+
+def sign_payload(payload: bytes, secret: str, timestamp: int = None) -> str:
+    # En-tête Stripe-Signature pour `payload` (vérification, générateur d'événements locaux)
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_event(payload: bytes, header: str, secret: str = None, tolerance: int = None) -> dict:
+    # Même contrôle que stripe.Webhook.construct_event, sans dépendre du SDK.
+    # Réglages lus à l'appel (et non à l'import) quand ils ne sont pas passés.
+    secret = STRIPE_WEBHOOK_SECRET if secret is None else secret
+    tolerance = STRIPE_WEBHOOK_TOLERANCE if tolerance is None else tolerance
+    if not secret:
+        raise ValueError("Stripe webhook secret not configured")
+    if not header:
+        raise ValueError("Missing Stripe-Signature header")
+    timestamp, signatures = None, []
+    for item in header.split(","):
+        key, _, value = item.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+    if not timestamp or not timestamp.isdigit() or not signatures:
+        raise ValueError("Invalid Stripe-Signature header")
+    if tolerance and abs(time.time() - int(timestamp)) > tolerance:
+        raise ValueError("Stripe signature timestamp outside tolerance")
+    expected = hmac.new(secret.encode(), timestamp.encode() + b"." + payload, hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise ValueError("Invalid Stripe signature")
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        raise ValueError("Invalid JSON payload")
+    if not isinstance(event, dict) or not event.get("id") or not event.get("type"):
+        raise ValueError("Invalid Stripe event")
+    return event
+
+
+def _object(event: dict) -> dict:
+    return (event.get("data") or {}).get("object") or {}
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value, timezone.utc) if value else None
+
+
+# Traitements par type d'événement. Chacun est idempotent : rejouer un
+# événement (relivraison Stripe, outil de rejeu) laisse la base inchangée.
+# Un traitement peut renvoyer les entrées de cache (type, id) devenues
+# périmées ; elles sont invalidées après la validation de la transaction.
+
+async def _set_payment_status(db, intent_id: str, payment_status: PaymentStatus, from_statuses: tuple, **values):
+    if not intent_id:
+        return
+    # Lignes verrouillées puis mises à jour : l'ancien statut sert aux agrégats
+    payments = (await db.execute(
+        select(Payment.id, Payment.created_at, Payment.currency, Payment.amount, Payment.payment_status)
+        .where(
+            or_(Payment.payment_intent_id == intent_id, Payment.stripe_payment_id == intent_id),
+            Payment.payment_status.in_(from_statuses),
+        )
+        .with_for_update()
+    )).all()
+    if not payments:
+        return
+    await db.execute(
+        update(Payment)
+        .where(Payment.id.in_([payment.id for payment in payments]))
+        .values(payment_status=payment_status, **values)
+        .execution_options(synchronize_session=False)
+    )
+    deltas = {}
+    for payment in payments:
+        rollups.move(deltas, payment, payment.payment_status, payment_status)
+    await rollups.apply(db, deltas)
+
+
+async def _payment_intent_succeeded(db, intent: dict):
+    # Un paiement remboursé ne redevient pas « completed » sur un événement en retard
+    await _set_payment_status(db, intent.get("id"), PaymentStatus.completed, (PaymentStatus.pending, PaymentStatus.failed))
+
+
+async def _payment_intent_failed(db, intent: dict):
+    await _set_payment_status(db, intent.get("id"), PaymentStatus.failed, (PaymentStatus.pending,))
+
+
+async def _charge_refunded(db, charge: dict):
+    refunds = (charge.get("refunds") or {}).get("data") or []
+    values = {"refund_id": refunds[0]["id"]} if refunds else {}
+    intent_id = charge.get("payment_intent") or charge.get("id")
+    if charge.get("refunded"):
+        await _set_payment_status(
+            db, intent_id, PaymentStatus.refunded,
+            (PaymentStatus.pending, PaymentStatus.completed, PaymentStatus.failed, PaymentStatus.refunded), **values
+        )
+    elif values:
+        # Remboursement partiel : le paiement reste « completed »
+        await db.execute(
+            update(Payment)
+            .where(or_(Payment.payment_intent_id == intent_id, Payment.stripe_payment_id == intent_id))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+
+_SUBSCRIPTION_STATUSES = {
+    "active": SubscriptionStatus.active,
+    "trialing": SubscriptionStatus.active,
+    "past_due": SubscriptionStatus.active,
+    "canceled": SubscriptionStatus.cancelled,
+}
+
+
+async def _subscription_owner(db, subscription: dict):
+    user_id = (subscription.get("metadata") or {}).get("user_id")
+    if user_id and str(user_id).isdigit():
+        return int(user_id)
+    customer = subscription.get("customer")
+    if not customer:
+        return None
+    for column, owner in ((StripeSubscription.stripe_customer_id, StripeSubscription.user_id), (Payment.stripe_customer_id, Payment.user_id)):
+        user_id = (await db.execute(select(owner).where(column == customer).limit(1))).scalar()
+        if user_id is not None:
+            return user_id
+    return None
+
+
+async def _subscription_changed(db, subscription: dict, deleted: bool = False):
+    item = ((subscription.get("items") or {}).get("data") or [{}])[0]
+    price = item.get("price") or {}
+    values = {
+        "stripe_customer_id": subscription.get("customer"),
+        "stripe_price_id": price.get("id"),
+        "plan_name": price.get("nickname") or price.get("lookup_key"),
+        "status": SubscriptionStatus.cancelled if deleted else _SUBSCRIPTION_STATUSES.get(subscription.get("status"), SubscriptionStatus.expired),
+        # Champs déplacés sur les éléments d'abonnement dans les versions récentes de l'API
+        "current_period_start": _timestamp(subscription.get("current_period_start") or item.get("current_period_start")),
+        "current_period_end": _timestamp(subscription.get("current_period_end") or item.get("current_period_end")),
+        "cancel_at_period_end": bool(subscription.get("cancel_at_period_end")),
+    }
+    # Les champs absents de l'événement ne remplacent pas les valeurs connues
+    values = {key: value for key, value in values.items() if value is not None}
+    user_id = await _subscription_owner(db, subscription)
+    if user_id is None:
+        result = await db.execute(
+            update(StripeSubscription)
+            .where(StripeSubscription.stripe_subscription_id == subscription["id"])
+            .values(**values)
+            .returning(StripeSubscription.user_id)
+        )
+        user_id = result.scalar()
+        if user_id is None:
+            logger.warning("Abonnement Stripe %s sans utilisateur connu, ignoré", subscription["id"])
+            return ()
+    else:
+        upsert = upsert_insert(db, StripeSubscription)
+        await db.execute(
+            upsert.values(stripe_subscription_id=subscription["id"], user_id=user_id, **values)
+            .on_conflict_do_update(index_elements=[StripeSubscription.stripe_subscription_id], set_=values)
+        )
+    # Plafonds d'annonces mis en cache par quotas.limits
+    return [("quota", user_id)]
+
+
+async def _subscription_deleted(db, subscription: dict):
+    return await _subscription_changed(db, subscription, deleted=True)
+
+
+HANDLERS = {
+    "payment_intent.succeeded": _payment_intent_succeeded,
+    "payment_intent.payment_failed": _payment_intent_failed,
+    "charge.refunded": _charge_refunded,
+    "customer.subscription.created": _subscription_changed,
+    "customer.subscription.updated": _subscription_changed,
+    "customer.subscription.deleted": _subscription_deleted,
+}
+
+
+class StripeEventProcessor:
+    """Traitement différé des webhooks Stripe (un pool de tâches par worker).
+
+    Le webhook enregistre l'événement (dédoublonné sur event_id) puis
+    répond tout de suite ; les tâches le traitent ensuite. Chaque objet
+    Stripe est toujours confié à la même file, donc ses événements sont
+    appliqués dans l'ordre de réception. Un événement n'est marqué traité
+    qu'avec les écritures qu'il a produites ; les événements restés en
+    attente (file pleine, erreur, redémarrage) sont repris par un balayage
+    périodique, au plus STRIPE_MAX_ATTEMPTS fois.
+    """
+
+    def __init__(self, session_factory, workers: int = STRIPE_WORKERS, queue_size: int = STRIPE_QUEUE_SIZE,
+                 sweep_seconds: float = STRIPE_SWEEP_SECONDS, max_attempts: int = STRIPE_MAX_ATTEMPTS):
+        self.session_factory = session_factory
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.sweep_seconds = sweep_seconds
+        self.max_attempts = max_attempts
+        self.counters = {"received": 0, "duplicates": 0, "processed": 0, "skipped": 0, "failed": 0, "overflow": 0}
+        self._queues = []
+        self._queued = set()  # event_id en file, pour ne pas les remettre au balayage
+        self._tasks = []
+
+    async def record(self, db, event: dict) -> bool:
+        # INSERT … ON CONFLICT DO NOTHING : False si l'événement est déjà connu
+        result = await db.execute(
+            upsert_insert(db, StripeWebhookLog)
+            .values(event_id=event["id"], event_type=event["type"], payload=event)
+            .on_conflict_do_nothing(index_elements=[StripeWebhookLog.event_id])
+            .returning(StripeWebhookLog.id)
+        )
+        created = result.first() is not None
+        await db.commit()
+        self.counters["received" if created else "duplicates"] += 1
+        return created
+
+    def submit(self, event: dict) -> bool:
+        if not self._queues or event["id"] in self._queued:
+            return False
+        queue = self._queues[hash(_object(event).get("id") or event["id"]) % len(self._queues)]
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Reste en attente en base : repris par le prochain balayage
+            self.counters["overflow"] += 1
+            return False
+        self._queued.add(event["id"])
+        return True
+
+    async def process(self, event: dict, force: bool = False) -> bool:
+        # Réservation et traitement dans la même transaction : l'UPDATE
+        # verrouille la ligne, un second traitement concurrent attend puis
+        # trouve l'événement déjà traité.
+        claim = (
+            update(StripeWebhookLog)
+            .where(StripeWebhookLog.event_id == event["id"])
+            .values(processed_at=func.now(), attempts=StripeWebhookLog.attempts + 1, last_error=None)
+            .returning(StripeWebhookLog.id)
+        )
+        if not force:
+            claim = claim.where(StripeWebhookLog.processed_at.is_(None))
+        stale = ()
+        try:
+            async with self.session_factory() as db:
+                async with db.begin():
+                    if (await db.execute(claim)).first() is None:
+                        self.counters["skipped"] += 1
+                        return False
+                    handler = HANDLERS.get(event["type"])
+                    if handler is not None:
+                        stale = await handler(db, _object(event)) or ()
+        except Exception as exc:
+            self.counters["failed"] += 1
+            logger.exception("Échec du traitement de l'événement Stripe %s (%s)", event["id"], event["type"])
+            await self._record_failure(event["id"], exc)
+            return False
+        for kind, entity_id in stale:
+            await entity_cache.invalidate(kind, entity_id)
+        self.counters["processed"] += 1
+        return True
+
+    async def _record_failure(self, event_id: str, exc: Exception):
+        try:
+            async with self.session_factory() as db:
+                async with db.begin():
+                    await db.execute(
+                        update(StripeWebhookLog)
+                        .where(StripeWebhookLog.event_id == event_id)
+                        .values(attempts=StripeWebhookLog.attempts + 1, last_error=repr(exc)[:2000])
+                    )
+        except Exception:
+            logger.exception("Impossible d'enregistrer l'échec de l'événement Stripe %s", event_id)
+
+    async def pending(self, limit: int = 1000, min_age: float = 0, max_attempts: int = None) -> list:
+        # Événements non traités, du plus ancien au plus récent
+        query = select(StripeWebhookLog.payload).where(StripeWebhookLog.processed_at.is_(None))
+        if min_age:
+            query = query.where(StripeWebhookLog.received_at <= datetime.now(timezone.utc) - timedelta(seconds=min_age))
+        if max_attempts:
+            query = query.where(StripeWebhookLog.attempts < max_attempts)
+        async with self.session_factory() as db:
+            result = await db.execute(query.order_by(StripeWebhookLog.received_at, StripeWebhookLog.id).limit(limit))
+            return [payload for payload in result.scalars() if payload]
+
+    async def sweep(self, min_age: float = 0) -> int:
+        # min_age : laisse aux autres workers le temps de traiter leurs propres événements
+        submitted = 0
+        for event in await self.pending(self.queue_size, min_age, self.max_attempts):
+            submitted += self.submit(event)
+        return submitted
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            event = await queue.get()
+            try:
+                await self.process(event)
+            finally:
+                self._queued.discard(event["id"])
+                queue.task_done()
+
+    async def _sweep_forever(self):
+        # Premier passage au démarrage : reprend tout ce qui était resté en attente
+        min_age = 0
+        while True:
+            try:
+                await self.sweep(min_age)
+            except Exception:
+                logger.exception("Échec du balayage des événements Stripe en attente")
+            min_age = self.sweep_seconds
+            await asyncio.sleep(self.sweep_seconds)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queues = [asyncio.Queue(max(1, self.queue_size // self.workers)) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._work(queue)) for queue in self._queues]
+        self._tasks.append(asyncio.create_task(self._sweep_forever()))
+
+    async def stop(self, timeout: float = 10):
+        if not self._tasks:
+            return
+        # Les événements encore en file restent en base et seront repris au redémarrage
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Arrêt avec %d événement(s) Stripe en file", len(self._queued))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks, self._queues = [], []
+        self._queued.clear()
+
+    def stats(self) -> dict:
+        return {**self.counters, "queued": sum(queue.qsize() for queue in self._queues), "workers": len(self._queues)}
+
+
+stripe_events = StripeEventProcessor(AsyncSessionLocal)
+
+
+async def replay(event_ids: list) -> int:
+    # Sans identifiant : tous les événements en attente, sans limite de tentatives.
+    # Avec identifiants : retraitement forcé, même s'ils sont déjà traités.
+    if event_ids:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(StripeWebhookLog.payload).where(StripeWebhookLog.event_id.in_(event_ids)))
+            events = [payload for payload in result.scalars() if payload]
+    else:
+        events = await stripe_events.pending(limit=None)
+    processed = 0
+    for event in events:
+        processed += await stripe_events.process(event, force=bool(event_ids))
+    return processed
+
+
+async def _main(args: list):
+    if not args or args[0] != "replay":
+        raise SystemExit("usage: python stripe_events.py replay [event_id ...]")
+    processed = await replay(args[1:])
+    print(f"{processed} événement(s) retraité(s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))
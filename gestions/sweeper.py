@@ -0,0 +1,169 @@
+# sweeper.py
+import asyncio
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select, update
+
+from database import AsyncSessionLocal
+from models import Ad, AdStatus, Advertisement, AdStatusType
+from cache import entity_cache
+from search import search_index
+from ad_serving import serving_index
+from feed import feed
+import quotas
+
+logger = logging.getLogger(__name__)
+
+SWEEPER_INTERVAL_SECONDS = float(os.getenv("SWEEPER_INTERVAL_SECONDS", "60"))
+SWEEPER_CHUNK_SIZE = int(os.getenv("SWEEPER_CHUNK_SIZE", "5000"))
+# Pause entre deux lots : laisse passer le trafic et le checkpoint du WAL
+SWEEPER_CHUNK_PAUSE_SECONDS = float(os.getenv("SWEEPER_CHUNK_PAUSE_SECONDS", "0.2"))
+
+
+class Sweeper:
+    """Applique les échéances : annonces expirées, campagnes terminées.
+
+    Les lignes dues sont trouvées par index partiel et changées par lots
+    d'au plus chunk_size, une transaction courte par lot (UPDATE … WHERE id
+    IN (SELECT … LIMIT … FOR UPDATE SKIP LOCKED) RETURNING), avec une pause
+    entre les lots. Plusieurs processus peuvent balayer en même temps.
+    """
+
+    def __init__(self, session_factory, chunk_size: int = SWEEPER_CHUNK_SIZE,
+                 pause_seconds: float = SWEEPER_CHUNK_PAUSE_SECONDS, interval_seconds: float = SWEEPER_INTERVAL_SECONDS):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.pause_seconds = pause_seconds
+        self.interval_seconds = interval_seconds
+        self.counters = {"passes": 0, "chunks": 0, "ads_expired": 0, "advertisements_ended": 0, "errors": 0}
+        self.last_pass_seconds = 0.0
+        self.last_pass_at = 0.0
+        self.running_pass = False
+        self._task = None
+
+    async def _expire_ads(self, db, now: datetime) -> list:
+        due = (Ad.status.in_(quotas.LIVE_STATUSES), Ad.expires_at <= now)
+        chunk = (
+            select(Ad.id).where(*due).order_by(Ad.expires_at)
+            .limit(self.chunk_size).with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            update(Ad)
+            .where(Ad.id.in_(chunk.scalar_subquery()), *due)
+            .values(status=AdStatus.expired)
+            .returning(Ad.id, Ad.user_id, Ad.is_featured)
+            .execution_options(synchronize_session=False)
+        )
+        rows = result.all()
+        # Les annonces expirées libèrent le quota de leur vendeur, dans la même transaction
+        usage = {}
+        for row in rows:
+            ads, featured = usage.get(row.user_id, (0, 0))
+            usage[row.user_id] = (ads + 1, featured + (1 if row.is_featured else 0))
+        for user_id, (ads, featured) in sorted(usage.items()):
+            await quotas.release(db, user_id, ads, featured)
+        return [row.id for row in rows]
+
+    async def _end_advertisements(self, db, now: datetime) -> list:
+        due = (Advertisement.status == AdStatusType.active, Advertisement.end_date <= now)
+        chunk = (
+            select(Advertisement.id).where(*due).order_by(Advertisement.end_date)
+            .limit(self.chunk_size).with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            update(Advertisement)
+            .where(Advertisement.id.in_(chunk.scalar_subquery()), *due)
+            .values(status=AdStatusType.ended)
+            .returning(Advertisement.id)
+            .execution_options(synchronize_session=False)
+        )
+        return list(result.scalars())
+
+    async def _after_ads(self, ad_ids: list):
+        await entity_cache.invalidate_many("ad", ad_ids)
+        for ad_id in ad_ids:
+            search_index.set_status(ad_id, AdStatus.expired)
+            feed.remove(ad_id)
+        self.counters["ads_expired"] += len(ad_ids)
+
+    async def _after_advertisements(self, advertisement_ids: list):
+        for advertisement_id in advertisement_ids:
+            serving_index.remove(advertisement_id)
+        self.counters["advertisements_ended"] += len(advertisement_ids)
+
+    async def _drain(self, step, after, now: datetime) -> int:
+        total = 0
+        while True:
+            async with self.session_factory() as db:
+                async with db.begin():
+                    ids = await step(db, now)
+            self.counters["chunks"] += 1
+            if ids:
+                await after(ids)
+            total += len(ids)
+            if len(ids) < self.chunk_size:
+                return total
+            await asyncio.sleep(self.pause_seconds)
+
+    async def sweep(self) -> dict:
+        # Un passage complet ; l'échéance est figée au début pour que le passage se termine
+        start = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        self.running_pass = True
+        try:
+            ads = await self._drain(self._expire_ads, self._after_ads, now)
+            advertisements = await self._drain(self._end_advertisements, self._after_advertisements, now)
+        finally:
+            self.running_pass = False
+            self.counters["passes"] += 1
+            self.last_pass_seconds = time.perf_counter() - start
+            self.last_pass_at = time.time()
+        return {"ads_expired": ads, "advertisements_ended": advertisements}
+
+    async def run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                # Les lots déjà validés restent acquis ; le reste au prochain passage
+                self.counters["errors"] += 1
+                logger.exception("Échec du balayage des échéances")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "running": self.running_pass,
+            "last_pass_seconds": round(self.last_pass_seconds, 6),
+            "last_pass_at": self.last_pass_at,
+        }
+
+
+sweeper = Sweeper(AsyncSessionLocal)
+
+
+async def _main(command: str):
+    if command != "once":
+        raise SystemExit("usage: python sweeper.py once")
+    print(await sweeper.sweep())
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else ""))
@@ -0,0 +1,104 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+# Base SQLite jetable, configurée avant le premier import de database.py
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="gestions-tests-"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_DB_PATH}"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+import bidding
+import database
+import main
+import metrics
+from ad_serving import serving_index
+from ad_tracking import ad_events
+from cache import InMemoryLRUBackend, entity_cache
+from category_tree import category_tree
+from counters import ad_counters
+from favorite_cache import favorite_sets
+from feed import feed
+from models import Base, User
+from search import search_index
+from stripe_events import stripe_events
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _reset_singletons():
+    # Caches et tampons par worker : repartent vides pour chaque test
+    entity_cache.__init__(InMemoryLRUBackend())
+    category_tree.__init__()
+    favorite_sets.__init__()
+    search_index.__init__()
+    feed.__init__()
+    ad_counters.__init__(database.AsyncSessionLocal)
+    ad_events.__init__(database.AsyncSessionLocal)
+    serving_index.__init__()
+    stripe_events.__init__(database.AsyncSessionLocal)
+    bidding._min_next_amount.clear()
+
+
+@pytest.fixture
+async def db_schema(anyio_backend):
+    _reset_singletons()
+    async with database.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    main.app.dependency_overrides.clear()
+    await database.engine.dispose()
+
+
+@pytest.fixture
+async def db(db_schema):
+    async with database.AsyncSessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def login():
+    # login(user) : requêtes suivantes authentifiées en tant que `user`
+    def set_user(user):
+        main.app.dependency_overrides[User] = lambda: user
+    return set_user
+
+
+@pytest.fixture
+async def client(db_schema):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        yield http
+
+
+class StatementCounter:
+    """Requêtes SQL exécutées, comptées par le même événement que metrics.py."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+@pytest.fixture
+def sql_statements():
+    counter = StatementCounter()
+    event.listen(database.engine.sync_engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(database.engine.sync_engine, "before_cursor_execute", counter)
+
+
+@pytest.fixture(autouse=True)
+def _metrics_routes():
+    yield
+    metrics.routes.clear()
@@ -0,0 +1,86 @@
+# tests/test_ad_import.py
+import pytest
+
+import ad_import
+from models import AccountType, User
+
+pytestmark = pytest.mark.anyio
+
+
+async def _lines(lines):
+    for line in lines:
+        yield line
+
+
+async def _records(lines):
+    return [record async for record in ad_import.iter_csv_records(_lines(lines))]
+
+
+async def test_multiline_field_is_one_record():
+    records = await _records(["title,description", 'Vélo,"Deux', 'lignes"', "Table,"])
+    assert records == [(2, {"title": "Vélo", "description": "Deux\nlignes"}), (4, {"title": "Table"})]
+
+
+async def test_stray_quote_is_bounded_and_reported(monkeypatch):
+    monkeypatch.setattr(ad_import, "MAX_RECORD_LINES", 5)
+    lines = ["title,description", 'Vélo,"guillemet ouvert'] + [f"Annonce {i}," for i in range(8)]
+    records = await _records(lines)
+    line, error = records[0]
+    assert line == 2 and "unclosed quote" in error
+    # Après le rejet, la lecture reprend ligne à ligne
+    assert records[1:] == [(start, {"title": f"Annonce {i}"}) for start, i in zip(range(7, 11), range(4, 8))]
+
+
+async def _chunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def test_lines_are_split_across_chunks():
+    chunks = ["ligne é".encode()[:-1], "ligne é".encode()[-1:] + b"\r\nsui", b"te\n\nfin"]
+    assert [line async for line in ad_import.iter_lines(_chunks(chunks))] == ["ligne é", "suite", "", "fin"]
+
+
+async def test_overlong_line_is_dropped_without_buffering_it(monkeypatch):
+    monkeypatch.setattr(ad_import, "MAX_RECORD_SIZE", 10)
+    # Ligne sans fin reçue en nombreux morceaux : rien n'est accumulé au-delà de la limite
+    chunks = [b"court\n"] + [b"x" * 8] * 1000 + [b"\nsuivante\n", b"y" * 11]
+    assert [line async for line in ad_import.iter_lines(_chunks(chunks))] == ["court", None, "suivante", None]
+
+    monkeypatch.setattr(ad_import, "MAX_RECORD_SIZE", 24)
+    records = [record async for record in ad_import.iter_jsonl_records(ad_import.iter_lines(_chunks([
+        b'{"title": "Avant"}\n', b'{"title": "' + b"x" * 20 + b'"}\n', b'{"title": "Apr\xc3\xa8s"}\n',
+    ])))]
+    assert records == [(1, {"title": "Avant"}), (2, "Line exceeds 24 characters"), (3, {"title": "Après"})]
+
+
+async def test_imported_ads_reach_the_feed(db, client, login):
+    seller = User(username="pro", email="pro@example.com", password_hash="x", account_type=AccountType.professionnel)
+    db.add(seller)
+    await db.commit()
+    login(seller)
+
+    assert (await client.get("/api/ads/feed")).json()["items"] == []
+    body = "title,status,price\nVélo,active,120\nTable,active,40\n" + 'Chaise,active,"10\n'
+    response = await client.post("/api/ads/import?format=csv", content=body.encode())
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["inserted"] == 2 and report["errors"] == [{"line": 4, "errors": ["Malformed record"]}]
+
+    # Fil déjà chargé : les annonces importées y sont ajoutées sans reconstruction
+    items = (await client.get("/api/ads/feed")).json()["items"]
+    assert sorted(item["title"] for item in items) == ["Table", "Vélo"]
+
+
+async def test_overlong_csv_line_is_reported_and_import_continues(db, client, login, monkeypatch):
+    monkeypatch.setattr(ad_import, "MAX_RECORD_SIZE", 64)
+    seller = User(username="pro", email="pro@example.com", password_hash="x", account_type=AccountType.professionnel)
+    db.add(seller)
+    await db.commit()
+    login(seller)
+
+    body = "title,description\nVélo,rouge\nTable," + "x" * 200 + "\nChaise,bois\n"
+    response = await client.post("/api/ads/import?format=csv", content=body.encode())
+    report = response.json()
+    assert report["inserted"] == 2
+    assert report["errors"] == [{"line": 3, "errors": ["Line exceeds 64 characters"]}]
@@ -0,0 +1,100 @@
+# tests/test_ad_serving.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ad_serving import serving_index
+from models import Advertisement, AdvertisementTargeting, AdPosition, AdStatusType, Category, TargetingType
+
+pytestmark = pytest.mark.anyio
+
+
+def _campaign(title, **fields):
+    fields.setdefault("status", AdStatusType.active)
+    return Advertisement(title=title, media_url=f"https://cdn.example.com/{title}.png", **fields)
+
+
+async def _served(client, **params) -> list:
+    response = await client.get("/api/advertisements/serve", params={"limit": 10, **params})
+    assert response.status_code == 200, response.text
+    return sorted(item["title"] for item in response.json())
+
+
+async def test_position_and_date_window(db, client):
+    now = datetime.now(timezone.utc)
+    db.add_all([
+        _campaign("en-cours", position=AdPosition.sidebar, start_date=now - timedelta(days=1), end_date=now + timedelta(days=1)),
+        _campaign("sans-fin", position=AdPosition.sidebar, start_date=now - timedelta(days=1)),
+        _campaign("a-venir", position=AdPosition.sidebar, start_date=now + timedelta(hours=1)),
+        _campaign("terminee", position=AdPosition.sidebar, start_date=now - timedelta(days=2), end_date=now - timedelta(seconds=1)),
+        _campaign("en-tete", position=AdPosition.header, start_date=now - timedelta(days=1)),
+        _campaign("brouillon", position=AdPosition.sidebar, start_date=now - timedelta(days=1), status=AdStatusType.draft),
+    ])
+    await db.commit()
+    assert await _served(client, position="sidebar") == ["en-cours", "sans-fin"]
+    assert await _served(client, position="header") == ["en-tete"]
+    assert await _served(client, position="footer") == []
+
+
+async def test_parent_category_campaign_is_served_on_subcategories(db, client):
+    vehicles = Category(name="Véhicules", slug="vehicules")
+    db.add(vehicles)
+    await db.flush()
+    cars = Category(name="Voitures", slug="voitures", parent_id=vehicles.id)
+    house = Category(name="Maison", slug="maison")
+    db.add_all([cars, house])
+    await db.flush()
+    db.add_all([
+        _campaign("vehicules", category_id=vehicles.id),
+        _campaign("voitures", category_id=cars.id),
+        _campaign("maison", category_id=house.id),
+        _campaign("partout"),
+        # Ciblage par table de ciblage, même sémantique que category_id
+        _campaign("vehicules-lyon", targetings=[
+            AdvertisementTargeting(type=TargetingType.category, value=str(vehicles.id)),
+            AdvertisementTargeting(type=TargetingType.location, value="Lyon"),
+        ]),
+    ])
+    await db.commit()
+    assert await _served(client, position="sidebar", category=cars.id) == ["partout", "vehicules", "voitures"]
+    assert await _served(client, position="sidebar", category=cars.id, location="lyon") == [
+        "partout", "vehicules", "vehicules-lyon", "voitures",
+    ]
+    # Pas de descente : une campagne sur une sous-catégorie ne s'affiche pas sur le parent
+    assert await _served(client, position="sidebar", category=vehicles.id) == ["partout", "vehicules"]
+    assert await _served(client, position="sidebar") == ["partout"]
+
+
+async def test_exhausted_budget_stops_serving_and_zero_budget_has_no_cap(db, client):
+    # 0,01 à 2,00 le mille : épuisé après 5 affichages
+    capped, uncapped = _campaign("plafonnee", budget="0.01"), _campaign("sans-plafond", budget=0)
+    db.add_all([capped, uncapped])
+    await db.commit()
+    assert await _served(client, position="sidebar") == ["plafonnee", "sans-plafond"]
+    for _ in range(20):
+        for campaign in (capped, uncapped):
+            await client.post(f"/api/advertisements/{campaign.id}/impression")
+    assert await _served(client, position="sidebar") == ["sans-plafond"]
+
+
+async def test_stale_index_is_served_while_rebuilt_in_the_background(db, client):
+    db.add(_campaign("ancienne"))
+    await db.commit()
+    # Premier chargement pendant la requête
+    assert await _served(client, position="sidebar") == ["ancienne"]
+    assert serving_index.rebuilds == 1
+
+    # Campagne créée par un autre worker, index périmé
+    db.add(_campaign("nouvelle"))
+    await db.commit()
+    serving_index._loaded_at -= serving_index.refresh_seconds
+    assert await _served(client, position="sidebar") == ["ancienne"]
+    refresh = serving_index._refresh
+    assert refresh is not None
+    # Requêtes suivantes pendant la reconstruction : pas de seconde tâche
+    await _served(client, position="sidebar")
+    assert serving_index._refresh is refresh
+
+    await refresh
+    assert serving_index.rebuilds == 2
+    assert await _served(client, position="sidebar") == ["ancienne", "nouvelle"]
@@ -0,0 +1,58 @@
+# tests/test_ad_tracking.py
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+import database
+from ad_tracking import ad_events, event_cost
+from models import Advertisement, AdvertisementStat, AdStatusType
+
+pytestmark = pytest.mark.anyio
+
+
+async def _campaign(db, budget):
+    campaign = Advertisement(title="Soldes", media_url="https://cdn.example.com/b.png", budget=budget, status=AdStatusType.active)
+    db.add(campaign)
+    await db.commit()
+    return campaign
+
+
+async def _views(db, advertisement_id):
+    result = await db.execute(select(func.sum(AdvertisementStat.views_count)).where(AdvertisementStat.advertisement_id == advertisement_id))
+    return result.scalar()
+
+
+async def test_impressions_past_the_budget_are_not_buffered(db, client):
+    # 0,01 de budget à 2,00 le mille : 5 affichages facturables
+    campaign = await _campaign(db, "0.01")
+    for _ in range(8):
+        assert (await client.post(f"/api/advertisements/{campaign.id}/impression")).status_code == 204
+    response = await client.get(f"/api/advertisements/{campaign.id}/click", follow_redirects=False)
+    assert response.status_code == 204
+    assert ad_events.stats()["events"] == 5
+
+    await ad_events.flush()
+    assert await _views(db, campaign.id) == 5
+    assert ad_events.spent(campaign.id) == pytest.approx(event_cost(5, 0))
+
+
+class SlowSession:
+    # Session dont la lecture rend la main avant d'être exploitée : un flush
+    # concurrent a le temps de s'exécuter entre les deux
+    def __init__(self, session):
+        self.session = session
+
+    async def execute(self, *args, **kwargs):
+        result = await self.session.execute(*args, **kwargs)
+        await asyncio.sleep(0.05)
+        return result
+
+
+async def test_flush_does_not_interleave_with_load_spend(db):
+    campaign = await _campaign(db, "100")
+    for _ in range(3):
+        ad_events.record(campaign.id)
+    async with database.AsyncSessionLocal() as other:
+        await asyncio.gather(ad_events.load_spend(SlowSession(other)), ad_events.flush())
+    assert ad_events.spent(campaign.id) == pytest.approx(event_cost(3, 0))
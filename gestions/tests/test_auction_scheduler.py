@@ -0,0 +1,121 @@
+# tests/test_auction_scheduler.py
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+import database
+from auction_scheduler import AuctionCloser, END, START
+from models import Ad, Auction, AuctionStatus, AuctionWinner, Bid, Notification, NotificationType, User
+
+pytestmark = pytest.mark.anyio
+
+
+async def _seed(db, *schedules):
+    # schedules : (status, start dans n s, fin dans n s) -> enchères créées
+    seller = User(username="seller", email="seller@example.com", password_hash="x")
+    alice = User(username="alice", email="alice@example.com", password_hash="x")
+    bob = User(username="bob", email="bob@example.com", password_hash="x")
+    db.add_all([seller, alice, bob])
+    await db.flush()
+    ad = Ad(user_id=seller.id, title="Montre")
+    db.add(ad)
+    await db.flush()
+    now = datetime.now(timezone.utc)
+    auctions = [
+        Auction(
+            ad_id=ad.id, starting_price=10, current_price=10, bid_increment=1, status=status,
+            start_time=now + timedelta(seconds=starts_in), end_time=now + timedelta(seconds=ends_in),
+        )
+        for status, starts_in, ends_in in schedules
+    ]
+    db.add_all(auctions)
+    await db.commit()
+    return alice, bob, auctions
+
+
+def _bid(auction, bidder, amount, seconds_ago):
+    return Bid(
+        auction_id=auction.id, bidder_id=bidder.id, amount=amount,
+        bid_time=datetime.now(timezone.utc) - timedelta(seconds=seconds_ago),
+    )
+
+
+async def test_settle_picks_the_highest_then_earliest_bid(db):
+    alice, bob, (highest, tied) = await _seed(db, (AuctionStatus.active, -3600, -1), (AuctionStatus.active, -3600, -1))
+    db.add_all([
+        _bid(highest, alice, 20, 30), _bid(highest, bob, 25, 20), _bid(highest, alice, 22, 10),
+        # Égalité : la première offre à ce montant l'emporte
+        _bid(tied, bob, 30, 10), _bid(tied, alice, 30, 20), _bid(tied, bob, 15, 40),
+    ])
+    await db.commit()
+
+    closer = AuctionCloser(database.AsyncSessionLocal)
+    assert sorted(await closer.settle([highest.id, tied.id])) == sorted([highest.id, tied.id])
+
+    winners = {row.auction_id: row for row in (await db.execute(select(AuctionWinner))).scalars()}
+    assert winners[highest.id].winner_id == bob.id
+    assert winners[tied.id].winner_id == alice.id
+    amounts = dict((await db.execute(select(Bid.id, Bid.amount))).all())
+    assert amounts[winners[highest.id].winning_bid_id] == 25
+    assert amounts[winners[tied.id].winning_bid_id] == 30
+
+    notifications = (await db.execute(select(Notification).where(Notification.type == NotificationType.auction_won))).scalars().all()
+    assert sorted((n.user_id, n.related_auction_id, n.related_bid_id) for n in notifications) == sorted(
+        (w.winner_id, w.auction_id, w.winning_bid_id) for w in winners.values()
+    )
+    statuses = set((await db.execute(select(Auction.status))).scalars())
+    assert statuses == {AuctionStatus.closed}
+
+
+async def test_settle_leaves_running_auctions_open(db):
+    alice, _, (ended, running, no_bids) = await _seed(
+        db, (AuctionStatus.active, -3600, -1), (AuctionStatus.active, -3600, 3600), (AuctionStatus.active, -3600, -1),
+    )
+    db.add_all([_bid(ended, alice, 12, 5), _bid(running, alice, 12, 5)])
+    await db.commit()
+
+    closer = AuctionCloser(database.AsyncSessionLocal)
+    # Prolongée ou pas encore finie : l'échéance du tas est ignorée
+    assert sorted(await closer.settle([ended.id, running.id, no_bids.id])) == sorted([ended.id, no_bids.id])
+    assert await closer.settle([ended.id]) == []
+
+    statuses = dict((await db.execute(select(Auction.id, Auction.status))).all())
+    assert statuses == {ended.id: AuctionStatus.closed, running.id: AuctionStatus.active, no_bids.id: AuctionStatus.closed}
+    winners = (await db.execute(select(AuctionWinner.auction_id))).scalars().all()
+    assert winners == [ended.id]
+
+
+async def test_activate_opens_only_started_pending_auctions(db):
+    _, _, (due, later, over) = await _seed(
+        db, (AuctionStatus.pending, -1, 3600), (AuctionStatus.pending, 600, 3600), (AuctionStatus.pending, -3600, -1),
+    )
+    closer = AuctionCloser(database.AsyncSessionLocal)
+    assert await closer.activate([due.id, later.id, over.id]) == [due.id]
+    statuses = dict((await db.execute(select(Auction.id, Auction.status))).all())
+    assert statuses == {due.id: AuctionStatus.active, later.id: AuctionStatus.pending, over.id: AuctionStatus.pending}
+
+
+async def test_reload_rebuilds_the_heap_after_a_restart(db):
+    _, _, (ending, pending, far, closed) = await _seed(
+        db,
+        (AuctionStatus.active, -3600, -5),
+        (AuctionStatus.pending, -2, 600),
+        (AuctionStatus.active, -3600, 7 * 24 * 3600),
+        (AuctionStatus.closed, -3600, -5),
+    )
+    # Nouveau processus : tas vide, tout vient de la base
+    closer = AuctionCloser(database.AsyncSessionLocal)
+    await closer.reload()
+    assert set(closer._deadlines) == {(END, ending.id), (START, pending.id), (END, pending.id)}
+
+    # Un second rechargement ne duplique pas les échéances
+    await closer.reload()
+    assert len(closer._heap) == 3
+
+    starts, ends = closer._pop_due(time.time())
+    assert (starts, ends) == ([pending.id], [ending.id])
+    assert await closer.settle(ends) == [ending.id]
+    assert await closer.activate(starts) == [pending.id]
+    assert list(closer._deadlines) == [(END, pending.id)]
@@ -0,0 +1,71 @@
+# tests/test_bid_stream.py
+import asyncio
+import json
+import time
+
+import pytest
+
+import bid_stream
+from bid_stream import AuctionHub, hub, websocket_events
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeWebSocket:
+    # Côté serveur d'un WebSocket ASGI, piloté par le test
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = []
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+async def _wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+
+
+async def test_websocket_forwards_bids_and_leaves_on_idle_disconnect():
+    websocket = FakeWebSocket()
+    session = asyncio.ensure_future(websocket_events(websocket, 7, {"type": "snapshot"}))
+    await _wait_for(lambda: hub.subscriber_count(7) == 1)
+
+    hub.publish(7, {"type": "bid", "amount": "12"})
+    await _wait_for(lambda: len(websocket.sent) == 2)
+    assert [message["type"] for message in websocket.sent] == ["snapshot", "bid"]
+
+    # Enchère silencieuse : la déconnexion est vue sans attendre de publication
+    await websocket.incoming.put({"type": "websocket.disconnect", "code": 1001})
+    await asyncio.wait_for(session, 1)
+    assert hub.subscriber_count(7) == 0
+
+
+async def test_websocket_sends_keepalive_when_idle(monkeypatch):
+    monkeypatch.setattr(bid_stream, "KEEPALIVE_SECONDS", 0.05)
+    websocket = FakeWebSocket()
+    session = asyncio.ensure_future(websocket_events(websocket, 8, {"type": "snapshot"}))
+    await _wait_for(lambda: {"type": "keepalive"} in websocket.sent)
+    session.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await session
+    assert hub.subscriber_count(8) == 0
+
+
+async def test_many_subscribers_all_receive_and_slow_ones_do_not_block():
+    stress_hub = AuctionHub(queue_size=4)
+    subscriptions = [stress_hub.subscribe(1) for _ in range(5000)]
+    for index in range(10):
+        stress_hub.publish(1, {"index": index})
+    # Personne ne lit : chaque file garde les 4 derniers messages
+    for subscription in subscriptions:
+        assert subscription.queue.qsize() == 4 and subscription.dropped == 6
+    assert json.loads(subscriptions[-1].queue.get_nowait()) == {"index": 6}
+    for subscription in subscriptions:
+        stress_hub.unsubscribe(1, subscription)
+    assert stress_hub.subscriber_count() == 0
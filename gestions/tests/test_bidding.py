@@ -0,0 +1,83 @@
+# tests/test_bidding.py
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+import bidding
+import database
+from auction_scheduler import AuctionCloser
+from models import Ad, Auction, AuctionStatus, User
+
+pytestmark = pytest.mark.anyio
+
+
+async def _auction(db, status=AuctionStatus.active, starts_in=-3600, ends_in=3600):
+    user = User(username="bidder", email="bidder@example.com", password_hash="x")
+    db.add(user)
+    await db.flush()
+    ad = Ad(user_id=user.id, title="Vélo")
+    db.add(ad)
+    await db.flush()
+    now = datetime.now(timezone.utc)
+    auction = Auction(
+        ad_id=ad.id, starting_price=10, current_price=10, bid_increment=1, status=status,
+        start_time=now + timedelta(seconds=starts_in), end_time=now + timedelta(seconds=ends_in),
+    )
+    db.add(auction)
+    await db.commit()
+    return user, auction
+
+
+async def test_concurrent_bids_never_accept_a_lower_price(db, client, login):
+    user, auction = await _auction(db)
+    login(user)
+    responses = await asyncio.gather(*[
+        client.post("/api/bids/", json={"auction_id": auction.id, "amount": str(11 + index % 5)}) for index in range(30)
+    ])
+    accepted = [Decimal(response.json()["amount"]) for response in responses if response.status_code == 201]
+    assert accepted == sorted(set(accepted))
+    assert all(response.status_code in (201, 400) for response in responses)
+    current = (await client.get(f"/api/auctions/{auction.id}")).json()["current_price"]
+    assert Decimal(current) == max(accepted)
+
+
+async def test_pending_auction_is_opened_by_the_scheduler(db, client, login):
+    user, auction = await _auction(db, status=AuctionStatus.pending, starts_in=-1)
+    login(user)
+    response = await client.post("/api/bids/", json={"auction_id": auction.id, "amount": "11"})
+    assert response.json()["detail"] == "Auction is not active"
+
+    closer = AuctionCloser(database.AsyncSessionLocal)
+    await closer.reload()
+    starts, ends = closer._pop_due(time.time())
+    assert (starts, ends) == ([auction.id], [])
+    assert await closer.activate(starts) == [auction.id]
+
+    response = await client.post("/api/bids/", json={"auction_id": auction.id, "amount": "11"})
+    assert response.status_code == 201, response.text
+
+
+async def test_bid_floor_is_dropped_once_the_auction_is_closed(db, client, login):
+    user, auction = await _auction(db)
+    login(user)
+    assert (await client.post("/api/bids/", json={"auction_id": auction.id, "amount": "11"})).status_code == 201
+    assert auction.id in bidding._min_next_amount
+
+    # Fermée par un autre worker : ce worker l'apprend à la prochaine offre
+    async with database.AsyncSessionLocal() as other:
+        (await other.get(Auction, auction.id)).status = AuctionStatus.closed
+        await other.commit()
+    response = await client.post("/api/bids/", json={"auction_id": auction.id, "amount": "20"})
+    assert response.json()["detail"] == "Auction is not active"
+    assert auction.id not in bidding._min_next_amount
+
+
+def test_bid_floor_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(bidding, "BID_FLOOR_CACHE_SIZE", 3)
+    monkeypatch.setattr(bidding, "_min_next_amount", bidding.OrderedDict())
+    for auction_id in range(10):
+        bidding._remember_floor(auction_id, Decimal(auction_id))
+    assert list(bidding._min_next_amount) == [7, 8, 9]
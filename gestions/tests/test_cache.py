@@ -0,0 +1,65 @@
+# tests/test_cache.py
+import asyncio
+
+import pytest
+from sqlalchemy import select, update
+
+import database
+from cache import EntityCache, InMemoryLRUBackend, LocalSharedBackend, entity_cache
+from models import User
+
+pytestmark = pytest.mark.anyio
+
+
+async def _user(db):
+    user = User(username="alice", email="alice@example.com", password_hash="x")
+    db.add(user)
+    await db.commit()
+    return user
+
+
+async def test_cold_key_under_concurrent_readers_runs_one_query(db, client, sql_statements):
+    user = await _user(db)
+    sql_statements.count = 0
+    responses = await asyncio.gather(*[client.get(f"/api/users/{user.id}") for _ in range(50)])
+    assert {response.status_code for response in responses} == {200}
+    assert {response.json()["username"] for response in responses} == {"alice"}
+    assert sql_statements.count == 1
+    assert entity_cache.loads == 1 and entity_cache.coalesced + entity_cache.hits == 49
+
+    # Clé chaude : plus aucune requête
+    await asyncio.gather(*[client.get(f"/api/users/{user.id}") for _ in range(10)])
+    assert sql_statements.count == 1
+
+
+@pytest.mark.parametrize("backend", [InMemoryLRUBackend, LocalSharedBackend])
+async def test_invalidation_during_a_load_does_not_store_the_stale_value(db, backend):
+    user = await _user(db)
+    cache = EntityCache(backend())
+    read, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_load():
+        async with database.AsyncSessionLocal() as session:
+            email = (await session.execute(select(User.email).where(User.id == user.id))).scalar_one()
+        read.set()
+        await release.wait()
+        return email
+
+    async def load():
+        async with database.AsyncSessionLocal() as session:
+            return (await session.execute(select(User.email).where(User.id == user.id))).scalar_one()
+
+    first = asyncio.create_task(cache.get_or_load("user", user.id, slow_load))
+    await read.wait()
+    # Écriture puis invalidation pendant que la lecture de l'ancienne valeur est en vol
+    await db.execute(update(User).where(User.id == user.id).values(email="new@example.com"))
+    await db.commit()
+    await cache.invalidate("user", user.id)
+    release.set()
+    assert await first == "alice@example.com"
+
+    # La valeur lue avant l'invalidation n'a pas été gardée : rechargement
+    assert await cache.get_or_load("user", user.id, load) == "new@example.com"
+    assert cache.loads == 2
+    assert await cache.get_or_load("user", user.id, load) == "new@example.com"
+    assert cache.loads == 2
@@ -0,0 +1,41 @@
+# tests/test_counters.py
+import pytest
+from sqlalchemy import select
+
+from counters import ad_counters
+from models import AccountType, Ad, ProStat, User
+
+pytestmark = pytest.mark.anyio
+
+
+async def _ads(db):
+    pro = User(username="pro", email="pro@example.com", password_hash="x", account_type=AccountType.professionnel)
+    individual = User(username="someone", email="someone@example.com", password_hash="x")
+    db.add_all([pro, individual])
+    await db.flush()
+    pro_ad, other_ad = Ad(user_id=pro.id, title="Pro"), Ad(user_id=individual.id, title="Particulier")
+    db.add_all([pro_ad, other_ad])
+    await db.commit()
+    return pro, pro_ad, other_ad
+
+
+async def _stats(db):
+    result = await db.execute(select(ProStat).execution_options(populate_existing=True))
+    return {stat.ad_id: (stat.user_id, stat.views_count, stat.messages_count, stat.favorites_count) for stat in result.scalars()}
+
+
+async def test_flush_creates_then_increments_pro_stats(db):
+    pro, pro_ad, other_ad = await _ads(db)
+    for ad in (pro_ad, other_ad):
+        ad_counters.record(ad.id, "views", 3)
+        ad_counters.record(ad.id, "messages")
+        ad_counters.record(ad.id, "favorites", 2)
+    await ad_counters.flush()
+    # Statistiques pour l'annonce du vendeur pro seulement
+    assert await _stats(db) == {pro_ad.id: (pro.id, 3, 1, 2)}
+
+    ad_counters.record(pro_ad.id, "views")
+    ad_counters.record(pro_ad.id, "favorites", -1)
+    await ad_counters.flush()
+    assert await _stats(db) == {pro_ad.id: (pro.id, 4, 1, 1)}
+    assert (await db.get(Ad, pro_ad.id, populate_existing=True)).views_count == 4
@@ -0,0 +1,39 @@
+# tests/test_favorites.py
+import pytest
+from sqlalchemy import select
+
+from counters import ad_counters
+from models import AccountType, Ad, ProStat, User
+
+pytestmark = pytest.mark.anyio
+
+
+async def _favorites_count(db, ad_id):
+    result = await db.execute(select(ProStat.favorites_count).where(ProStat.ad_id == ad_id).execution_options(populate_existing=True))
+    return result.scalar_one_or_none()
+
+
+async def test_toggling_a_favorite_updates_pro_stats_after_flush(db, client, login):
+    seller = User(username="pro", email="pro@example.com", password_hash="x", account_type=AccountType.professionnel)
+    buyers = [User(username=f"buyer{i}", email=f"buyer{i}@example.com", password_hash="x") for i in range(2)]
+    db.add_all([seller, *buyers])
+    await db.flush()
+    ad = Ad(user_id=seller.id, title="Canapé")
+    db.add(ad)
+    await db.commit()
+
+    for buyer in buyers:
+        login(buyer)
+        assert (await client.put(f"/api/favorites/{ad.id}")).status_code == 204
+        # Second ajout idempotent : ne compte pas deux fois
+        assert (await client.put(f"/api/favorites/{ad.id}")).status_code == 204
+    await ad_counters.flush()
+    assert await _favorites_count(db, ad.id) == 2
+
+    assert (await client.delete(f"/api/favorites/{ad.id}")).status_code == 204
+    assert (await client.delete(f"/api/favorites/{ad.id}")).status_code == 204
+    await ad_counters.flush()
+    assert await _favorites_count(db, ad.id) == 1
+
+    response = await client.get("/api/favorites/lookup", params={"ad_ids": [ad.id]})
+    assert response.json() == []
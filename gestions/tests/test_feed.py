@@ -0,0 +1,31 @@
+# tests/test_feed.py
+import pytest
+
+from feed import feed
+from models import Ad, User
+
+pytestmark = pytest.mark.anyio
+
+
+async def _titles(client):
+    response = await client.get("/api/ads/feed")
+    assert response.status_code == 200, response.text
+    return [item["title"] for item in response.json()["items"]]
+
+
+async def test_stale_feed_is_served_while_it_rebuilds_in_background(db, client):
+    seller = User(username="seller", email="seller@example.com", password_hash="x")
+    db.add(seller)
+    await db.flush()
+    db.add(Ad(user_id=seller.id, title="Ancienne", status="active"))
+    await db.commit()
+    assert await _titles(client) == ["Ancienne"]
+
+    # Annonce créée par un autre worker : visible après la reconstruction
+    db.add(Ad(user_id=seller.id, title="Nouvelle", status="active"))
+    await db.commit()
+    feed._loaded_at -= feed.refresh_seconds
+    assert await _titles(client) == ["Ancienne"]
+    await feed._refresh
+    assert await _titles(client) == ["Nouvelle", "Ancienne"]
+    assert feed.stats()["rebuilds"] == 2
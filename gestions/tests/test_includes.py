@@ -0,0 +1,69 @@
+# tests/test_includes.py
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from models import Ad, AdImage, Auction, Bid, Category, User
+
+pytestmark = pytest.mark.anyio
+
+
+async def _seed(db, count: int):
+    user = User(username="seller", email="seller@example.com", password_hash="x")
+    category = Category(name="Vélos", slug="velos")
+    db.add_all([user, category])
+    await db.flush()
+    now = datetime.now(timezone.utc)
+    for index in range(count):
+        ad = Ad(user_id=user.id, category_id=category.id, title=f"Annonce {index}")
+        db.add(ad)
+        await db.flush()
+        db.add_all([AdImage(ad_id=ad.id, image_url=f"/img/{ad.id}-{position}.jpg", position=position) for position in range(3)])
+        auction = Auction(ad_id=ad.id, starting_price=1, current_price=1, start_time=now, end_time=now + timedelta(days=1))
+        db.add(auction)
+        await db.flush()
+        db.add(Bid(auction_id=auction.id, bidder_id=user.id, amount=Decimal(2)))
+    await db.commit()
+    return user
+
+
+async def _count(client, sql_statements, url: str):
+    before = sql_statements.count
+    response = await client.get(url)
+    assert response.status_code == 200, response.text
+    return response.json(), sql_statements.count - before
+
+
+@pytest.mark.parametrize("limit", [5, 25])
+async def test_ad_page_query_count_does_not_depend_on_page_size(db, client, login, sql_statements, limit):
+    login(await _seed(db, 30))
+    page, statements = await _count(
+        client, sql_statements, f"/api/ads/?limit={limit}&cursor=&include=images,category,seller,auction"
+    )
+    assert len(page["items"]) == limit
+    assert all(len(item["images"]) == 3 and item["seller"]["username"] == "seller" for item in page["items"])
+    # Page + selectin des images + selectin des enchères ; catégorie et vendeur en jointure
+    assert statements == 3
+
+
+@pytest.mark.parametrize("limit", [5, 25])
+async def test_auction_page_query_count_does_not_depend_on_page_size(db, client, login, sql_statements, limit):
+    login(await _seed(db, 30))
+    auctions, statements = await _count(client, sql_statements, f"/api/auctions/?limit={limit}&include=ad,bids")
+    assert len(auctions) == limit
+    assert all(auction["ad"]["id"] == auction["ad_id"] and len(auction["bids"]) == 1 for auction in auctions)
+    assert statements == 2
+
+
+async def test_ad_detail_query_count(db, client, login, sql_statements):
+    login(await _seed(db, 2))
+    ad, statements = await _count(client, sql_statements, "/api/ads/1?include=images,category,seller,auction")
+    assert len(ad["images"]) == 3 and ad["category"]["slug"] == "velos"
+    assert statements == 3
+
+
+async def test_unknown_include_is_rejected(db, client, login):
+    login(await _seed(db, 1))
+    response = await client.get("/api/ads/?include=foo")
+    assert response.status_code == 400
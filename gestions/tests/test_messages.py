@@ -0,0 +1,60 @@
+# tests/test_messages.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, text, update
+
+from models import ConversationHead, Message, User
+from routers.messages import _thread_filter
+
+pytestmark = pytest.mark.anyio
+
+
+async def _users(db):
+    alice = User(username="alice", email="alice@example.com", password_hash="x")
+    bob = User(username="bob", email="bob@example.com", password_hash="x")
+    db.add_all([alice, bob])
+    await db.commit()
+    return alice, bob
+
+
+async def _send(client, login, sender, receiver, content):
+    login(sender)
+    response = await client.post("/api/messages/", json={"receiver_id": receiver.id, "content": content})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+async def test_thread_reads_both_directions_from_one_index(db, client, login):
+    alice, bob = await _users(db)
+    for index in range(6):
+        sender, receiver = (alice, bob) if index % 2 else (bob, alice)
+        await _send(client, login, sender, receiver, f"message {index}")
+
+    login(alice)
+    contents, cursor = [], ""
+    while cursor is not None:
+        page = (await client.get(f"/api/messages/conversations/{bob.id}", params={"cursor": cursor, "limit": 4})).json()
+        contents += [item["content"] for item in page["items"]]
+        cursor = page["next_cursor"]
+    assert contents == [f"message {index}" for index in reversed(range(6))]
+
+    query = select(Message.id).where(_thread_filter(alice.id, bob.id, None)).order_by(Message.created_at.desc(), Message.id.desc())
+    compiled = query.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+    plan = " ".join(row[-1] for row in await db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    assert "idx_messages_pair" in plan and "TEMP B-TREE" not in plan
+
+
+async def test_late_message_does_not_replace_a_newer_head(db, client, login):
+    alice, bob = await _users(db)
+    first = await _send(client, login, alice, bob, "bonjour")
+    # Un message plus récent a déjà été enregistré (transaction concurrente validée avant)
+    later = datetime.now(timezone.utc) + timedelta(hours=1)
+    await db.execute(update(ConversationHead).values(last_message_at=later))
+    await db.commit()
+
+    await _send(client, login, alice, bob, "tardif")
+    result = await db.execute(select(ConversationHead).execution_options(populate_existing=True))
+    heads = {head.owner_id: head for head in result.scalars()}
+    assert {head.last_message_id for head in heads.values()} == {first["id"]}
+    assert heads[bob.id].unread_count == 2 and heads[alice.id].unread_count == 0
@@ -0,0 +1,37 @@
+# tests/test_metrics.py
+import httpx
+import pytest
+
+import database
+import metrics
+
+pytestmark = pytest.mark.anyio
+
+
+async def _waiting_app(scope, receive, send):
+    # Deux connexions prises, 2 ms d'attente chacune
+    database.pool_metrics.record_wait(0.002)
+    database.pool_metrics.record_wait(0.002)
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def _get(path="/"):
+    transport = httpx.ASGITransport(app=metrics.MetricsMiddleware(_waiting_app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await http.get(path)
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+async def test_pool_wait_is_exported_and_header_is_opt_in(monkeypatch, anyio_backend, enabled):
+    monkeypatch.setattr(metrics, "DB_POOL_TIMING_HEADER", enabled)
+    response = await _get()
+    assert response.text == "ok"
+    if enabled:
+        assert response.headers["server-timing"] == 'db-pool;dur=4.00;desc="2 checkout(s)"'
+    else:
+        assert "server-timing" not in response.headers
+
+    exported = metrics.render_prometheus()
+    assert 'http_request_db_pool_checkouts_total{method="GET",route="unmatched"} 2' in exported
+    assert 'http_request_db_pool_wait_seconds_total{method="GET",route="unmatched"} 0.004' in exported
@@ -0,0 +1,69 @@
+# tests/test_notify.py
+import pytest
+from sqlalchemy import event, func, select
+
+import database
+import notify
+from models import Notification, NotificationCounter, NotificationType, User
+
+pytestmark = pytest.mark.anyio
+
+
+async def _counters(db):
+    result = await db.execute(select(NotificationCounter.user_id, NotificationCounter.unread))
+    return dict(result.all())
+
+
+async def test_fan_out_evaluates_recipients_once_and_counts_inserted_rows(db, sql_statements):
+    users = [User(username=f"user{i}", email=f"user{i}@example.com", password_hash="x") for i in range(5)]
+    db.add_all(users)
+    await db.commit()
+    recipients = select(User.id).where(User.username != "user0")
+
+    sql_statements.count = 0
+    for _ in range(2):
+        await notify.fan_out(db, recipients, NotificationType.bid_placed, "Nouvelle offre")
+    await db.commit()
+    # Par envoi : INSERT … SELECT … RETURNING puis l'upsert des compteurs
+    assert sql_statements.count == 4
+
+    expected = {user.id: 2 for user in users[1:]}
+    assert await _counters(db) == expected
+    result = await db.execute(select(Notification.user_id, func.count()).group_by(Notification.user_id))
+    assert dict(result.all()) == expected
+
+    await notify.rebuild_counters(db)
+    await db.commit()
+    assert await _counters(db) == expected
+
+
+async def test_mark_all_read_keeps_a_notification_that_arrives_meanwhile(db, client, login):
+    user = User(username="alice", email="alice@example.com", password_hash="x")
+    db.add(user)
+    await db.commit()
+    for _ in range(2):
+        await notify.fan_out(db, [user.id], NotificationType.bid_placed, "Nouvelle offre")
+    await db.commit()
+    login(user)
+
+    def concurrent_insert(conn, cursor, statement, parameters, context, executemany):
+        # Notification validée entre l'UPDATE des notifications et celui du
+        # compteur, comme une transaction concurrente en READ COMMITTED
+        if statement.startswith("UPDATE notifications") and not fired:
+            fired.append(True)
+            conn.exec_driver_sql(
+                "INSERT INTO notifications (user_id, type, message, is_read) VALUES (?, 'bid_placed', 'Plus tard', 0)", (user.id,)
+            )
+            conn.exec_driver_sql("UPDATE notification_counters SET unread = unread + 1 WHERE user_id = ?", (user.id,))
+
+    fired = []
+    event.listen(database.engine.sync_engine, "after_cursor_execute", concurrent_insert)
+    try:
+        response = await client.post("/api/notifications/mark_all_read")
+    finally:
+        event.remove(database.engine.sync_engine, "after_cursor_execute", concurrent_insert)
+    assert fired and response.json() == {"updated": 2}
+
+    unread = (await db.execute(select(func.count()).where(Notification.is_read.isnot(True)))).scalar_one()
+    assert unread == 1
+    assert (await client.get("/api/notifications/unread_count")).json() == {"unread": 1}
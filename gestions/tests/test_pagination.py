@@ -0,0 +1,52 @@
+# tests/test_pagination.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from models import Ad, Auction, AuctionStatus, User
+
+pytestmark = pytest.mark.anyio
+
+
+async def _walk(client, url: str) -> list:
+    pages, cursor = [], ""
+    while cursor is not None:
+        assert len(pages) < 10, pages
+        response = await client.get(f"{url}&cursor={cursor}")
+        assert response.status_code == 200, response.text
+        page = response.json()
+        pages.append([item["id"] for item in page["items"]])
+        cursor = page["next_cursor"]
+    return pages
+
+
+async def test_rows_created_in_the_same_second_are_paged_once(db, client):
+    # created_at vient de CURRENT_TIMESTAMP : même seconde pour toutes les lignes
+    user = User(username="seller", email="seller@example.com", password_hash="x")
+    db.add(user)
+    await db.flush()
+    db.add_all([Ad(user_id=user.id, title=f"Annonce {index}") for index in range(5)])
+    await db.commit()
+
+    assert await _walk(client, "/api/ads/?limit=2") == [[5, 4], [3, 2], [1]]
+    assert await _walk(client, "/api/ads/?limit=2&include=images") == [[5, 4], [3, 2], [1]]
+
+
+async def test_cursor_keeps_its_filter(db, client):
+    user = User(username="seller", email="seller@example.com", password_hash="x")
+    db.add(user)
+    await db.flush()
+    ad = Ad(user_id=user.id, title="Annonce")
+    db.add(ad)
+    await db.flush()
+    now = datetime.now(timezone.utc)
+    for index in range(6):
+        status = AuctionStatus.active if index % 2 else AuctionStatus.pending
+        db.add(Auction(ad_id=ad.id, starting_price=1, start_time=now, end_time=now + timedelta(days=1), status=status))
+    await db.commit()
+
+    pages = await _walk(client, "/api/auctions/?limit=2&status=active")
+    assert pages == [[6, 4], [2]]
+    first = (await client.get("/api/auctions/?limit=2&status=active&cursor=")).json()
+    response = await client.get(f"/api/auctions/?limit=2&status=pending&cursor={first['next_cursor']}")
+    assert response.status_code == 400
@@ -0,0 +1,68 @@
+# tests/test_quotas.py
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select
+
+import database
+from models import AccountType, Ad, ProSubscription, User, UserAdUsage
+from stripe_events import stripe_events
+
+pytestmark = pytest.mark.anyio
+
+QUOTA = 3
+ATTEMPTS = 10
+
+
+async def test_concurrent_creates_stop_exactly_at_the_quota(db, client, login):
+    seller = User(username="pro", email="pro@example.com", password_hash="x", account_type=AccountType.professionnel)
+    db.add(seller)
+    await db.flush()
+    db.add(ProSubscription(
+        user_id=seller.id, plan_name="Essentiel", ads_limit=QUOTA,
+        start_date=datetime.now(timezone.utc) - timedelta(days=1),
+    ))
+    await db.commit()
+    login(seller)
+
+    responses = await asyncio.gather(*[
+        client.post("/api/ads/", json={"category_id": None, "title": f"Annonce {index}"})
+        for index in range(ATTEMPTS)
+    ])
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [201] * QUOTA + [403] * (ATTEMPTS - QUOTA), [response.text for response in responses]
+
+    created = (await db.execute(select(func.count(Ad.id)).where(Ad.user_id == seller.id))).scalar()
+    usage = await db.get(UserAdUsage, seller.id)
+    assert created == usage.ads_count == QUOTA
+
+
+async def test_subscription_change_invalidates_cached_limits(db, client, login):
+    seller = User(username="pro", email="pro@example.com", password_hash="x", account_type=AccountType.professionnel)
+    db.add(seller)
+    await db.flush()
+    plan = ProSubscription(
+        user_id=seller.id, plan_name="Essentiel", ads_limit=1,
+        start_date=datetime.now(timezone.utc) - timedelta(days=1),
+    )
+    db.add(plan)
+    await db.commit()
+    login(seller)
+    assert (await client.post("/api/ads/", json={"category_id": None, "title": "Première"})).status_code == 201
+    assert (await client.post("/api/ads/", json={"category_id": None, "title": "Deuxième"})).status_code == 403
+
+    # Passage à l'offre supérieure, confirmé par l'événement Stripe de l'abonnement
+    plan.plan_name, plan.ads_limit = "Premium", 5
+    await db.commit()
+    event = {
+        "id": "evt_upgrade", "type": "customer.subscription.updated",
+        "data": {"object": {
+            "id": "sub_1", "customer": "cus_1", "status": "active", "metadata": {"user_id": str(seller.id)},
+            "items": {"data": [{"price": {"id": "price_premium", "nickname": "Premium"}}]},
+        }},
+    }
+    async with database.AsyncSessionLocal() as other:
+        assert await stripe_events.record(other, event)
+    assert await stripe_events.process(event)
+    assert (await client.post("/api/ads/", json={"category_id": None, "title": "Deuxième"})).status_code == 201
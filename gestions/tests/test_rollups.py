@@ -0,0 +1,39 @@
+# tests/test_rollups.py
+from datetime import datetime, timezone
+
+import pytest
+
+import rollups
+from models import User, UserRole
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_rollups_match_a_raw_aggregate_after_each_write(db, client, login):
+    buyer = User(username="buyer", email="buyer@example.com", password_hash="x")
+    admin = User(username="admin", email="admin@example.com", password_hash="x", role=UserRole.admin)
+    db.add_all([buyer, admin])
+    await db.commit()
+
+    login(buyer)
+    ids = []
+    for amount, currency in [("10.00", "EUR"), ("25.50", "EUR"), ("7.25", "USD"), ("99.99", "EUR")]:
+        response = await client.post("/api/payments/", json={"user_id": buyer.id, "amount": amount, "currency": currency})
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    assert await rollups.verify(db) == []
+
+    for payment_id, new_status in [(ids[0], "completed"), (ids[1], "completed"), (ids[2], "refunded"), (ids[0], "refunded")]:
+        assert (await client.patch(f"/api/payments/{payment_id}", params={"payment_status": new_status})).status_code == 200
+    assert (await client.delete(f"/api/payments/{ids[3]}")).status_code == 204
+    assert await rollups.verify(db) == []
+
+    login(admin)
+    today = datetime.now(timezone.utc).date().isoformat()
+    report = (await client.get("/api/payments/reports/daily", params={"start": today, "end": today})).json()
+    assert {(row["currency"], row["payment_status"]): (row["payment_count"], row["amount"]) for row in report} == {
+        ("EUR", "completed"): (1, "25.50"),
+        ("EUR", "refunded"): (1, "10.00"),
+        ("USD", "refunded"): (1, "7.25"),
+    }
+    assert (await client.get("/api/payments/reports/verify")).json() == {"ok": True, "differences": []}
@@ -0,0 +1,126 @@
+# tests/test_serialization.py
+"""json_response doit produire les mêmes octets que FastAPI avec response_model.
+
+Les routes de référence ci-dessous servent les mêmes données comme avant le
+chemin rapide : objets ORM renvoyés et sérialisés par response_model.
+"""
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import List
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from sqlalchemy.future import select
+
+from database import get_db
+from includes import AD_INCLUDES, ad_detail, load_options, parse_includes
+from models import Ad, AdImage, AdStatus, Category, Payment, PaymentStatus, User
+from pagination import fetch_page, resolve_cursor
+from schemas import AdDetailRead, AdRead, Page, PaymentRead
+
+pytestmark = pytest.mark.anyio
+
+reference = FastAPI()
+
+
+@reference.get("/ads", response_model=List[AdRead])
+async def reference_ads(limit: int = 100, db=Depends(get_db)):
+    return (await db.execute(select(Ad).limit(limit))).scalars().all()
+
+
+@reference.get("/ads/page", response_model=Page[AdRead])
+async def reference_ad_page(limit: int, cursor: str = "", db=Depends(get_db)):
+    position, filters = resolve_cursor(cursor, {"status": None, "category_id": None, "include_subcategories": None})
+    return await fetch_page(db, select(Ad), [Ad.created_at, Ad.id], position, limit, filters)
+
+
+@reference.get("/ads/detail", response_model=Page[AdDetailRead], response_model_exclude_unset=True)
+async def reference_ad_detail_page(limit: int, include: str, cursor: str = "", db=Depends(get_db)):
+    includes = parse_includes(include, AD_INCLUDES)
+    position, filters = resolve_cursor(cursor, {"status": None, "category_id": None, "include_subcategories": None})
+    page = await fetch_page(db, select(Ad).options(*load_options(includes, AD_INCLUDES)), [Ad.created_at, Ad.id], position, limit, filters)
+    return {"items": [ad_detail(ad, includes) for ad in page["items"]], "next_cursor": page["next_cursor"]}
+
+
+@reference.get("/payments", response_model=List[PaymentRead])
+async def reference_payments(user_id: int, db=Depends(get_db)):
+    return (await db.execute(select(Payment).where(Payment.user_id == user_id).limit(100))).scalars().all()
+
+
+@reference.get("/payments/page", response_model=Page[PaymentRead])
+async def reference_payment_page(user_id: int, limit: int, cursor: str = "", db=Depends(get_db)):
+    position, filters = resolve_cursor(cursor, {"payment_status": None})
+    query = select(Payment).where(Payment.user_id == user_id)
+    return await fetch_page(db, query, [Payment.created_at, Payment.id], position, limit, filters)
+
+
+async def _seed(db):
+    user = User(username="seller", email="seller@example.com", password_hash="x")
+    category = Category(name="Électroménager", slug="electromenager")
+    db.add_all([user, category])
+    await db.flush()
+    now = datetime.now(timezone.utc)
+    # Valeurs variées : nulls, décimaux, JSON, accents, annonces créées dans la même seconde
+    for index in range(7):
+        ad = Ad(
+            user_id=user.id, category_id=category.id if index % 2 else None, title=f"Réfrigérateur « {index} »",
+            description=None if index % 3 else "Très bon état\nlivré", price=Decimal("1234.5") + index,
+            latitude=48.8566 + index / 1000 if index % 2 else None, longitude=2.3522 if index % 2 else None,
+            status=AdStatus.active, is_featured=index == 3, views_count=index * 11,
+            created_at=now - timedelta(seconds=index // 2), expires_at=now + timedelta(days=index) if index % 2 else None,
+        )
+        db.add(ad)
+        await db.flush()
+        db.add_all([AdImage(ad_id=ad.id, image_url=f"/img/{ad.id}-{position}.jpg", position=position) for position in range(index % 3)])
+        db.add(Payment(
+            user_id=user.id, ad_id=ad.id if index % 2 else None, amount=Decimal("19.9") * index, currency="EUR",
+            payment_status=list(PaymentStatus)[index % len(PaymentStatus)], meta={"index": index, "note": "été"} if index % 2 else None,
+            stripe_payment_id=f"pi_{index}",
+        ))
+    await db.commit()
+    return user
+
+
+async def _pages(http, url: str) -> list:
+    # Toutes les pages d'une pagination par curseur, corps bruts
+    bodies, cursor = [], ""
+    while cursor is not None:
+        response = await http.get(f"{url}&cursor={cursor}")
+        assert response.status_code == 200, response.text
+        bodies.append(response.content)
+        cursor = response.json()["next_cursor"]
+    return bodies
+
+
+@pytest.fixture
+async def reference_client(db_schema):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=reference), base_url="http://test") as http:
+        yield http
+
+
+async def test_ad_lists_match_response_model(db, client, reference_client):
+    await _seed(db)
+    fast, slow = await client.get("/api/ads/"), await reference_client.get("/ads")
+    assert fast.headers["content-type"] == slow.headers["content-type"]
+    assert fast.content == slow.content and len(fast.json()) == 7
+
+    assert await _pages(client, "/api/ads/?limit=3") == await _pages(reference_client, "/ads/page?limit=3")
+
+
+async def test_ad_detail_pages_match_response_model_with_exclude_unset(db, client, reference_client):
+    await _seed(db)
+    for include in ("images", "images,category,seller"):
+        fast = await _pages(client, f"/api/ads/?limit=2&include={include}")
+        slow = await _pages(reference_client, f"/ads/detail?limit=2&include={include}")
+        assert fast == slow and len(fast) == 4
+    # exclude_unset : les relations non demandées sont absentes, pas nulles
+    assert b'"seller"' in fast[0] and b'"auctions"' not in fast[0]
+
+
+async def test_payment_lists_match_response_model(db, client, reference_client, login):
+    user = await _seed(db)
+    login(user)
+    fast, slow = await client.get("/api/payments/"), await reference_client.get(f"/payments?user_id={user.id}")
+    assert fast.content == slow.content and len(fast.json()) == 7
+    assert await _pages(client, "/api/payments/?limit=3") == await _pages(reference_client, f"/payments/page?user_id={user.id}&limit=3")
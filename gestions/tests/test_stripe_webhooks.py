@@ -0,0 +1,166 @@
+# tests/test_stripe_webhooks.py
+import asyncio
+import json
+import time
+
+import pytest
+from sqlalchemy import select
+
+import database
+import rollups
+import stripe_events as stripe_events_module
+from models import Payment, PaymentStatus, StripeWebhookLog, User
+from stripe_events import sign_payload, stripe_events
+
+pytestmark = pytest.mark.anyio
+
+SECRET = "whsec_test"
+
+
+@pytest.fixture(autouse=True)
+def _secret(monkeypatch):
+    monkeypatch.setattr(stripe_events_module, "STRIPE_WEBHOOK_SECRET", SECRET)
+
+
+@pytest.fixture
+async def processor(db_schema):
+    # Tâches de traitement démarrées comme au lancement de l'application
+    stripe_events.start()
+    yield stripe_events
+    await stripe_events.stop()
+
+
+async def _drain():
+    await asyncio.gather(*(queue.join() for queue in stripe_events._queues))
+
+
+def _event(event_id: str, intent_id: str = "pi_1") -> bytes:
+    return json.dumps({
+        "id": event_id, "type": "payment_intent.succeeded",
+        "data": {"object": {"id": intent_id, "object": "payment_intent"}},
+    }).encode()
+
+
+async def _post(client, payload: bytes, signature: str = None):
+    headers = {"Stripe-Signature": signature or sign_payload(payload, SECRET)}
+    return await client.post("/api/webhooks/stripe", content=payload, headers=headers)
+
+
+async def _payment(db, client, login):
+    user = User(username="buyer", email="buyer@example.com", password_hash="x")
+    db.add(user)
+    await db.commit()
+    login(user)
+    response = await client.post("/api/payments/", json={"user_id": user.id, "amount": "49.90", "payment_intent_id": "pi_1"})
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+async def _status(db, payment_id):
+    db.expire_all()
+    return (await db.execute(select(Payment.payment_status).where(Payment.id == payment_id))).scalar_one()
+
+
+async def _logs(db):
+    db.expire_all()
+    return (await db.execute(select(StripeWebhookLog).order_by(StripeWebhookLog.id))).scalars().all()
+
+
+@pytest.mark.parametrize("signature", [
+    None,
+    "t=1,v1=deadbeef",
+    "v1=deadbeef",
+])
+async def test_missing_or_bad_signature_is_rejected(db, client, signature):
+    payload = _event("evt_1")
+    headers = {"Stripe-Signature": signature} if signature else {}
+    response = await client.post("/api/webhooks/stripe", content=payload, headers=headers)
+    assert response.status_code == 400
+    assert await _logs(db) == []
+
+
+async def test_wrong_secret_and_expired_signature_are_rejected(db, client):
+    payload = _event("evt_1")
+    assert (await _post(client, payload, sign_payload(payload, "whsec_other"))).status_code == 400
+    expired = sign_payload(payload, SECRET, int(time.time()) - stripe_events_module.STRIPE_WEBHOOK_TOLERANCE - 60)
+    response = await _post(client, payload, expired)
+    assert response.status_code == 400 and "tolerance" in response.json()["detail"]
+    # Corps modifié après signature
+    assert (await _post(client, _event("evt_2"), sign_payload(payload, SECRET))).status_code == 400
+    assert await _logs(db) == []
+
+
+async def test_duplicate_event_is_acked_but_recorded_and_processed_once(db, client, login, processor):
+    payment_id = await _payment(db, client, login)
+    payload = _event("evt_1")
+    responses = [await _post(client, payload) for _ in range(3)]
+    assert [response.json() for response in responses] == [{"received": True}] * 3
+    await _drain()
+
+    logs = await _logs(db)
+    assert [(log.event_id, log.attempts, log.processed_at is not None) for log in logs] == [("evt_1", 1, True)]
+    assert processor.counters["received"] == 1 and processor.counters["duplicates"] == 2
+    assert processor.counters["processed"] == 1
+    assert await _status(db, payment_id) == PaymentStatus.completed
+    assert await rollups.verify(db) == []
+
+
+async def test_failed_event_stays_pending_and_is_replayed(db, client, login, processor, monkeypatch):
+    payment_id = await _payment(db, client, login)
+
+    async def broken(db, intent):
+        raise RuntimeError("base indisponible")
+
+    handler = stripe_events_module.HANDLERS["payment_intent.succeeded"]
+    monkeypatch.setitem(stripe_events_module.HANDLERS, "payment_intent.succeeded", broken)
+    assert (await _post(client, _event("evt_1"))).status_code == 200
+    await _drain()
+    (log,) = await _logs(db)
+    # Transaction annulée : non marqué traité, échec enregistré
+    assert log.processed_at is None and log.attempts == 1 and "base indisponible" in log.last_error
+    assert await _status(db, payment_id) == PaymentStatus.pending
+
+    monkeypatch.setitem(stripe_events_module.HANDLERS, "payment_intent.succeeded", handler)
+    assert await processor.sweep() == 1
+    await _drain()
+    (log,) = await _logs(db)
+    assert log.processed_at is not None and log.attempts == 2 and log.last_error is None
+    assert await _status(db, payment_id) == PaymentStatus.completed
+    assert await rollups.verify(db) == []
+    # Déjà traité : ni le balayage ni un rejeu sans identifiant ne le reprennent
+    assert await processor.sweep() == 0
+    assert await stripe_events_module.replay([]) == 0
+
+
+async def test_queue_overflow_is_picked_up_by_the_sweep(db, client, monkeypatch):
+    stripe_events.__init__(database.AsyncSessionLocal, workers=1, queue_size=1)
+    release = asyncio.Event()
+    process = stripe_events.process
+
+    async def blocked(event, force=False):
+        await release.wait()
+        return await process(event, force)
+
+    monkeypatch.setattr(stripe_events, "process", blocked)
+    stripe_events.start()
+    try:
+        # Le premier est pris par la tâche (bloquée), le deuxième remplit la file
+        for index in range(4):
+            response = await _post(client, _event(f"evt_{index}", f"pi_{index}"))
+            assert response.status_code == 200
+            await asyncio.sleep(0)
+        assert stripe_events.counters["received"] == 4
+        assert stripe_events.counters["overflow"] == 2
+
+        release.set()
+        await _drain()
+        assert stripe_events.counters["processed"] == 2
+        # Restés en attente en base : repris par les balayages, une file à la fois
+        for _ in range(2):
+            assert await stripe_events.sweep() == 1
+            await _drain()
+        assert await stripe_events.sweep() == 0
+    finally:
+        await stripe_events.stop()
+    assert stripe_events.counters["processed"] == 4
+    assert all(log.processed_at is not None for log in await _logs(db))
@@ -0,0 +1,106 @@
+# tests/test_sweeper.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+
+import database
+from ad_serving import serving_index
+from feed import feed
+from models import AccountType, Ad, AdStatus, Advertisement, AdStatusType, ProSubscription, User, UserAdUsage
+from sweeper import Sweeper
+
+pytestmark = pytest.mark.anyio
+
+CHUNK = 3
+
+
+async def _seller(db, login):
+    seller = User(username="pro", email="pro@example.com", password_hash="x", account_type=AccountType.professionnel)
+    db.add(seller)
+    await db.flush()
+    db.add(ProSubscription(
+        user_id=seller.id, plan_name="Essentiel", ads_limit=8, featured_limit=2,
+        start_date=datetime.now(timezone.utc) - timedelta(days=1),
+    ))
+    await db.commit()
+    # Détaché : les commits suivants de la session du test ne l'expirent pas
+    await db.refresh(seller)
+    db.expunge(seller)
+    login(seller)
+    return seller
+
+
+async def _search(client, q: str) -> list:
+    response = await client.get("/api/ads/search", params={"q": q, "status": "active"})
+    return sorted(item["title"] for item in response.json()["items"])
+
+
+async def test_sweep_expires_ads_in_chunks_and_releases_quota(db, client, login):
+    seller = await _seller(db, login)
+    # Index en mémoire chargés avant les créations, comme en production
+    await client.get("/api/ads/feed")
+    await _search(client, "velo")
+
+    tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    ids = []
+    for index in range(8):
+        response = await client.post("/api/ads/", json={
+            "category_id": None, "title": f"Vélo {index}", "status": "active",
+            "is_featured": index < 2, "expires_at": tomorrow,
+        })
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    assert (await client.post("/api/ads/", json={"category_id": None, "title": "Vélo de trop"})).status_code == 403
+
+    # Sept annonces (dont les deux en vedette) arrivent à échéance
+    expired, kept = ids[:7], ids[7]
+    await db.execute(update(Ad).where(Ad.id.in_(expired)).values(expires_at=datetime.now(timezone.utc) - timedelta(minutes=1)))
+    await db.commit()
+
+    sweeper = Sweeper(database.AsyncSessionLocal, chunk_size=CHUNK, pause_seconds=0)
+    assert await sweeper.sweep() == {"ads_expired": 7, "advertisements_ended": 0}
+    # Lots de 3, 3 puis 1 ; un lot vide pour les campagnes
+    assert sweeper.counters["chunks"] == 4
+
+    statuses = dict((await db.execute(select(Ad.id, Ad.status))).all())
+    assert statuses == {**{ad_id: AdStatus.expired for ad_id in expired}, kept: AdStatus.active}
+    db.expire_all()
+    usage = await db.get(UserAdUsage, seller.id)
+    assert (usage.ads_count, usage.featured_count) == (1, 0)
+
+    # Retirées de la recherche et du fil
+    assert await _search(client, "velo") == ["Vélo 7"]
+    assert [item["id"] for item in (await client.get("/api/ads/feed")).json()["items"]] == [kept]
+    assert feed.stats()["ads"] == 1
+
+    # Quota libéré : les vedettes et les annonces sont de nouveau disponibles
+    response = await client.post("/api/ads/", json={"category_id": None, "title": "Vélo neuf", "is_featured": True})
+    assert response.status_code == 201, response.text
+
+    assert await sweeper.sweep() == {"ads_expired": 0, "advertisements_ended": 0}
+
+
+async def test_sweep_ends_campaigns_and_removes_them_from_serving(db, client):
+    now = datetime.now(timezone.utc)
+    campaigns = [
+        Advertisement(
+            title=f"Campagne {index}", media_url="https://cdn.example.com/b.png", status=AdStatusType.active,
+            start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+        )
+        for index in range(5)
+    ]
+    db.add_all(campaigns)
+    await db.commit()
+    assert len((await client.get("/api/advertisements/serve", params={"position": "sidebar", "limit": 10})).json()) == 5
+
+    ended = [campaign.id for campaign in campaigns[:4]]
+    await db.execute(update(Advertisement).where(Advertisement.id.in_(ended)).values(end_date=now - timedelta(seconds=1)))
+    await db.commit()
+
+    sweeper = Sweeper(database.AsyncSessionLocal, chunk_size=CHUNK, pause_seconds=0)
+    assert await sweeper.sweep() == {"ads_expired": 0, "advertisements_ended": 4}
+    assert sweeper.counters["chunks"] == 3
+    assert set(serving_index.campaigns) == {campaigns[4].id}
+    statuses = dict((await db.execute(select(Advertisement.id, Advertisement.status))).all())
+    assert [statuses[advertisement_id] for advertisement_id in ended] == [AdStatusType.ended] * 4
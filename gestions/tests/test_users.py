@@ -0,0 +1,58 @@
+# tests/test_users.py
+import pytest
+
+import database
+import security
+from routers import users
+
+pytestmark = pytest.mark.anyio
+
+SIGNUP = {"username": "alice", "email": "alice@example.com", "password": "s3cret-pass"}
+
+
+@pytest.fixture
+def bcrypt_calls(monkeypatch):
+    # Connexions du pool prises pendant chaque calcul bcrypt
+    calls = []
+
+    def checked_out():
+        return database.engine.sync_engine.pool.checkedout()
+
+    async def hash_password(password):
+        calls.append(("hash", checked_out()))
+        return await security.hash_password(password)
+
+    async def verify_password(password, password_hash):
+        calls.append(("verify", checked_out(), password_hash is None))
+        return await security.verify_password(password, password_hash)
+
+    monkeypatch.setattr(users, "hash_password", hash_password)
+    monkeypatch.setattr(users, "verify_password", verify_password)
+    return calls
+
+
+async def test_signup_and_login_hold_no_connection_while_hashing(db_schema, client, bcrypt_calls):
+    response = await client.post("/api/users/", json=SIGNUP)
+    assert response.status_code == 201, response.text
+
+    response = await client.post("/api/users/login", json={"email": SIGNUP["email"], "password": SIGNUP["password"]})
+    assert response.status_code == 200, response.text
+    assert response.json()["username"] == "alice" and response.json()["last_login"]
+
+    assert bcrypt_calls == [("hash", 0), ("verify", 0, False)]
+
+
+async def test_login_rejections(db_schema, client, bcrypt_calls):
+    assert (await client.post("/api/users/", json=SIGNUP)).status_code == 201
+    wrong = await client.post("/api/users/login", json={"email": SIGNUP["email"], "password": "nope"})
+    unknown = await client.post("/api/users/login", json={"email": "bob@example.com", "password": "nope"})
+    assert wrong.status_code == unknown.status_code == 401
+    assert wrong.json() == unknown.json()
+    # Adresse inconnue : bcrypt tourne quand même (pas d'énumération par le temps)
+    assert bcrypt_calls[-1] == ("verify", 0, True)
+
+
+async def test_duplicate_signup_is_rejected(db_schema, client):
+    assert (await client.post("/api/users/", json=SIGNUP)).status_code == 201
+    response = await client.post("/api/users/", json={**SIGNUP, "username": "alice2"})
+    assert response.status_code == 400